@@ -91,12 +91,20 @@ class Assignment(kvs.Base, assignment.Driver):
         except exception.NotFound:
             raise exception.MetadataNotFound()
 
+    def list_grant_role_dicts(self, user_id, group_ids, project_id=None,
+                              domain_id=None):
+        return self._list_grant_role_dicts_by_actor(
+            user_id, group_ids, project_id=project_id, domain_id=domain_id)
+
     def get_role(self, role_id):
         try:
             return self.db.get('role-%s' % role_id)
         except exception.NotFound:
             raise exception.RoleNotFound(role_id=role_id)
 
+    def get_roles(self, role_ids):
+        return [self.get_role(x) for x in role_ids]
+
     def list_roles(self):
         role_ids = self.db.get('role_list', [])
         return [self.get_role(x) for x in role_ids]
@@ -381,9 +389,9 @@ class Assignment(kvs.Base, assignment.Driver):
         except exception.MetadataNotFound:
             metadata_ref = {}
 
-        return [self.get_role(x) for x in
-                self._roles_from_role_dicts(metadata_ref.get('roles', []),
-                                            inherited_to_projects)]
+        return self.get_roles(
+            self._roles_from_role_dicts(metadata_ref.get('roles', []),
+                                        inherited_to_projects))
 
     def get_grant(self, role_id, user_id=None, group_id=None,
                   domain_id=None, project_id=None,
@@ -18,6 +18,7 @@ from __future__ import absolute_import
 import uuid
 
 import ldap as ldap
+from ldap import filter as ldap_filter
 
 from keystone import assignment
 from keystone import clean
@@ -111,9 +112,17 @@ class Assignment(assignment.Driver):
             return {}
         return {'roles': [self._role_to_dict(r, False) for r in metadata_ref]}
 
+    def list_grant_role_dicts(self, user_id, group_ids, project_id=None,
+                              domain_id=None):
+        return self._list_grant_role_dicts_by_actor(
+            user_id, group_ids, project_id=project_id, domain_id=domain_id)
+
     def get_role(self, role_id):
         return self.role.get(role_id)
 
+    def get_roles(self, role_ids):
+        return self.role.get_list(role_ids)
+
     def list_roles(self):
         return self.role.get_all()
 
@@ -384,6 +393,21 @@ class RoleApi(common_ldap.BaseLdap):
         model = super(RoleApi, self).get(id, filter)
         return model
 
+    def get_list(self, ids):
+        """Get several roles with a single search, in the order of ids."""
+        if not ids:
+            return []
+        query = '(|%s)%s' % (
+            ''.join('(%s=%s)' % (self.id_attr,
+                                 ldap_filter.escape_filter_chars(str(id)))
+                    for id in set(ids)),
+            self.filter or '')
+        refs = dict((ref['id'], ref) for ref in self.get_all(query))
+        for id in ids:
+            if id not in refs:
+                raise self._not_found(id)
+        return [refs[id] for id in ids]
+
     def create(self, values):
         return super(RoleApi, self).create(values)
 
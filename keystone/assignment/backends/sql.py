@@ -94,6 +94,43 @@ class Assignment(sql.Base, assignment.Driver):
         except sql.NotFound:
             raise exception.MetadataNotFound()
 
+    def list_grant_role_dicts(self, user_id, group_ids, project_id=None,
+                              domain_id=None):
+        # NOTE: the grants of the user and of every group, on the project
+        # and on the domain, are read with a single query.
+        selects = []
+
+        def add_select(grant_table, scope, where):
+            selects.append(sql.select([grant_table.c.data,
+                                       sql.literal(scope).label('scope')],
+                                      where))
+
+        for scope, scope_id, user_table, group_table, column in [
+                ('project', project_id, UserProjectGrant.__table__,
+                 GroupProjectGrant.__table__, 'project_id'),
+                ('domain', domain_id, UserDomainGrant.__table__,
+                 GroupDomainGrant.__table__, 'domain_id')]:
+            if not scope_id:
+                continue
+            add_select(user_table, scope,
+                       sql.and_(user_table.c.user_id == user_id,
+                                user_table.c[column] == scope_id))
+            if group_ids:
+                add_select(group_table, scope,
+                           sql.and_(group_table.c.group_id.in_(group_ids),
+                                    group_table.c[column] == scope_id))
+
+        roles = {'project': [], 'domain': []}
+        if selects:
+            if len(selects) == 1:
+                query = selects[0]
+            else:
+                query = sql.union_all(*selects)
+            session = self.get_session()
+            for data, scope in session.execute(query):
+                roles[scope] += (data or {}).get('roles', [])
+        return roles['project'], roles['domain']
+
     def create_grant(self, role_id, user_id=None, group_id=None,
                      domain_id=None, project_id=None,
                      inherited_to_projects=False):
@@ -142,9 +179,9 @@ class Assignment(sql.Base, assignment.Driver):
         except exception.MetadataNotFound:
             metadata_ref = {}
 
-        return [self.get_role(x) for x in
-                self._roles_from_role_dicts(metadata_ref.get('roles', []),
-                                            inherited_to_projects)]
+        return self.get_roles(
+            self._roles_from_role_dicts(metadata_ref.get('roles', []),
+                                        inherited_to_projects))
 
     def get_grant(self, role_id, user_id=None, group_id=None,
                   domain_id=None, project_id=None,
@@ -559,6 +596,17 @@ class Assignment(sql.Base, assignment.Driver):
         session = self.get_session()
         return self._get_role(session, role_id).to_dict()
 
+    def get_roles(self, role_ids):
+        if not role_ids:
+            return []
+        session = self.get_session()
+        query = session.query(Role).filter(Role.id.in_(set(role_ids)))
+        refs = dict((ref.id, ref.to_dict()) for ref in query)
+        for role_id in role_ids:
+            if role_id not in refs:
+                raise exception.RoleNotFound(role_id=role_id)
+        return [refs[role_id] for role_id in role_ids]
+
     @sql.handle_conflicts(type='role')
     def update_role(self, role_id, role):
         session = self.get_session()
@@ -16,8 +16,12 @@
 
 """Main entry point into the assignment service."""
 
+import time
+
 from keystone.common import dependency
 from keystone.common import manager
+from keystone.common import request_cache
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import log as logging
@@ -26,6 +30,10 @@ from keystone.openstack.common import log as logging
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
+# Invalidation topic published whenever effective roles may have changed. It
+# may name what changed, as in 'assignment:user:<user_id>'.
+ASSIGNMENT_TOPIC = 'assignment'
+
 DEFAULT_DOMAIN = {'description':
                   (u'Owns users and tenants (i.e. projects)'
                    ' available on Identity API v2.'),
@@ -35,7 +43,8 @@ DEFAULT_DOMAIN = {'description':
 
 
 @dependency.provider('assignment_api')
-@dependency.requires('identity_api')
+@dependency.requires('identity_api', 'invalidation_api')
+@request_cache.memoize
 class Manager(manager.Manager):
     """Default pivot point for the Assignment backend.
 
@@ -44,6 +53,11 @@ class Manager(manager.Manager):
     assignment.Manager() and identity.Manager() have a circular dependency.
     The late import works around this.  THe if block prevents creation of the
     api object by both managers.
+
+    The effective roles of a user on a project or a domain are cached for up
+    to ``[assignment] cache_time`` seconds. Changing a grant or a group
+    membership, or deleting a user, group, project, domain or role, drops the
+    roles it may affect, in this and every other process.
     """
 
     def __init__(self):
@@ -54,6 +68,60 @@ class Manager(manager.Manager):
             assignment_driver = identity_driver.default_assignment_driver()
 
         super(Manager, self).__init__(assignment_driver)
+        self.role_cache = utils.LRUCache(CONF.assignment.cache_size)
+        self._role_cache_subscribed = False
+
+    def _cached_roles(self, resolve, user_id, scope, scope_id):
+        """Return the role ids resolved for a user on a project or domain.
+
+        ``resolve()`` returns the role ids and the (kind, id) pairs of the
+        users, groups, projects and domains they depend on, which are
+        matched against invalidated topics.
+
+        """
+        if not CONF.assignment.cache_time:
+            return resolve()[0]
+
+        if not self._role_cache_subscribed:
+            self.invalidation_api.subscribe(ASSIGNMENT_TOPIC,
+                                            self._invalidate_cached_roles)
+            self._role_cache_subscribed = True
+        self.invalidation_api.poll()
+
+        key = (user_id, scope, scope_id)
+        cached = self.role_cache.get(key)
+        if cached is None:
+            cached = resolve()
+            self.role_cache.set(key, cached,
+                                time.time() + CONF.assignment.cache_time)
+        return list(cached[0])
+
+    def _invalidate_cached_roles(self, topic):
+        try:
+            _name, kind, object_id = topic.split(':', 2)
+        except ValueError:
+            self.role_cache.clear()
+            return
+        changed = (kind, object_id)
+        self.role_cache.invalidate_if(
+            lambda key, value: changed in value[1])
+
+    def invalidate_roles(self, user_id=None, group_id=None, project_id=None,
+                         domain_id=None):
+        """Note that effective roles may have changed.
+
+        Only the roles depending on the given user, group, project or domain
+        are dropped; with none given, every cached role is.
+
+        """
+        topics = ['%s:%s:%s' % (ASSIGNMENT_TOPIC, kind, object_id)
+                  for kind, object_id in [('user', user_id),
+                                          ('group', group_id),
+                                          ('project', project_id),
+                                          ('domain', domain_id)]
+                  if object_id is not None]
+        for topic in topics or [ASSIGNMENT_TOPIC]:
+            self.invalidation_api.publish(topic)
 
     def get_roles_for_user_and_project(self, user_id, tenant_id):
         """Get the roles associated with a user within given project.
@@ -68,60 +136,27 @@ class Manager(manager.Manager):
                  keystone.exception.ProjectNotFound
 
         """
-        def _get_group_project_roles(user_id, project_ref):
-            role_list = []
-            group_refs = self.identity_api.list_groups_for_user(user_id)
-            for x in group_refs:
-                try:
-                    metadata_ref = self._get_metadata(
-                        group_id=x['id'], tenant_id=project_ref['id'])
-                    role_list += self._roles_from_role_dicts(
-                        metadata_ref.get('roles', {}), False)
-                except exception.MetadataNotFound:
-                    # no group grant, skip
-                    pass
-
-                if CONF.os_inherit.enabled:
-                    # Now get any inherited group roles for the owning domain
-                    try:
-                        metadata_ref = self._get_metadata(
-                            group_id=x['id'],
-                            domain_id=project_ref['domain_id'])
-                        role_list += self._roles_from_role_dicts(
-                            metadata_ref.get('roles', {}), True)
-                    except (exception.MetadataNotFound,
-                            exception.NotImplemented):
-                        pass
-
-            return role_list
-
-        def _get_user_project_roles(user_id, project_ref):
-            role_list = []
-            try:
-                metadata_ref = self._get_metadata(user_id=user_id,
-                                                  tenant_id=project_ref['id'])
-                role_list = self._roles_from_role_dicts(
-                    metadata_ref.get('roles', {}), False)
-            except exception.MetadataNotFound:
-                pass
-
+        def resolve():
+            project_ref = self.get_project(tenant_id)
+            group_ids = [x['id'] for x in
+                         self.identity_api.list_groups_for_user(user_id)]
+            domain_id = None
             if CONF.os_inherit.enabled:
-                # Now get any inherited roles for the owning domain
-                try:
-                    metadata_ref = self._get_metadata(
-                        user_id=user_id, domain_id=project_ref['domain_id'])
-                    role_list += self._roles_from_role_dicts(
-                        metadata_ref.get('roles', {}), True)
-                except (exception.MetadataNotFound, exception.NotImplemented):
-                    pass
-
-            return role_list
-
-        project_ref = self.get_project(tenant_id)
-        user_role_list = _get_user_project_roles(user_id, project_ref)
-        group_role_list = _get_group_project_roles(user_id, project_ref)
-        # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+                # Inherited roles of the owning domain apply as well
+                domain_id = project_ref['domain_id']
+            project_roles, domain_roles = self.driver.list_grant_role_dicts(
+                user_id, group_ids, project_id=project_ref['id'],
+                domain_id=domain_id)
+            role_list = (self._roles_from_role_dicts(project_roles, False) +
+                         self._roles_from_role_dicts(domain_roles, True))
+            dependencies = frozenset(
+                [('user', user_id), ('project', project_ref['id']),
+                 ('domain', project_ref['domain_id'])] +
+                [('group', group_id) for group_id in group_ids])
+            # Use set() to process the list to remove any duplicates
+            return list(set(role_list)), dependencies
+
+        return self._cached_roles(resolve, user_id, 'project', tenant_id)
 
     def get_roles_for_user_and_domain(self, user_id, domain_id):
         """Get the roles associated with a user within given domain.
@@ -131,41 +166,21 @@ class Manager(manager.Manager):
                  keystone.exception.DomainNotFound
 
         """
+        def resolve():
+            self.get_domain(domain_id)
+            group_ids = [x['id'] for x in
+                         self.identity_api.list_groups_for_user(user_id)]
+            _project_roles, domain_roles = self.driver.list_grant_role_dicts(
+                user_id, group_ids, domain_id=domain_id)
+            dependencies = frozenset(
+                [('user', user_id), ('domain', domain_id)] +
+                [('group', group_id) for group_id in group_ids])
+            # Use set() to process the list to remove any duplicates
+            return (list(set(self._roles_from_role_dicts(domain_roles,
+                                                         False))),
+                    dependencies)
 
-        def _get_group_domain_roles(user_id, domain_id):
-            role_list = []
-            group_refs = self.identity_api.list_groups_for_user(user_id)
-            for x in group_refs:
-                try:
-                    metadata_ref = self._get_metadata(group_id=x['id'],
-                                                      domain_id=domain_id)
-                    role_list += self._roles_from_role_dicts(
-                        metadata_ref.get('roles', {}), False)
-                except (exception.MetadataNotFound, exception.NotImplemented):
-                    # MetadataNotFound implies no group grant, so skip.
-                    # Ignore NotImplemented since not all backends support
-                    # domains.
-                    pass
-            return role_list
-
-        def _get_user_domain_roles(user_id, domain_id):
-            metadata_ref = {}
-            try:
-                metadata_ref = self._get_metadata(user_id=user_id,
-                                                  domain_id=domain_id)
-            except (exception.MetadataNotFound, exception.NotImplemented):
-                # MetadataNotFound implies no user grants.
-                # Ignore NotImplemented since not all backends support
-                # domains
-                pass
-            return self._roles_from_role_dicts(
-                metadata_ref.get('roles', {}), False)
-
-        self.get_domain(domain_id)
-        user_role_list = _get_user_domain_roles(user_id, domain_id)
-        group_role_list = _get_group_domain_roles(user_id, domain_id)
-        # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+        return self._cached_roles(resolve, user_id, 'domain', domain_id)
 
     def add_user_to_project(self, tenant_id, user_id):
         """Add user to a tenant by creating a default role relationship.
@@ -175,7 +190,7 @@ class Manager(manager.Manager):
 
         """
         try:
-            self.driver.add_role_to_user_and_project(
+            self.add_role_to_user_and_project(
                 user_id,
                 tenant_id,
                 config.CONF.member_role_id)
@@ -187,7 +202,7 @@ class Manager(manager.Manager):
                     'name': CONF.member_role_name}
             self.driver.create_role(config.CONF.member_role_id, role)
             #now that default role exists, the add should succeed
-            self.driver.add_role_to_user_and_project(
+            self.add_role_to_user_and_project(
                 user_id,
                 tenant_id,
                 config.CONF.member_role_id)
@@ -205,6 +220,70 @@ class Manager(manager.Manager):
         for role_id in roles:
             self.remove_role_from_user_and_project(user_id, tenant_id, role_id)
 
+    def add_role_to_user_and_project(self, user_id, tenant_id, role_id):
+        try:
+            return self.driver.add_role_to_user_and_project(
+                user_id, tenant_id, role_id)
+        finally:
+            self.invalidate_roles(user_id=user_id)
+
+    def remove_role_from_user_and_project(self, user_id, tenant_id, role_id):
+        try:
+            return self.driver.remove_role_from_user_and_project(
+                user_id, tenant_id, role_id)
+        finally:
+            self.invalidate_roles(user_id=user_id)
+
+    def create_grant(self, role_id, user_id=None, group_id=None,
+                     domain_id=None, project_id=None,
+                     inherited_to_projects=False):
+        try:
+            return self.driver.create_grant(
+                role_id, user_id, group_id, domain_id, project_id,
+                inherited_to_projects)
+        finally:
+            self.invalidate_roles(user_id=user_id, group_id=group_id)
+
+    def delete_grant(self, role_id, user_id=None, group_id=None,
+                     domain_id=None, project_id=None,
+                     inherited_to_projects=False):
+        try:
+            return self.driver.delete_grant(
+                role_id, user_id, group_id, domain_id, project_id,
+                inherited_to_projects)
+        finally:
+            self.invalidate_roles(user_id=user_id, group_id=group_id)
+
+    def delete_project(self, tenant_id):
+        try:
+            return self.driver.delete_project(tenant_id)
+        finally:
+            self.invalidate_roles(project_id=tenant_id)
+
+    def delete_domain(self, domain_id):
+        try:
+            return self.driver.delete_domain(domain_id)
+        finally:
+            self.invalidate_roles(domain_id=domain_id)
+
+    def delete_role(self, role_id):
+        try:
+            return self.driver.delete_role(role_id)
+        finally:
+            self.invalidate_roles()
+
+    def delete_user(self, user_id):
+        try:
+            return self.driver.delete_user(user_id)
+        finally:
+            self.invalidate_roles(user_id=user_id)
+
+    def delete_group(self, group_id):
+        try:
+            return self.driver.delete_group(group_id)
+        finally:
+            self.invalidate_roles(group_id=group_id)
+
 
 class Driver(object):
 
@@ -354,6 +433,48 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def list_grant_role_dicts(self, user_id, group_ids, project_id=None,
+                              domain_id=None):
+        """Lists the roles granted to a user, or to any of the given
+        groups, on a project and on a domain.
+
+        :returns: a pair of lists of role dicts, as stored in grants, for the
+                  project and for the domain; backends without domains
+                  return no domain roles.
+
+        """
+        raise exception.NotImplemented()
+
+    def _list_grant_role_dicts_by_actor(self, user_id, group_ids,
+                                        project_id=None, domain_id=None):
+        """Implements list_grant_role_dicts with _get_metadata, reading the
+        grants of the user and of each group one by one.
+
+        """
+        project_roles = []
+        domain_roles = []
+        actors = ([{'user_id': user_id}] +
+                  [{'group_id': group_id} for group_id in group_ids])
+        for actor in actors:
+            if project_id:
+                try:
+                    metadata_ref = self._get_metadata(tenant_id=project_id,
+                                                      **actor)
+                    project_roles += metadata_ref.get('roles', [])
+                except exception.MetadataNotFound:
+                    pass
+            if domain_id:
+                try:
+                    metadata_ref = self._get_metadata(domain_id=domain_id,
+                                                      **actor)
+                    domain_roles += metadata_ref.get('roles', [])
+                except (exception.MetadataNotFound,
+                        exception.NotImplemented):
+                    # Ignore NotImplemented since not all backends support
+                    # domains
+                    pass
+        return project_roles, domain_roles
+
     def list_role_assignments(self):
 
         raise exception.NotImplemented()
@@ -489,6 +610,15 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_roles(self, role_ids):
+        """Get several roles by ID at once.
+
+        :returns: a list of role_refs, in the order of role_ids
+        :raises: keystone.exception.RoleNotFound
+
+        """
+        raise exception.NotImplemented()
+
     def update_role(self, role_id, role):
         """Updates an existing role.
 
@@ -50,6 +50,15 @@ class Endpoint(sql.ModelBase, sql.DictBase):
     extra = sql.Column(sql.JsonBlob())
 
 
+class ProjectEndpoint(sql.ModelBase):
+    __tablename__ = 'project_endpoint'
+    __table_args__ = (
+        sql.Index('ix_project_endpoint_project_id', 'project_id'),
+    )
+    endpoint_id = sql.Column(sql.String(64), primary_key=True)
+    project_id = sql.Column(sql.String(64), primary_key=True)
+
+
 class Catalog(sql.Base, catalog.Driver):
     def db_sync(self, version=None):
         migration.db_sync(version=version)
@@ -74,6 +83,11 @@ class Catalog(sql.Base, catalog.Driver):
         session = self.get_session()
         with session.begin():
             ref = self._get_service(session, service_id)
+            endpoint_ids = [endpoint.id for endpoint in ref.endpoints]
+            if endpoint_ids:
+                (session.query(ProjectEndpoint).
+                 filter(ProjectEndpoint.endpoint_id.in_(endpoint_ids)).
+                 delete(synchronize_session=False))
             session.query(Endpoint).filter_by(service_id=service_id).delete()
             session.delete(ref)
             session.flush()
@@ -114,6 +128,9 @@ class Catalog(sql.Base, catalog.Driver):
         session = self.get_session()
         with session.begin():
             ref = self._get_endpoint(session, endpoint_id)
+            (session.query(ProjectEndpoint).
+             filter_by(endpoint_id=endpoint_id).
+             delete())
             session.delete(ref)
             session.flush()
 
@@ -146,19 +163,78 @@ class Catalog(sql.Base, catalog.Driver):
             session.flush()
         return ref.to_dict()
 
-    def get_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+    # Project endpoints
+    @sql.handle_conflicts(type='project_endpoint')
+    def add_endpoint_to_project(self, endpoint_id, project_id):
+        session = self.get_session()
+        with session.begin():
+            self._get_endpoint(session, endpoint_id)
+            session.add(ProjectEndpoint(endpoint_id=endpoint_id,
+                                        project_id=project_id))
+            session.flush()
+
+    def _get_project_endpoint(self, session, endpoint_id, project_id):
+        ref = session.query(ProjectEndpoint).get((endpoint_id, project_id))
+        if not ref:
+            raise exception.ProjectEndpointNotFound(endpoint_id=endpoint_id,
+                                                    project_id=project_id)
+        return ref
+
+    def check_endpoint_in_project(self, endpoint_id, project_id):
+        session = self.get_session()
+        self._get_project_endpoint(session, endpoint_id, project_id)
+
+    def list_endpoints_for_project(self, project_id):
+        session = self.get_session()
+        endpoints = self._project_endpoints(session, project_id)
+        return [e.to_dict() for e in endpoints.all()]
 
+    def list_projects_for_endpoint(self, endpoint_id):
         session = self.get_session()
-        endpoints = (session.query(Endpoint).
-                     options(sql.joinedload(Endpoint.service)).
-                     all())
+        refs = session.query(ProjectEndpoint.project_id)
+        refs = refs.filter_by(endpoint_id=endpoint_id)
+        return [project_id for (project_id,) in refs]
+
+    def remove_endpoint_from_project(self, endpoint_id, project_id):
+        session = self.get_session()
+        with session.begin():
+            ref = self._get_project_endpoint(session, endpoint_id, project_id)
+            session.delete(ref)
+            session.flush()
+
+    def _project_endpoints(self, session, project_id):
+        return (session.query(Endpoint).
+                join(ProjectEndpoint,
+                     ProjectEndpoint.endpoint_id == Endpoint.id).
+                filter(ProjectEndpoint.project_id == project_id))
+
+    def _catalog_endpoints(self, session, tenant_id):
+        """Return the endpoints added to a tenant, with their services.
+
+        The list is empty when no endpoint was added to the tenant, whose
+        catalog then holds every endpoint.
+
+        """
+        if tenant_id is None:
+            return []
+        return (self._project_endpoints(session, tenant_id).
+                options(sql.joinedload(Endpoint.service)).
+                all())
+
+    def get_catalog(self, user_id, tenant_id, metadata=None):
+        session = self.get_session()
+        endpoints = self._catalog_endpoints(session, tenant_id)
+        if not endpoints:
+            endpoints = (session.query(Endpoint).
+                         options(sql.joinedload(Endpoint.service)).
+                         all())
+        templates = [core.compile_url(endpoint['url'])
+                     for endpoint in endpoints]
+        d = core.url_substitutions(templates, tenant_id, user_id)
 
         catalog = {}
 
-        for endpoint in endpoints:
+        for endpoint, template in zip(endpoints, templates):
             region = endpoint['region']
             service_type = endpoint.service['type']
             default_service = {
@@ -168,21 +244,33 @@ class Catalog(sql.Base, catalog.Driver):
             }
             catalog.setdefault(region, {})
             catalog[region].setdefault(service_type, default_service)
-            url = core.format_url(endpoint['url'], d)
+            url = template and template.format(d)
             interface_url = '%sURL' % endpoint['interface']
             catalog[region][service_type][interface_url] = url
 
         return catalog
 
     def get_v3_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
-
         session = self.get_session()
-        services = (session.query(Service).
-                    options(sql.joinedload(Service.endpoints)).
-                    all())
+        endpoints = self._catalog_endpoints(session, tenant_id)
+        if endpoints:
+            services = []
+            service_endpoints = {}
+            for endpoint in endpoints:
+                if endpoint.service_id not in service_endpoints:
+                    services.append(endpoint.service)
+                    service_endpoints[endpoint.service_id] = []
+                service_endpoints[endpoint.service_id].append(endpoint)
+        else:
+            services = (session.query(Service).
+                        options(sql.joinedload(Service.endpoints)).
+                        all())
+            service_endpoints = dict((svc.id, svc.endpoints)
+                                     for svc in services)
+        d = core.url_substitutions(
+            [core.compile_url(ep.url) for svc in services
+             for ep in service_endpoints[svc.id]],
+            tenant_id, user_id)
 
         def make_v3_endpoint(endpoint):
             del endpoint['service_id']
@@ -190,7 +278,7 @@ class Catalog(sql.Base, catalog.Driver):
             return endpoint
 
         catalog = [{'endpoints': [make_v3_endpoint(ep.to_dict())
-                                  for ep in svc.endpoints],
+                                  for ep in service_endpoints[svc.id]],
                     'id': svc.id,
                     'type': svc.type} for svc in services]
 
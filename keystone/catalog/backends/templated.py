@@ -54,6 +54,75 @@ def parse_templates(template_lines):
     return o
 
 
+class CompiledCatalog(object):
+    """The output of parse_templates, flattened for rendering.
+
+    Every value of the catalog is held in one slot of a single list, with the
+    slots of each region next to each other. A slot is a tuple of the
+    service, the key, the URLTemplate of the value, and the value itself when
+    it substitutes nothing. Rendering a catalog, or only some of its regions,
+    is a single pass over the slots.
+
+    """
+
+    def __init__(self, templates):
+        self.slots = []
+        # region -> (first slot, end of slots, URLTemplates used)
+        self.regions = {}
+        for region, region_ref in templates.iteritems():
+            start = len(self.slots)
+            used = set()
+            for service, service_ref in region_ref.iteritems():
+                for key, value in service_ref.iteritems():
+                    template = core.compile_url(value)
+                    if template is None:
+                        self.slots.append((service, key, None, None))
+                    elif '%' not in template.template:
+                        self.slots.append((service, key, None,
+                                           template.template))
+                    else:
+                        self.slots.append((service, key, template, None))
+                        used.add(template)
+            self.regions[region] = (start, len(self.slots), list(used))
+
+    def render(self, user_id, tenant_id, regions=None):
+        """Render the catalog of a user and tenant.
+
+        :param regions: names of the regions to render, or None for all of
+                        them; unknown regions are ignored
+
+        """
+        if regions is None:
+            selected = self.regions.items()
+        else:
+            selected = [(region, self.regions[region])
+                        for region in set(regions)
+                        if region in self.regions]
+
+        d = core.url_substitutions(
+            [template for _region, (_start, _stop, used) in selected
+             for template in used],
+            tenant_id, user_id)
+
+        o = {}
+        slots = self.slots
+        for region, (start, stop, _used) in selected:
+            region_ref = o[region] = {}
+            for i in xrange(start, stop):
+                service, key, template, value = slots[i]
+                service_ref = region_ref.get(service)
+                if service_ref is None:
+                    service_ref = region_ref[service] = {}
+                if template is not None:
+                    try:
+                        value = template.template % d
+                    except (KeyError, TypeError, ValueError):
+                        # NOTE: reports the malformed endpoint.
+                        value = template.format(d)
+                service_ref[key] = value
+        return o
+
+
 # TODO(jaypipes): should be templated.Catalog,
 # not templated.TemplatedCatalog to be consistent with
 # other catalog backends
@@ -99,6 +168,15 @@ class TemplatedCatalog(kvs.Catalog):
             self._load_templates(template_file)
         super(TemplatedCatalog, self).__init__()
 
+    @property
+    def templates(self):
+        return self._templates
+
+    @templates.setter
+    def templates(self, templates):
+        self._templates = templates
+        self.compiled = CompiledCatalog(templates)
+
     def _load_templates(self, template_file):
         try:
             self.templates = parse_templates(open(template_file))
@@ -106,17 +184,11 @@ class TemplatedCatalog(kvs.Catalog):
             LOG.critical(_('Unable to open template file %s') % template_file)
             raise
 
-    def get_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+    def get_catalog(self, user_id, tenant_id, metadata=None, regions=None):
+        """Render the catalog, or only the given regions of it.
 
-        o = {}
-        for region, region_ref in self.templates.iteritems():
-            o[region] = {}
-            for service, service_ref in region_ref.iteritems():
-                o[region][service] = {}
-                for k, v in service_ref.iteritems():
-                    o[region][service][k] = core.format_url(v, d)
+        Changes to the templates must be made by assigning ``templates``, so
+        that they are compiled again.
 
-        return o
+        """
+        return self.compiled.render(user_id, tenant_id, regions)
@@ -17,8 +17,15 @@
 
 """Main entry point into the Catalog service."""
 
+import copy
+import re
+import time
+
+from oslo.config import cfg
+
 from keystone.common import dependency
 from keystone.common import manager
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import log as logging
@@ -27,13 +34,85 @@ from keystone.openstack.common import log as logging
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
+# Invalidation topic published whenever services or endpoints change.
+CATALOG_TOPIC = 'catalog'
+
+
+# Keys substituted into endpoint URLs, as in ``$(public_port)s``.
+_URL_KEY = re.compile(r'%\(([^)]*)\)')
+
+# Compiled endpoint URLs, by URL.
+_URL_TEMPLATES = {}
+
+# Number of compiled URLs kept before the cache is emptied.
+_URL_TEMPLATES_SIZE = 1000
+
+
+class URLTemplate(object):
+    """An endpoint URL, parsed once for formatting many times.
+
+    ``keys`` holds the names of the values the URL substitutes, so that only
+    those need to be looked up when it is formatted.
+
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.template = url.replace('$(', '%(')
+        self.keys = frozenset(_URL_KEY.findall(self.template))
+
+    def format(self, data):
+        """Safely string formats the URL with the given data."""
+        return _format(self.url, self.template, data)
+
+
+def compile_url(url):
+    """Return the URLTemplate of a user-defined URL, or None."""
+    if not isinstance(url, basestring):
+        return None
+    template = _URL_TEMPLATES.get(url)
+    if template is None:
+        if len(_URL_TEMPLATES) >= _URL_TEMPLATES_SIZE:
+            _URL_TEMPLATES.clear()
+        template = _URL_TEMPLATES[url] = URLTemplate(url)
+    return template
+
+
+def url_substitutions(templates, tenant_id, user_id):
+    """Return the values needed to format the given URL templates.
+
+    Besides ``tenant_id`` and ``user_id``, URLs may substitute any option of
+    the configuration, such as ``$(public_port)s``. Only the options the
+    templates use are read.
+
+    """
+    data = {'tenant_id': tenant_id,
+            'user_id': user_id}
+    for template in templates:
+        if template is None:
+            continue
+        for key in template.keys:
+            if key in data:
+                continue
+            try:
+                data[key] = CONF[key]
+            except cfg.NoSuchOptError:
+                # NOTE: formatting the URL reports the unknown key.
+                pass
+    return data
+
 
 def format_url(url, data):
     """Safely string formats a user-defined URL with the given data."""
-    try:
-        result = url.replace('$(', '%(') % data
-    except AttributeError:
+    template = compile_url(url)
+    if template is None:
         return None
+    return template.format(data)
+
+
+def _format(url, template, data):
+    try:
+        result = template % data
     except KeyError as e:
         LOG.error(_("Malformed endpoint %(url)s - unknown key %(keyerror)s") %
                   {"url": url,
@@ -53,16 +132,51 @@ def format_url(url, data):
 
 
 @dependency.provider('catalog_api')
+@dependency.requires('invalidation_api')
 class Manager(manager.Manager):
     """Default pivot point for the Catalog backend.
 
     See :mod:`keystone.common.manager.Manager` for more details on how this
     dynamically calls the backend.
 
+    Catalogs are cached for every user and tenant for up to ``[catalog]
+    cache_time`` seconds. Creating, updating or deleting a service or an
+    endpoint, or changing which endpoints a project uses, drops every cached
+    catalog, in this and every other process.
+
     """
 
     def __init__(self):
         super(Manager, self).__init__(CONF.catalog.driver)
+        self.catalog_cache = utils.LRUCache(CONF.catalog.cache_size)
+        self._catalog_cache_generation = None
+
+    def _cached_catalog(self, get_catalog, user_id, tenant_id, metadata):
+        if not CONF.catalog.cache_time:
+            return get_catalog(user_id, tenant_id, metadata)
+
+        generation = self.invalidation_api.generation(CATALOG_TOPIC)
+        if generation != self._catalog_cache_generation:
+            self.catalog_cache.clear()
+            self._catalog_cache_generation = generation
+        key = (get_catalog.__name__, user_id, tenant_id)
+        catalog = self.catalog_cache.get(key)
+        if catalog is None:
+            catalog = get_catalog(user_id, tenant_id, metadata)
+            self.catalog_cache.set(key, catalog,
+                                   time.time() + CONF.catalog.cache_time)
+        # NOTE: callers build tokens around the catalog they are given.
+        return copy.deepcopy(catalog)
+
+    def invalidate_catalog(self):
+        """Note that the services or endpoints may have changed."""
+        self.invalidation_api.publish(CATALOG_TOPIC)
+
+    def create_service(self, service_id, service_ref):
+        try:
+            return self.driver.create_service(service_id, service_ref)
+        finally:
+            self.invalidate_catalog()
 
     def get_service(self, service_id):
         try:
@@ -70,11 +184,19 @@ class Manager(manager.Manager):
         except exception.NotFound:
             raise exception.ServiceNotFound(service_id=service_id)
 
+    def update_service(self, service_id, service_ref):
+        try:
+            return self.driver.update_service(service_id, service_ref)
+        finally:
+            self.invalidate_catalog()
+
     def delete_service(self, service_id):
         try:
             return self.driver.delete_service(service_id)
         except exception.NotFound:
             raise exception.ServiceNotFound(service_id=service_id)
+        finally:
+            self.invalidate_catalog()
 
     def create_endpoint(self, endpoint_id, endpoint_ref):
         try:
@@ -82,12 +204,22 @@ class Manager(manager.Manager):
         except exception.NotFound:
             service_id = endpoint_ref.get('service_id')
             raise exception.ServiceNotFound(service_id=service_id)
+        finally:
+            self.invalidate_catalog()
+
+    def update_endpoint(self, endpoint_id, endpoint_ref):
+        try:
+            return self.driver.update_endpoint(endpoint_id, endpoint_ref)
+        finally:
+            self.invalidate_catalog()
 
     def delete_endpoint(self, endpoint_id):
         try:
             return self.driver.delete_endpoint(endpoint_id)
         except exception.NotFound:
             raise exception.EndpointNotFound(endpoint_id=endpoint_id)
+        finally:
+            self.invalidate_catalog()
 
     def get_endpoint(self, endpoint_id):
         try:
@@ -95,12 +227,31 @@ class Manager(manager.Manager):
         except exception.NotFound:
             raise exception.EndpointNotFound(endpoint_id=endpoint_id)
 
+    def add_endpoint_to_project(self, endpoint_id, project_id):
+        try:
+            return self.driver.add_endpoint_to_project(endpoint_id,
+                                                       project_id)
+        finally:
+            self.invalidate_catalog()
+
+    def remove_endpoint_from_project(self, endpoint_id, project_id):
+        try:
+            return self.driver.remove_endpoint_from_project(endpoint_id,
+                                                            project_id)
+        finally:
+            self.invalidate_catalog()
+
     def get_catalog(self, user_id, tenant_id, metadata=None):
         try:
-            return self.driver.get_catalog(user_id, tenant_id, metadata)
+            return self._cached_catalog(self.driver.get_catalog,
+                                        user_id, tenant_id, metadata)
         except exception.NotFound:
             raise exception.NotFound('Catalog not found for user and tenant')
 
+    def get_v3_catalog(self, user_id, tenant_id, metadata=None):
+        return self._cached_catalog(self.driver.get_v3_catalog,
+                                    user_id, tenant_id, metadata)
+
 
 class Driver(object):
     """Interface description for an Catalog driver."""
@@ -190,6 +341,49 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def add_endpoint_to_project(self, endpoint_id, project_id):
+        """Restrict the catalog of a project to, among others, an endpoint.
+
+        The catalog of a project with no endpoints holds every endpoint.
+
+        :raises: keystone.exception.EndpointNotFound,
+                 keystone.exception.Conflict
+
+        """
+        raise exception.NotImplemented()
+
+    def check_endpoint_in_project(self, endpoint_id, project_id):
+        """Checks that an endpoint was added to a project.
+
+        :raises: keystone.exception.ProjectEndpointNotFound
+
+        """
+        raise exception.NotImplemented()
+
+    def list_endpoints_for_project(self, project_id):
+        """List the endpoints added to a project.
+
+        :returns: list of endpoint_refs or an empty list.
+
+        """
+        raise exception.NotImplemented()
+
+    def list_projects_for_endpoint(self, endpoint_id):
+        """List the projects an endpoint was added to.
+
+        :returns: list of project ids or an empty list.
+
+        """
+        raise exception.NotImplemented()
+
+    def remove_endpoint_from_project(self, endpoint_id, project_id):
+        """Removes an endpoint from the catalog of a project.
+
+        :raises: keystone.exception.ProjectEndpointNotFound
+
+        """
+        raise exception.NotImplemented()
+
     def get_catalog(self, user_id, tenant_id, metadata=None):
         """Retrieve and format the current service catalog.
 
@@ -207,6 +401,8 @@ class Driver(object):
                     'name': 'EC2 Service',
                     'publicURL': 'http://host:8773/services/Cloud'}}
 
+        Only the endpoints added to the tenant are listed, if any were.
+
         :returns: A nested dict representing the service catalog or an
                   empty dict.
         :raises: keystone.exception.NotFound
@@ -238,6 +434,8 @@ class Driver(object):
                 "type": "volume"
             }]
 
+        Only the endpoints added to the tenant are listed, if any were.
+
         :returns: A list representing the service catalog or an empty list
         :raises: keystone.exception.NotFound
 
@@ -29,6 +29,7 @@ from keystone.common import openssl
 from keystone.common.sql import migration
 from keystone import config
 from keystone import contrib
+from keystone import invalidation
 from keystone.openstack.common import importutils
 from keystone.openstack.common import jsonutils
 from keystone import token
@@ -184,10 +185,38 @@ class TokenFlush(BaseApp):
 
     name = 'token_flush'
 
+    @classmethod
+    def add_argument_parser(cls, subparsers):
+        parser = super(TokenFlush, cls).add_argument_parser(subparsers)
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help=('Remove at most this many expired tokens '
+                                  'per batch; 0 removes them all at once. '
+                                  'Defaults to [token] flush_batch_size.'))
+        parser.add_argument('--batch-sleep', type=float, default=None,
+                            help=('Seconds to sleep between batches. '
+                                  'Defaults to [token] flush_batch_sleep.'))
+        parser.add_argument('--max-runtime', type=int, default=None,
+                            help=('Stop after this many seconds; 0 means no '
+                                  'limit. Defaults to [token] '
+                                  'flush_max_runtime.'))
+        return parser
+
+    @staticmethod
+    def print_batch(stats):
+        print(_('Batch %(batch)d: removed %(deleted)d expired tokens in '
+                '%(elapsed).3fs, %(total)d in total') % stats)
+
     @classmethod
     def main(cls):
+        # NOTE: publishes the flush to the caches of the running servers.
+        invalidation.Manager()
         token_manager = token.Manager()
-        token_manager.driver.flush_expired_tokens()
+        total = token_manager.flush_expired_tokens(
+            batch_size=CONF.command.batch_size,
+            batch_sleep=CONF.command.batch_sleep,
+            max_runtime=CONF.command.max_runtime,
+            progress=cls.print_batch)
+        print(_('Removed %d expired tokens') % total)
 
 
 class ImportLegacy(BaseApp):
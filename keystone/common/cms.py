@@ -1,15 +1,54 @@
+import base64
 import hashlib
+import os
+import sys
+import threading
+import time
 
+from keystone.common import config
 from keystone.common import environment
 from keystone.openstack.common import log as logging
 
 
+CONF = config.CONF
 LOG = logging.getLogger(__name__)
 PKI_ANS1_PREFIX = 'MII'
 
+# signing engines selectable through ``[signing] engine``
+SUBPROCESS_ENGINE = 'subprocess'
+INPROCESS_ENGINE = 'inprocess'
+POOL_ENGINE = 'pool'
 
-def cms_verify(formatted, signing_cert_file_name, ca_file_name):
-    """Verifies the signature of the contents IAW CMS syntax."""
+# DER encoded object identifiers used to build SignedData documents
+_OID_DATA = '\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x07\x01'
+_OID_SIGNED_DATA = '\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x07\x02'
+_OID_RSA_ENCRYPTION = '\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x01\x01'
+_DIGEST_OIDS = {
+    'sha1': '\x06\x05\x2b\x0e\x03\x02\x1a',
+    'sha256': '\x06\x09\x60\x86\x48\x01\x65\x03\x04\x02\x01',
+    'sha384': '\x06\x09\x60\x86\x48\x01\x65\x03\x04\x02\x02',
+    'sha512': '\x06\x09\x60\x86\x48\x01\x65\x03\x04\x02\x03',
+}
+
+
+class SigningError(Exception):
+    """A document could not be signed by the configured signing engine."""
+    pass
+
+
+def cms_verify(formatted, signing_cert_file_name, ca_file_name,
+               engine=SUBPROCESS_ENGINE):
+    """Verifies the signature of the contents IAW CMS syntax.
+
+    With an engine other than the subprocess one, the contents are verified
+    by the signer of ``[signing] keyfile`` for that engine, so that the pool
+    engine verifies through the same workers as it signs.
+
+    """
+    if engine != SUBPROCESS_ENGINE:
+        signer = get_signer(engine, signing_cert_file_name,
+                            CONF.signing.keyfile)
+        return signer.verify_text(formatted, ca_file_name)
     process = environment.subprocess.Popen(["openssl", "cms", "-verify",
                                             "-certfile",
                                             signing_cert_file_name,
@@ -48,10 +87,12 @@ def token_to_cms(signed_text):
     return formatted
 
 
-def verify_token(token, signing_cert_file_name, ca_file_name):
+def verify_token(token, signing_cert_file_name, ca_file_name,
+                 engine=SUBPROCESS_ENGINE):
     return cms_verify(token_to_cms(token),
                       signing_cert_file_name,
-                      ca_file_name)
+                      ca_file_name,
+                      engine=engine)
 
 
 def is_ans1_token(token):
@@ -124,11 +165,394 @@ def cms_sign_text(text, signing_cert_file_name, signing_key_file_name):
     return output
 
 
-def cms_sign_token(text, signing_cert_file_name, signing_key_file_name):
-    output = cms_sign_text(text, signing_cert_file_name, signing_key_file_name)
+def cms_sign_token(text, signing_cert_file_name, signing_key_file_name,
+                   engine=SUBPROCESS_ENGINE):
+    signer = get_signer(engine, signing_cert_file_name, signing_key_file_name)
+    output = signer.sign_text(text)
     return cms_to_token(output)
 
 
+def _der_length(length):
+    if length < 0x80:
+        return chr(length)
+    octets = ''
+    while length:
+        octets = chr(length & 0xff) + octets
+        length >>= 8
+    return chr(0x80 | len(octets)) + octets
+
+
+def _der(tag, content):
+    return chr(tag) + _der_length(len(content)) + content
+
+
+def _der_read(data, offset=0):
+    """Read a single DER element starting at ``offset``.
+
+    :returns: (tag, offset of the contents, offset past the element)
+
+    """
+    tag = ord(data[offset])
+    length = ord(data[offset + 1])
+    offset += 2
+    if length & 0x80:
+        num_octets = length & 0x7f
+        length = 0
+        for octet in data[offset:offset + num_octets]:
+            length = (length << 8) | ord(octet)
+        offset += num_octets
+    return tag, offset, offset + length
+
+
+def _pem_to_der(pem_text):
+    lines = [line.strip() for line in pem_text.splitlines()]
+    body = [line for line in lines if line and not line.startswith('-----')]
+    return base64.b64decode(''.join(body))
+
+
+def _der_to_pem(der, label='CMS'):
+    encoded = base64.b64encode(der)
+    lines = [encoded[i:i + 64] for i in range(0, len(encoded), 64)]
+    return '-----BEGIN %s-----\n%s\n-----END %s-----\n' % (
+        label, '\n'.join(lines), label)
+
+
+def _issuer_and_serial_number(cert_der):
+    """Extract the raw IssuerAndSerialNumber of a DER certificate."""
+    _tag, tbs_start, _end = _der_read(cert_der)
+    _tag, offset, _end = _der_read(cert_der, tbs_start)
+    tag, _start, end = _der_read(cert_der, offset)
+    if tag == 0xa0:
+        # skip the explicitly tagged, optional version
+        offset = end
+        tag, _start, end = _der_read(cert_der, offset)
+    serial = cert_der[offset:end]
+    # signature AlgorithmIdentifier, then the issuer Name
+    _tag, _start, offset = _der_read(cert_der, end)
+    _tag, _start, end = _der_read(cert_der, offset)
+    issuer = cert_der[offset:end]
+    return _der(0x30, issuer + serial)
+
+
+class SubprocessSigner(object):
+    """Signs documents by running ``openssl cms -sign`` for every call."""
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name):
+        self.signing_cert_file_name = signing_cert_file_name
+        self.signing_key_file_name = signing_key_file_name
+
+    def sign_text(self, text):
+        return cms_sign_text(text,
+                             self.signing_cert_file_name,
+                             self.signing_key_file_name)
+
+    def verify_text(self, formatted, ca_file_name):
+        return cms_verify(formatted, self.signing_cert_file_name, ca_file_name)
+
+
+class InProcessSigner(object):
+    """Signs documents without leaving the python process.
+
+    The signing certificate and key are parsed once, when the signer is
+    created, and every document is then signed with an RSA PKCS#1 v1.5
+    signature over the raw content. The output is the same PEM document
+    ``openssl cms -sign -nosmimecap -nodetach -nocerts -noattr`` produces
+    for the same digest.
+
+    Requires the optional ``cryptography`` library.
+
+    """
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name,
+                 digest='sha256'):
+        from cryptography.hazmat import backends
+        from cryptography.hazmat.primitives.asymmetric import padding
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives import serialization
+
+        self.signing_cert_file_name = signing_cert_file_name
+        if digest not in _DIGEST_OIDS:
+            raise SigningError(_('Unsupported digest: %s') % digest)
+
+        with open(signing_cert_file_name, 'r') as cert_file:
+            cert_der = _pem_to_der(cert_file.read())
+        with open(signing_key_file_name, 'r') as key_file:
+            self._key = serialization.load_pem_private_key(
+                key_file.read(), None, backends.default_backend())
+        if not isinstance(self._key, rsa.RSAPrivateKey):
+            raise SigningError(_('Only RSA signing keys can be used to sign '
+                                 'in-process'))
+
+        self._padding = padding.PKCS1v15()
+        self._hash = getattr(hashes, digest.upper())()
+        digest_algorithm = _der(0x30, _DIGEST_OIDS[digest])
+        self._digest_algorithms = _der(0x31, digest_algorithm)
+        self._signer_info_head = (
+            '\x02\x01\x01' +
+            _issuer_and_serial_number(cert_der) +
+            digest_algorithm +
+            _der(0x30, _OID_RSA_ENCRYPTION + '\x05\x00'))
+
+    def sign_text(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        signature = self._key.sign(text, self._padding, self._hash)
+        signer_info = _der(0x30,
+                           self._signer_info_head + _der(0x04, signature))
+        encap_content_info = _der(
+            0x30, _OID_DATA + _der(0xa0, _der(0x04, text)))
+        signed_data = _der(0x30,
+                           '\x02\x01\x01' +
+                           self._digest_algorithms +
+                           encap_content_info +
+                           _der(0x31, signer_info))
+        content_info = _der(0x30,
+                            _OID_SIGNED_DATA + _der(0xa0, signed_data))
+        return _der_to_pem(content_info)
+
+    def verify_text(self, formatted, ca_file_name):
+        return cms_verify(formatted, self.signing_cert_file_name, ca_file_name)
+
+
+def _write_frame(stream, kind, payload):
+    stream.write('%s %d\n' % (kind, len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+
+def _read_frame(stream):
+    header = stream.readline()
+    if not header:
+        raise EOFError()
+    kind, length = header.split()
+    payload = stream.read(int(length))
+    if len(payload) != int(length):
+        raise EOFError()
+    return kind, payload
+
+
+class _PoolWorker(object):
+    """A long-lived signing process, fed requests over its stdin."""
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name):
+        env = os.environ.copy()
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [root, env.get('PYTHONPATH')]))
+        self.process = environment.subprocess.Popen(
+            [sys.executable, '-m', 'keystone.common.cms',
+             signing_cert_file_name, signing_key_file_name],
+            stdin=environment.subprocess.PIPE,
+            stdout=environment.subprocess.PIPE,
+            env=env)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def call(self, kind, payload):
+        _write_frame(self.process.stdin, kind, payload)
+        return _read_frame(self.process.stdout)
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass
+
+
+class PoolSigner(object):
+    """Signs and verifies documents using a bounded pool of workers.
+
+    Each worker is a python process that stays alive across requests and
+    keeps the signing certificate and key loaded, signing in-process when
+    it can and through openssl otherwise. Callers block while every worker
+    is busy and give up after ``[signing] pool_timeout`` seconds. Workers
+    that die are replaced and the request is retried once.
+
+    """
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name,
+                 size=None, timeout=None):
+        self.signing_cert_file_name = signing_cert_file_name
+        self.signing_key_file_name = signing_key_file_name
+        self.size = size or CONF.signing.pool_size
+        self.timeout = timeout or CONF.signing.pool_timeout
+        self._lock = threading.Lock()
+        self._idle = environment.queue.Queue()
+        # workers are started lazily, the first time their slot is used
+        for _i in range(self.size):
+            self._idle.put(None)
+        self.queue_depth = 0
+        self.calls = 0
+        self.errors = 0
+        self.restarts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def _spawn(self):
+        return _PoolWorker(self.signing_cert_file_name,
+                           self.signing_key_file_name)
+
+    def _count_restart(self):
+        with self._lock:
+            self.restarts += 1
+
+    def _acquire(self):
+        with self._lock:
+            self.queue_depth += 1
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except environment.queue.Empty:
+            raise SigningError(_('No signing worker became available within '
+                                 '%s seconds') % self.timeout)
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+
+    def _call(self, kind, payload):
+        start = time.time()
+        worker = self._acquire()
+        try:
+            if worker is None or not worker.is_alive():
+                if worker is not None:
+                    self._count_restart()
+                worker = self._spawn()
+            try:
+                result = worker.call(kind, payload)
+            except (EOFError, IOError, OSError, ValueError):
+                LOG.warning(_('Signing worker died, restarting it'))
+                worker.kill()
+                self._count_restart()
+                worker = self._spawn()
+                result = worker.call(kind, payload)
+        except Exception:
+            if worker is not None:
+                worker.kill()
+                worker = None
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            self._idle.put(worker)
+
+        latency = time.time() - start
+        with self._lock:
+            self.calls += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        LOG.debug(_('Signing pool %(kind)s took %(latency).4fs, '
+                    '%(depth)d caller(s) waiting'),
+                  {'kind': kind, 'latency': latency,
+                   'depth': self.queue_depth})
+        return result
+
+    def sign_text(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        status, output = self._call('sign', text)
+        if status != 'ok':
+            LOG.error(_('Signing error: %s') % output)
+            raise SigningError(output)
+        return output
+
+    def verify_text(self, formatted, ca_file_name):
+        status, output = self._call('verify',
+                                    '%s\n%s' % (ca_file_name, formatted))
+        if status != 'ok':
+            LOG.error(_('Verify error: %s') % output)
+            raise environment.subprocess.CalledProcessError(1, 'openssl',
+                                                            output=output)
+        return output
+
+    def stats(self):
+        """Return counters describing the pool's recent activity."""
+        with self._lock:
+            average = self.total_latency / self.calls if self.calls else 0.0
+            return {'size': self.size,
+                    'queue_depth': self.queue_depth,
+                    'calls': self.calls,
+                    'errors': self.errors,
+                    'restarts': self.restarts,
+                    'average_latency': average,
+                    'max_latency': self.max_latency}
+
+    def close(self):
+        """Stop every worker that is currently idle."""
+        while True:
+            try:
+                worker = self._idle.get(block=False)
+            except environment.queue.Empty:
+                break
+            if worker is not None:
+                worker.kill()
+
+
+def _worker_main(signing_cert_file_name, signing_key_file_name):
+    """Serve sign and verify requests from stdin until it is closed."""
+    signer = get_signer(INPROCESS_ENGINE,
+                        signing_cert_file_name,
+                        signing_key_file_name)
+    while True:
+        try:
+            kind, payload = _read_frame(sys.stdin)
+        except EOFError:
+            return
+        try:
+            if kind == 'sign':
+                output = signer.sign_text(payload)
+            elif kind == 'verify':
+                ca_file_name, formatted = payload.split('\n', 1)
+                output = signer.verify_text(formatted, ca_file_name)
+            else:
+                raise ValueError(kind)
+        except environment.subprocess.CalledProcessError as e:
+            _write_frame(sys.stdout, 'error', e.output or str(e))
+        except Exception as e:
+            _write_frame(sys.stdout, 'error', str(e))
+        else:
+            _write_frame(sys.stdout, 'ok', output)
+
+
+SIGNING_ENGINES = {
+    SUBPROCESS_ENGINE: SubprocessSigner,
+    INPROCESS_ENGINE: InProcessSigner,
+    POOL_ENGINE: PoolSigner,
+}
+
+_signers = {}
+
+
+def get_signer(engine, signing_cert_file_name, signing_key_file_name):
+    """Return the signer for ``engine``, creating it on first use.
+
+    Signers are kept for the life of the process so that certificates and
+    keys are only loaded once per worker. If the engine cannot be created,
+    the subprocess signer is used instead.
+
+    """
+    key = (engine, signing_cert_file_name, signing_key_file_name)
+    signer = _signers.get(key)
+    if signer is None:
+        try:
+            signer_class = SIGNING_ENGINES[engine]
+        except KeyError:
+            raise SigningError(_('Unknown signing engine: %s') % engine)
+        try:
+            signer = signer_class(signing_cert_file_name,
+                                  signing_key_file_name)
+        except (ImportError, IOError, ValueError, SigningError) as e:
+            LOG.warning(_('Unable to use the %(engine)s signing engine, '
+                          'falling back to openssl subprocesses: %(error)s'),
+                        {'engine': engine, 'error': e})
+            signer = SubprocessSigner(signing_cert_file_name,
+                                      signing_key_file_name)
+        _signers[key] = signer
+    return signer
+
+
 def cms_to_token(cms_text):
 
     start_delim = "-----BEGIN CMS-----"
@@ -156,3 +580,12 @@ def cms_hash_token(token_id):
         return hasher.hexdigest()
     else:
         return token_id
+
+
+if __name__ == '__main__':
+    import gettext
+    import logging as std_logging
+    gettext.install('keystone', unicode=1)
+    std_logging.basicConfig()
+    environment.use_stdlib()
+    _worker_main(*sys.argv[1:3])
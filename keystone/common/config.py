@@ -57,7 +57,8 @@ FILE_OPTIONS = {
         cfg.StrOpt('driver',
                    default=('keystone.identity.backends'
                             '.sql.Identity')),
-        cfg.IntOpt('max_password_length', default=4096)],
+        cfg.IntOpt('max_password_length', default=4096),
+        cfg.BoolOpt('request_cache', default=True)],
     'trust': [
         cfg.BoolOpt('enabled', default=True),
         cfg.StrOpt('driver',
@@ -68,6 +69,13 @@ FILE_OPTIONS = {
         cfg.ListOpt('bind', default=[]),
         cfg.StrOpt('enforce_token_bind', default='permissive'),
         cfg.IntOpt('expiration', default=86400),
+        cfg.IntOpt('revocation_cache_time', default=0),
+        cfg.IntOpt('validation_cache_time', default=0),
+        cfg.IntOpt('validation_cache_size', default=1000),
+        cfg.IntOpt('flush_batch_size', default=0),
+        cfg.FloatOpt('flush_batch_sleep', default=0.0),
+        cfg.IntOpt('flush_max_runtime', default=0),
+        cfg.IntOpt('partition_window', default=3600),
         cfg.StrOpt('provider', default=None),
         cfg.StrOpt('driver',
                    default='keystone.token.backends.sql.Token')],
@@ -89,6 +97,9 @@ FILE_OPTIONS = {
                    default='/C=US/ST=Unset/L=Unset/O=Unset/CN=localhost')],
     'signing': [
         cfg.StrOpt('token_format', default=None),
+        cfg.StrOpt('engine', default='subprocess'),
+        cfg.IntOpt('pool_size', default=4),
+        cfg.IntOpt('pool_timeout', default=30),
         cfg.StrOpt('certfile',
                    default="/etc/keystone/ssl/certs/signing_cert.pem"),
         cfg.StrOpt('keyfile',
@@ -111,7 +122,9 @@ FILE_OPTIONS = {
         # assignment has no default for backward compatibility reasons.
         # If assignment driver is not specified, the identity driver chooses
         # the backend
-        cfg.StrOpt('driver', default=None)],
+        cfg.StrOpt('driver', default=None),
+        cfg.IntOpt('cache_time', default=0),
+        cfg.IntOpt('cache_size', default=1000)],
     'credential': [
         cfg.StrOpt('driver',
                    default=('keystone.credential.backends'
@@ -123,14 +136,17 @@ FILE_OPTIONS = {
         cfg.IntOpt('access_token_duration', default=86400)],
     'policy': [
         cfg.StrOpt('driver',
-                   default='keystone.policy.backends.sql.Policy')],
+                   default='keystone.policy.backends.sql.Policy'),
+        cfg.FloatOpt('reload_interval', default=1.0)],
     'ec2': [
         cfg.StrOpt('driver',
                    default='keystone.contrib.ec2.backends.kvs.Ec2')],
     'stats': [
         cfg.StrOpt('driver',
                    default=('keystone.contrib.stats.backends'
-                            '.kvs.Stats'))],
+                            '.kvs.Stats')),
+        cfg.BoolOpt('instrument_managers', default=False),
+        cfg.IntOpt('instrumentation_log_interval', default=0)],
     'ldap': [
         cfg.StrOpt('url', default='ldap://localhost'),
         cfg.StrOpt('user', default=None),
@@ -233,10 +249,20 @@ FILE_OPTIONS = {
         cfg.StrOpt('config_file', default=None)],
     'memcache': [
         cfg.StrOpt('servers', default='localhost:11211'),
-        cfg.IntOpt('max_compare_and_set_retry', default=16)],
+        cfg.IntOpt('max_compare_and_set_retry', default=16),
+        cfg.IntOpt('token_index_bucket_time', default=3600),
+        cfg.IntOpt('token_index_shards', default=4)],
+    'invalidation': [
+        cfg.StrOpt(
+            'driver',
+            default='keystone.invalidation.backends.local.Invalidation'),
+        cfg.FloatOpt('poll_interval', default=1.0),
+        cfg.StrOpt('socket_dir', default='/var/run/keystone/invalidation')],
     'catalog': [
         cfg.StrOpt('template_file',
                    default='default_catalog.templates'),
+        cfg.IntOpt('cache_time', default=0),
+        cfg.IntOpt('cache_size', default=1000),
         cfg.StrOpt('driver',
                    default='keystone.catalog.backends.sql.Catalog')]}
 
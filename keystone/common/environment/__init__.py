@@ -8,12 +8,13 @@ CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
 
-__all__ = ['Server', 'httplib', 'subprocess']
+__all__ = ['Server', 'httplib', 'queue', 'subprocess']
 
 _configured = False
 
 Server = None
 httplib = None
+queue = None
 subprocess = None
 
 
@@ -44,7 +45,7 @@ def configure_once(name):
 
 @configure_once('eventlet')
 def use_eventlet(monkeypatch_thread=None):
-    global httplib, subprocess, Server
+    global httplib, queue, subprocess, Server
 
     # This must be set before the initial import of eventlet because if
     # dnspython is present in your environment then eventlet monkeypatches
@@ -54,6 +55,7 @@ def use_eventlet(monkeypatch_thread=None):
     import eventlet
     from eventlet.green import httplib as _httplib
     from eventlet.green import subprocess as _subprocess
+    from eventlet import queue as _queue
     from keystone.common.environment import eventlet_server
 
     if monkeypatch_thread is None:
@@ -67,15 +69,18 @@ def use_eventlet(monkeypatch_thread=None):
 
     Server = eventlet_server.Server
     httplib = _httplib
+    queue = _queue
     subprocess = _subprocess
 
 
 @configure_once('stdlib')
 def use_stdlib():
-    global httplib, subprocess
+    global httplib, queue, subprocess
 
     import httplib as _httplib
+    import Queue as _queue
     import subprocess as _subprocess
 
     httplib = _httplib
+    queue = _queue
     subprocess = _subprocess
@@ -0,0 +1,166 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Timing of the calls made by the managers to their drivers.
+
+When ``[stats] instrument_managers`` is enabled, each manager wraps its driver
+in an :class:`InstrumentedDriver`, which records the latency and the outcome
+of every driver method call in :data:`TIMINGS`. The timings are reported by
+the ``OS-STATS`` extension and, every ``[stats] instrumentation_log_interval``
+seconds, written to the log.
+
+"""
+
+import bisect
+import functools
+import inspect
+import time
+
+from keystone.common import config
+from keystone.openstack.common import log as logging
+
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the buckets of the latency histograms; a last
+# bucket holds the calls slower than all of them.
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+
+class Timing(object):
+    """Calls, errors and latency histogram of one driver method."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def record(self, elapsed, error):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.histogram[bisect.bisect_left(BUCKETS, elapsed)] += 1
+
+    def to_dict(self):
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'total_time': self.total_time,
+                'max_time': self.max_time,
+                'histogram': [{'le': le, 'calls': calls}
+                              for le, calls in zip(BUCKETS + (None,),
+                                                   self.histogram)]}
+
+
+class Timings(object):
+    """Timings of the driver methods, keyed by (manager, method)."""
+
+    def __init__(self):
+        self._timings = {}
+        self._next_dump = None
+
+    def record(self, manager, method, elapsed, error=False):
+        try:
+            timing = self._timings[(manager, method)]
+        except KeyError:
+            timing = self._timings.setdefault((manager, method), Timing())
+        timing.record(elapsed, error)
+        self._dump_if_due()
+
+    def report(self):
+        """Return the timings, the methods taking the most time first."""
+        report = []
+        for (manager, method), timing in self._timings.items():
+            ref = timing.to_dict()
+            ref.update(manager=manager, method=method)
+            report.append(ref)
+        report.sort(key=lambda ref: ref['total_time'], reverse=True)
+        return report
+
+    def reset(self):
+        self._timings.clear()
+
+    def dump(self):
+        """Write the timings to the log."""
+        for ref in self.report():
+            histogram = ' '.join(
+                '%s:%d' % ('<=%gms' % (h['le'] * 1000) if h['le'] else
+                           '>%gms' % (BUCKETS[-1] * 1000), h['calls'])
+                for h in ref['histogram'] if h['calls'])
+            LOG.info(_('%(manager)s %(method)s: %(calls)d calls, %(errors)d '
+                       'errors, %(mean).1f ms mean, %(max).1f ms max '
+                       '(%(histogram)s)'),
+                     {'manager': ref['manager'],
+                      'method': ref['method'],
+                      'calls': ref['calls'],
+                      'errors': ref['errors'],
+                      'mean': ref['total_time'] * 1000 / ref['calls'],
+                      'max': ref['max_time'] * 1000,
+                      'histogram': histogram})
+
+    def _dump_if_due(self):
+        interval = CONF.stats.instrumentation_log_interval
+        if not interval:
+            return
+        now = time.time()
+        if self._next_dump is None:
+            self._next_dump = now + interval
+        elif now >= self._next_dump:
+            self._next_dump = now + interval
+            self.dump()
+
+
+TIMINGS = Timings()
+
+
+def timed(manager, method, f):
+    """Wrap ``f`` to record its timing as ``method`` of ``manager``."""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        error = True
+        try:
+            result = f(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            TIMINGS.record(manager, method, time.time() - start, error)
+    return wrapper
+
+
+class InstrumentedDriver(object):
+    """Proxy timing the method calls made to a driver.
+
+    Calls the driver makes to its own methods are not timed separately.
+
+    """
+
+    def __init__(self, manager, driver):
+        object.__setattr__(self, '_manager', manager)
+        object.__setattr__(self, '_driver', driver)
+
+    def __getattr__(self, name):
+        value = getattr(self._driver, name)
+        if name.startswith('_') or not inspect.ismethod(value):
+            return value
+        return timed(self._manager, name, value)
+
+    def __setattr__(self, name, value):
+        setattr(self._driver, name, value)
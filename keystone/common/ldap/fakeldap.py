@@ -54,7 +54,8 @@ def _match_query(query, attrs):
     if inner.startswith(('&', '|')):
         # cut off the & or |
         groups = _paren_groups(inner[1:])
-        return all(_match_query(group, attrs) for group in groups)
+        match = all if inner.startswith('&') else any
+        return match(_match_query(group, attrs) for group in groups)
     if inner.startswith('!'):
         # cut off the ! and the nested parentheses
         return not _match_query(query[2:-1], attrs)
@@ -16,9 +16,14 @@
 
 import functools
 
+from keystone.common import config
+from keystone.common import instrumentation
 from keystone.openstack.common import importutils
 
 
+CONF = config.CONF
+
+
 class Manager(object):
     """Base class for intermediary request layer.
 
@@ -30,10 +35,16 @@ class Manager(object):
 
     An example of a probable use case is logging all the calls.
 
+    When ``[stats] instrument_managers`` is enabled, the calls made to the
+    driver are timed; see :mod:`keystone.common.instrumentation`.
+
     """
 
     def __init__(self, driver_name):
         self.driver = importutils.import_object(driver_name)
+        if CONF.stats.instrument_managers:
+            self.driver = instrumentation.InstrumentedDriver(
+                self.__module__, self.driver)
 
     def __getattr__(self, name):
         """Forward calls to the underlying driver."""
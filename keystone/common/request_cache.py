@@ -0,0 +1,157 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Memoization of manager lookups for the duration of a request.
+
+Serving one request, such as issuing a token, reads the same user, project
+and domain several times. While a request cache is started, the ``get_*``
+methods of the managers decorated with :func:`memoize` return what they
+returned earlier in the request for the same arguments. Any other method,
+except ``authenticate`` and the ``list_*`` and ``check_*`` ones, drops
+everything cached, so that a request always sees the changes it makes.
+
+Lookups are keyed by method name and arguments, whichever manager they are
+made on, as the identity manager hands the lookups of projects, domains and
+roles to the assignment manager.
+
+The managers are not given the request context, so the cache of the request
+being served is kept in (green)thread local storage, like the request context
+of the other OpenStack services.
+
+"""
+
+import copy
+import functools
+import inspect
+
+from keystone.openstack.common import local
+
+
+READ_PREFIXES = ('list_', 'check_', 'authenticate')
+
+
+class RequestCache(object):
+    """Results of the lookups made while serving one request.
+
+    ``lookups`` counts the ``get_*`` calls made by the request, and
+    ``backend_calls`` those that were not served from the cache. Lookups made
+    by another lookup, such as the identity manager asking the assignment
+    manager for a domain, are not counted.
+
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._depth = 0
+        self.lookups = 0
+        self.backend_calls = 0
+
+    def lookup(self, key, f, args, kwargs):
+        key = (key, args, tuple(sorted(kwargs.iteritems())))
+        top = not self._depth
+        if top:
+            self.lookups += 1
+        try:
+            return copy.deepcopy(self._values[key])
+        except KeyError:
+            cacheable = True
+        except TypeError:
+            # NOTE: the arguments are not hashable, so they cannot be a key.
+            cacheable = False
+
+        if top:
+            self.backend_calls += 1
+        self._depth += 1
+        try:
+            value = f(*args, **kwargs)
+        finally:
+            self._depth -= 1
+        if cacheable:
+            self._values[key] = copy.deepcopy(value)
+        return value
+
+    def clear(self):
+        self._values.clear()
+
+
+def start():
+    """Start caching the lookups of the current request."""
+    cache = RequestCache()
+    local.strong_store.request_cache = cache
+    return cache
+
+
+def stop():
+    """Discard the cache of the current request and return it."""
+    cache = current()
+    local.strong_store.request_cache = None
+    return cache
+
+
+def current():
+    """Return the cache of the current request, or None."""
+    return getattr(local.strong_store, 'request_cache', None)
+
+
+def _wrap(name, f, method):
+    if name.startswith('get_'):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            cache = current()
+            if cache is None:
+                return f(*args, **kwargs)
+            if method:
+                # NOTE: the manager itself is not part of the key.
+                return cache.lookup(name, functools.partial(f, args[0]),
+                                    args[1:], kwargs)
+            return cache.lookup(name, f, args, kwargs)
+    elif name.startswith(READ_PREFIXES):
+        return f
+    else:
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            try:
+                return f(*args, **kwargs)
+            finally:
+                cache = current()
+                if cache is not None:
+                    cache.clear()
+    return wrapper
+
+
+def memoize(cls):
+    """Class decorator memoizing the lookups of a manager within requests.
+
+    Both the public methods of the class and those forwarded to its driver are
+    wrapped.
+
+    """
+    for name, f in vars(cls).items():
+        if not name.startswith('_') and inspect.isfunction(f):
+            setattr(cls, name, _wrap(name, f, method=True))
+
+    forward = cls.__getattr__
+
+    def __getattr__(self, name):
+        f = forward(self, name)
+        if name.startswith('_'):
+            return f
+        f = _wrap(name, f, method=False)
+        setattr(self, name, f)
+        return f
+
+    cls.__getattr__ = __getattr__
+    return cls
@@ -51,12 +51,17 @@ ForeignKey = sql.ForeignKey
 DateTime = sql.DateTime
 IntegrityError = sql.exc.IntegrityError
 OperationalError = sql.exc.OperationalError
+ProgrammingError = sql.exc.ProgrammingError
 NotFound = sql.orm.exc.NoResultFound
 Boolean = sql.Boolean
 Text = sql.Text
 UniqueConstraint = sql.UniqueConstraint
 relationship = sql.orm.relationship
 joinedload = sql.orm.joinedload
+select = sql.select
+union_all = sql.union_all
+and_ = sql.and_
+literal = sql.literal
 
 
 def initialize_decorator(init):
@@ -0,0 +1,29 @@
+import sqlalchemy as sql
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    token_partition = sql.Table(
+        'token_partition',
+        meta,
+        sql.Column('name', sql.String(64), primary_key=True),
+        sql.Column('expires_from', sql.DateTime(), nullable=False),
+        sql.Column('expires_before', sql.DateTime(), nullable=False))
+    token_partition.create(migrate_engine, checkfirst=True)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    # NOTE: the partitions themselves are dropped as well; they only hold
+    # tokens, which are lost on downgrade.
+    token_partition = sql.Table('token_partition', meta, autoload=True)
+    names = [row[0] for row in
+             sql.select([token_partition.c.name]).execute()]
+    for name in names:
+        partition = sql.Table(name, meta)
+        partition.drop(migrate_engine, checkfirst=True)
+    token_partition.drop(migrate_engine, checkfirst=True)
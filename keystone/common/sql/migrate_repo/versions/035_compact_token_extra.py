@@ -0,0 +1,72 @@
+import datetime
+import json
+
+import sqlalchemy as sql
+
+
+# NOTE: rows are rewritten in batches of this size, so that converting a
+# large token table does not hold one long transaction.
+BATCH_SIZE = 1000
+
+
+def compact_extra(extra):
+    """Convert a version 1 token reference to the version 2 format."""
+    token_data = extra.get('token_data')
+    if 'persistence_version' in extra or (not token_data and
+                                          'key' not in extra):
+        return None
+
+    extra.pop('key', None)
+    catalog_omitted = False
+    if token_data:
+        for body, catalog_key in ((token_data.get('access'), 'serviceCatalog'),
+                                  (token_data.get('token'), 'catalog')):
+            if body and catalog_key in body:
+                del body[catalog_key]
+                catalog_omitted = True
+    extra['catalog_omitted'] = catalog_omitted
+    extra['persistence_version'] = 2
+    return extra
+
+
+def compact_table(migrate_engine, table):
+    # expired tokens are only waiting to be flushed, leave them alone
+    now = datetime.datetime.utcnow()
+    last_id = ''
+    while True:
+        query = sql.select([table.c.id, table.c.extra])
+        query = query.where(table.c.expires > now)
+        query = query.where(table.c.id > last_id)
+        query = query.order_by(table.c.id).limit(BATCH_SIZE)
+        rows = migrate_engine.execute(query).fetchall()
+        if not rows:
+            break
+        with migrate_engine.begin() as conn:
+            for token_id, extra in rows:
+                extra = compact_extra(json.loads(extra or '{}'))
+                if extra is not None:
+                    conn.execute(table.update().
+                                 where(table.c.id == token_id).
+                                 values(extra=json.dumps(extra)))
+        last_id = rows[-1][0]
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    token = sql.Table('token', meta, autoload=True)
+    compact_table(migrate_engine, token)
+
+    token_partition = sql.Table('token_partition', meta, autoload=True)
+    for (name,) in sql.select([token_partition.c.name]).execute():
+        if migrate_engine.has_table(name):
+            compact_table(migrate_engine,
+                          sql.Table(name, meta, autoload=True))
+
+
+def downgrade(migrate_engine):
+    # NOTE: the service catalogs left out of existing tokens can not be
+    # restored. Version 2 token references remain readable, the earlier code
+    # simply returns them without a catalog until they expire.
+    pass
@@ -0,0 +1,93 @@
+import datetime
+import json
+
+import sqlalchemy as sql
+
+
+BATCH_SIZE = 1000
+
+
+def token_tables(meta, migrate_engine):
+    """Return the token table and the token partition tables."""
+    tables = [sql.Table('token', meta, autoload=True)]
+    token_partition = sql.Table('token_partition', meta, autoload=True)
+    for (name,) in sql.select([token_partition.c.name]).execute():
+        if migrate_engine.has_table(name):
+            tables.append(sql.Table(name, meta, autoload=True))
+    return tables
+
+
+def indexes(table):
+    return [sql.Index('ix_%s_user_id_tenant_id' % table.name,
+                      table.c.user_id, table.c.tenant_id),
+            sql.Index('ix_%s_user_id_consumer_id' % table.name,
+                      table.c.user_id, table.c.consumer_id),
+            sql.Index('ix_%s_trust_id' % table.name, table.c.trust_id)]
+
+
+def scope_of(extra):
+    tenant_id = None
+    consumer_id = None
+    if extra.get('tenant'):
+        tenant_id = extra['tenant'].get('id')
+    token_data = extra.get('token_data') or {}
+    oauth = token_data.get('token', {}).get('OS-OAUTH1')
+    if oauth:
+        consumer_id = oauth.get('consumer_id')
+    return tenant_id, consumer_id
+
+
+def populate_table(migrate_engine, table):
+    # expired tokens are only waiting to be flushed, leave them alone
+    now = datetime.datetime.utcnow()
+    last_id = ''
+    while True:
+        query = sql.select([table.c.id, table.c.extra])
+        query = query.where(table.c.expires > now)
+        query = query.where(table.c.id > last_id)
+        query = query.order_by(table.c.id).limit(BATCH_SIZE)
+        rows = migrate_engine.execute(query).fetchall()
+        if not rows:
+            break
+        with migrate_engine.begin() as conn:
+            for token_id, extra in rows:
+                tenant_id, consumer_id = scope_of(json.loads(extra or '{}'))
+                if tenant_id or consumer_id:
+                    conn.execute(table.update().
+                                 where(table.c.id == token_id).
+                                 values(tenant_id=tenant_id,
+                                        consumer_id=consumer_id))
+        last_id = rows[-1][0]
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    for table in token_tables(meta, migrate_engine):
+        table.create_column(sql.Column('tenant_id', sql.String(64)))
+        table.create_column(sql.Column('consumer_id', sql.String(64)))
+        for idx in indexes(table):
+            idx.create(migrate_engine)
+        populate_table(migrate_engine, table)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    names = []
+    for table in token_tables(meta, migrate_engine):
+        for idx in indexes(table):
+            idx.drop(migrate_engine)
+        names.append(table.name)
+
+    # NOTE: sqlite drops a column by recreating the table, dropping every
+    # index the table object knows about first, so reload the tables now
+    # that the indexes above are gone.
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    for name in names:
+        table = sql.Table(name, meta, autoload=True)
+        table.drop_column('tenant_id')
+        table.drop_column('consumer_id')
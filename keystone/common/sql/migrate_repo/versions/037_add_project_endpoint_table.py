@@ -0,0 +1,22 @@
+import sqlalchemy as sql
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    project_endpoint = sql.Table(
+        'project_endpoint',
+        meta,
+        sql.Column('endpoint_id', sql.String(64), primary_key=True),
+        sql.Column('project_id', sql.String(64), primary_key=True),
+        sql.Index('ix_project_endpoint_project_id', 'project_id'))
+    project_endpoint.create(migrate_engine, checkfirst=True)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    project_endpoint = sql.Table('project_endpoint', meta, autoload=True)
+    project_endpoint.drop(migrate_engine, checkfirst=True)
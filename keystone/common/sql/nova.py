@@ -22,6 +22,7 @@ from keystone import assignment
 from keystone import config
 from keystone.contrib.ec2.backends import sql as ec2_sql
 from keystone import identity
+from keystone import invalidation
 from keystone.openstack.common import log as logging
 
 
@@ -31,6 +32,8 @@ DEFAULT_DOMAIN_ID = CONF.identity.default_domain_id
 
 
 def import_auth(data):
+    # NOTE: publishes the new grants to the caches of the running servers.
+    invalidation.Manager()
     identity_api = identity.Manager()
     assignment_api = assignment.Manager()
 
@@ -56,6 +56,95 @@ def read_cached_file(filename, cache_info, reload_func=None):
     return cache_info['data']
 
 
+# fields of the entries of the linked list of an LRUCache
+_PREV, _NEXT, _KEY, _EXPIRES, _VALUE = range(5)
+
+
+class LRUCache(object):
+    """A bounded, in-process cache of values that expire.
+
+    Every value is cached until a unix timestamp given when it is set. Once
+    ``size`` values are cached, setting another discards the least recently
+    used one. The lookups answered from the cache, and those that were not,
+    are counted in ``hits`` and ``misses``.
+
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        # NOTE: collections.OrderedDict does not exist on python 2.6, so the
+        # entries are indexed by key and kept in a circular, doubly linked
+        # list, from the least to the most recently used.
+        self._entries = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, None]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _link(self, entry):
+        last = self._root[_PREV]
+        entry[_PREV] = last
+        entry[_NEXT] = self._root
+        last[_NEXT] = self._root[_PREV] = entry
+
+    def _unlink(self, entry):
+        entry[_PREV][_NEXT] = entry[_NEXT]
+        entry[_NEXT][_PREV] = entry[_PREV]
+
+    def get(self, key, default=None):
+        """Return the value cached for key, or default."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[_EXPIRES] <= time.time():
+            self.invalidate(key)
+            self.misses += 1
+            return default
+        # moving the entry to the end marks it as the most recently used
+        self._unlink(entry)
+        self._link(entry)
+        self.hits += 1
+        return entry[_VALUE]
+
+    def set(self, key, value, expires):
+        """Cache value for key until the unix timestamp expires."""
+        if self.size <= 0 or expires <= time.time():
+            return
+        self.invalidate(key)
+        entry = [None, None, key, expires, value]
+        self._link(entry)
+        self._entries[key] = entry
+        while len(self._entries) > self.size:
+            self.invalidate(self._root[_NEXT][_KEY])
+
+    @property
+    def hit_rate(self):
+        """Return the share of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def invalidate(self, key):
+        """Discard the value cached for key, if any."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._unlink(entry)
+
+    def invalidate_if(self, predicate):
+        """Discard the values for which predicate(key, value) is true."""
+        for key, entry in self._entries.items():
+            if predicate(key, entry[_VALUE]):
+                self.invalidate(key)
+
+    def clear(self):
+        """Discard every cached value."""
+        self._entries.clear()
+        self._root[:] = [self._root, self._root, None, None, None]
+
+
 class SmarterEncoder(json.JSONEncoder):
     """Help for JSON encoding dict-like objects."""
     def default(self, obj):
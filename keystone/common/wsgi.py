@@ -27,6 +27,7 @@ import webob.dec
 import webob.exc
 
 from keystone.common import config
+from keystone.common import request_cache
 from keystone.common import utils
 from keystone import exception
 from keystone.openstack.common import gettextutils
@@ -233,6 +234,8 @@ class Application(BaseApplication):
         # NOTE(vish): make sure we have no unicode keys for py2.6.
         params = self._normalize_dict(params)
 
+        if CONF.identity.request_cache:
+            request_cache.start()
         try:
             result = method(context, **params)
         except exception.Unauthorized as e:
@@ -251,6 +254,14 @@ class Application(BaseApplication):
             LOG.exception(e)
             return render_exception(exception.UnexpectedError(exception=e),
                                     user_locale=req.best_match_language())
+        finally:
+            cache = request_cache.stop()
+            if cache is not None:
+                LOG.debug(_('%(path)s: %(lookups)d identity and assignment '
+                            'lookups, %(backend_calls)d backend calls'),
+                          {'path': context['path'],
+                           'lookups': cache.lookups,
+                           'backend_calls': cache.backend_calls})
 
         if result is None:
             return render_response(status=(204, 'No Content'))
@@ -301,9 +312,9 @@ class Application(BaseApplication):
                 LOG.debug('Invalid tenant')
                 raise exception.Unauthorized()
 
-            # NOTE(vish): this is pretty inefficient
-            creds['roles'] = [self.identity_api.get_role(role)['name']
-                              for role in creds.get('roles', [])]
+            creds['roles'] = [
+                role['name'] for role in
+                self.identity_api.get_roles(creds.get('roles', []))]
             # Accept either is_admin or the admin role
             self.policy_api.enforce(creds, 'admin_required', {})
 
@@ -0,0 +1,65 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Extension restricting the catalogs of projects to chosen endpoints."""
+
+from keystone.catalog import controllers as catalog_controllers
+from keystone.common import controller
+from keystone.common import dependency
+from keystone import exception
+from keystone.identity import controllers as identity_controllers
+
+
+@dependency.requires('assignment_api', 'catalog_api')
+class EndpointFilterV3Controller(controller.V3Controller):
+
+    @controller.protected
+    def add_endpoint_to_project(self, context, project_id, endpoint_id):
+        """Restricts the catalog of a project to, among others, an endpoint."""
+        self.assignment_api.get_project(project_id)
+        self.catalog_api.add_endpoint_to_project(endpoint_id, project_id)
+
+    @controller.protected
+    def check_endpoint_in_project(self, context, project_id, endpoint_id):
+        """Checks if an endpoint was added to the catalog of a project."""
+        self.catalog_api.check_endpoint_in_project(endpoint_id, project_id)
+
+    @controller.protected
+    def list_endpoints_for_project(self, context, project_id):
+        """Lists the endpoints added to the catalog of a project."""
+        self.assignment_api.get_project(project_id)
+        refs = self.catalog_api.list_endpoints_for_project(project_id)
+        return catalog_controllers.EndpointV3.wrap_collection(context, refs)
+
+    @controller.protected
+    def remove_endpoint_from_project(self, context, project_id, endpoint_id):
+        """Removes an endpoint from the catalog of a project."""
+        self.catalog_api.remove_endpoint_from_project(endpoint_id,
+                                                      project_id)
+
+    @controller.protected
+    def list_projects_for_endpoint(self, context, endpoint_id):
+        """Lists the projects whose catalog an endpoint was added to."""
+        self.catalog_api.get_endpoint(endpoint_id)
+        refs = []
+        for project_id in self.catalog_api.list_projects_for_endpoint(
+                endpoint_id):
+            try:
+                refs.append(self.assignment_api.get_project(project_id))
+            except exception.ProjectNotFound:
+                # NOTE: the associations of deleted projects are left behind.
+                pass
+        return identity_controllers.ProjectV3.wrap_collection(context, refs)
@@ -15,6 +15,7 @@
 # under the License.
 
 from keystone.common import extension
+from keystone.common import instrumentation
 from keystone.common import manager
 from keystone.common import wsgi
 from keystone import config
@@ -90,6 +91,16 @@ class StatsExtension(wsgi.ExtensionRouter):
             controller=stats_controller,
             action='reset_stats',
             conditions=dict(method=['DELETE']))
+        mapper.connect(
+            '/OS-STATS/managers',
+            controller=stats_controller,
+            action='get_manager_stats',
+            conditions=dict(method=['GET']))
+        mapper.connect(
+            '/OS-STATS/managers',
+            controller=stats_controller,
+            action='reset_manager_stats',
+            conditions=dict(method=['DELETE']))
 
 
 class StatsController(wsgi.Application):
@@ -122,6 +133,14 @@ class StatsController(wsgi.Application):
         self.stats_api.set_stats('public', dict())
         self.stats_api.set_stats('admin', dict())
 
+    def get_manager_stats(self, context):
+        self.assert_admin(context)
+        return {'OS-STATS:managers': instrumentation.TIMINGS.report()}
+
+    def reset_manager_stats(self, context):
+        self.assert_admin(context)
+        instrumentation.TIMINGS.reset()
+
 
 class StatsMiddleware(wsgi.Middleware):
     """Monitors various request/response attribute statistics."""
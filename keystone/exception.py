@@ -149,6 +149,11 @@ class EndpointNotFound(NotFound):
     message_format = _("Could not find endpoint, %(endpoint_id)s.")
 
 
+class ProjectEndpointNotFound(NotFound):
+    message_format = _("Could not find endpoint, %(endpoint_id)s, in"
+                       " project, %(project_id)s.")
+
+
 class MetadataNotFound(NotFound):
     """(dolph): metadata is not a user-facing concept,
     so this exception should not be exposed
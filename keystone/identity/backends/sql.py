@@ -201,10 +201,9 @@ class Identity(sql.Base, identity.Driver):
     def list_groups_for_user(self, user_id):
         session = self.get_session()
         self.get_user(user_id)
-        query = session.query(UserGroupMembership)
-        query = query.filter_by(user_id=user_id)
-        membership_refs = query.all()
-        return [self.get_group(x.group_id) for x in membership_refs]
+        query = session.query(Group).join(UserGroupMembership)
+        query = query.filter(UserGroupMembership.user_id == user_id)
+        return [group_ref.to_dict() for group_ref in query]
 
     def list_users_in_group(self, group_id):
         session = self.get_session()
@@ -272,8 +272,7 @@ class Role(controller.V2Controller):
 
         roles = self.identity_api.get_roles_for_user_and_project(
             user_id, tenant_id)
-        return {'roles': [self.identity_api.get_role(x)
-                          for x in roles]}
+        return {'roles': self.identity_api.get_roles(roles)}
 
     # CRUD extension
     def get_role(self, context, role_id):
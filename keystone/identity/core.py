@@ -24,6 +24,7 @@ from oslo.config import cfg
 from keystone import clean
 from keystone.common import dependency
 from keystone.common import manager
+from keystone.common import request_cache
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import importutils
@@ -174,6 +175,7 @@ def domains_configured(f):
 
 @dependency.provider('identity_api')
 @dependency.requires('assignment_api')
+@request_cache.memoize
 class Manager(manager.Manager):
     """Default pivot point for the Identity backend.
 
@@ -363,12 +365,18 @@ class Manager(manager.Manager):
     @domains_configured
     def add_user_to_group(self, user_id, group_id, domain_scope=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
-        driver.add_user_to_group(user_id, group_id)
+        try:
+            driver.add_user_to_group(user_id, group_id)
+        finally:
+            self.assignment_api.invalidate_roles(user_id=user_id)
 
     @domains_configured
     def remove_user_from_group(self, user_id, group_id, domain_scope=None):
         domain_id, driver = self._get_domain_id_and_driver(domain_scope)
-        driver.remove_user_from_group(user_id, group_id)
+        try:
+            driver.remove_user_from_group(user_id, group_id)
+        finally:
+            self.assignment_api.invalidate_roles(user_id=user_id)
 
     @domains_configured
     def list_groups_for_user(self, user_id, domain_scope=None):
@@ -428,6 +436,9 @@ class Manager(manager.Manager):
     def get_role(self, role_id):
         return self.assignment_api.get_role(role_id)
 
+    def get_roles(self, role_ids):
+        return self.assignment_api.get_roles(role_ids)
+
     def list_roles(self):
         return self.assignment_api.list_roles()
 
@@ -0,0 +1,96 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import
+import uuid
+
+import memcache
+
+from keystone import config
+from keystone import invalidation
+from keystone.openstack.common import log as logging
+
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+# Seconds an event is kept in memcache for processes that have not polled.
+EVENT_TIME = 600
+
+# Processes that missed more events than this invalidate everything.
+MAX_EVENTS = 100
+
+
+class Invalidation(invalidation.Driver):
+    """Carries invalidated topics between hosts through memcache.
+
+    Every event is stored under its own key, numbered by a counter in
+    memcache. Processes read the counter when they poll and fetch the events
+    they have not seen yet with a single get_multi. When events were lost,
+    because they expired or memcache was restarted, everything is
+    invalidated.
+
+    """
+
+    sequence_key = 'invalidation-sequence'
+
+    def __init__(self, client=None):
+        self._memcache_client = client
+        self._origin = uuid.uuid4().hex
+        self._sequence = None
+
+    @property
+    def client(self):
+        return self._memcache_client or self._get_memcache_client()
+
+    def _get_memcache_client(self):
+        memcache_servers = CONF.memcache.servers.split(',')
+        self._memcache_client = memcache.Client(memcache_servers, debug=0)
+        return self._memcache_client
+
+    def _event_key(self, sequence):
+        return 'invalidation-%d' % sequence
+
+    def publish(self, topic):
+        sequence = self.client.incr(self.sequence_key)
+        if sequence is None:
+            self.client.add(self.sequence_key, '0')
+            sequence = self.client.incr(self.sequence_key)
+        if sequence is None:
+            LOG.warning(_('Unable to publish invalidated topic %s'), topic)
+            return
+        self.client.set(self._event_key(int(sequence)),
+                        {'topic': topic, 'origin': self._origin},
+                        time=EVENT_TIME)
+
+    def receive(self):
+        sequence = int(self.client.get(self.sequence_key) or 0)
+        last, self._sequence = self._sequence, sequence
+        if last is None or sequence == last:
+            return []
+        if sequence < last or sequence - last > MAX_EVENTS:
+            return [None]
+
+        keys = [self._event_key(s) for s in xrange(last + 1, sequence + 1)]
+        events = self.client.get_multi(keys)
+        topics = []
+        for key in keys:
+            event = events.get(key)
+            if event is None:
+                return [None]
+            if event['origin'] != self._origin:
+                topics.append(event['topic'])
+        return topics
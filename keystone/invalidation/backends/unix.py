@@ -0,0 +1,141 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import
+import errno
+import os
+import socket
+import uuid
+
+from keystone import config
+from keystone import invalidation
+from keystone.openstack.common import log as logging
+
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+# NOTE: the datagram sent for a topic of None, which invalidates everything.
+ALL_TOPICS = ''
+
+
+class Invalidation(invalidation.Driver):
+    """Carries invalidated topics between the processes of one host.
+
+    Every process binds a unix datagram socket in ``[invalidation]
+    socket_dir`` and publishes a topic by sending it to every other socket in
+    that directory. No other service is needed, but every Keystone process
+    must be able to write to the directory.
+
+    A socket only queues a few datagrams (``net.unix.max_dgram_qlen``) for a
+    process that has not polled. When a topic cannot be sent, the publisher
+    creates a ``.lost`` file next to the socket instead, and the process that
+    bound it invalidates everything the next time it polls.
+
+    """
+
+    def __init__(self):
+        self._socket = None
+        self._path = None
+        self._pid = None
+
+    def _bind(self):
+        # NOTE: keystone-all forks its workers after the managers are
+        # created, so every worker binds its own socket on first use.
+        if self._pid == os.getpid():
+            return self._socket
+
+        directory = CONF.invalidation.socket_dir
+        try:
+            os.makedirs(directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        path = os.path.join(directory,
+                            '%d-%s.sock' % (os.getpid(), uuid.uuid4().hex))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.setblocking(False)
+        self._socket, self._path, self._pid = sock, path, os.getpid()
+        return sock
+
+    def close(self):
+        """Stop receiving topics and remove the socket of this process."""
+        if self._pid == os.getpid():
+            self._socket.close()
+            self._remove(self._path)
+        self._socket = self._path = self._pid = None
+
+    def _remove(self, path):
+        for name in (path, _lost_path(path)):
+            try:
+                os.unlink(name)
+            except OSError:
+                pass
+
+    def _mark_lost(self, path, topic, error):
+        try:
+            os.close(os.open(_lost_path(path),
+                             os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                LOG.error(_('Unable to mark topics as lost for %(path)s: '
+                            '%(error)s'), {'path': path, 'error': e})
+            return
+        LOG.warning(_('Unable to send invalidated topic %(topic)s to '
+                      '%(path)s, everything will be invalidated: %(error)s'),
+                    {'topic': topic, 'path': path, 'error': error})
+
+    def publish(self, topic):
+        sock = self._bind()
+        data = (topic or ALL_TOPICS).encode('utf-8')
+        directory = CONF.invalidation.socket_dir
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if path == self._path or not name.endswith('.sock'):
+                continue
+            try:
+                sock.sendto(data, path)
+            except socket.error as e:
+                if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                    # the process that bound the socket is gone
+                    self._remove(path)
+                else:
+                    self._mark_lost(path, topic, e)
+
+    def receive(self):
+        sock = self._bind()
+        topics = []
+        # NOTE: the mark is removed before the queue is read, so that topics
+        # lost meanwhile are marked again for the next call.
+        try:
+            os.unlink(_lost_path(self._path))
+            topics.append(None)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        while True:
+            try:
+                data = sock.recv(4096)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return topics
+                raise
+            topics.append(data.decode('utf-8') or None)
+
+
+def _lost_path(path):
+    return os.path.splitext(path)[0] + '.lost'
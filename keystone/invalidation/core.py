@@ -0,0 +1,129 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Main entry point into the cache invalidation service.
+
+Managers that cache data in memory publish a topic when that data changes,
+for example when tokens are revoked, and check the topic's generation before
+serving anything they cached. The configured driver carries the topics to the
+other Keystone processes, which see them the next time they poll.
+
+A topic may name the data that changed after a colon, as in
+``assignment:user:<user_id>``. Generations and subscriptions are kept for the
+part before the colon, and subscribers are given the whole topic so that they
+can drop only what it names.
+
+"""
+
+import collections
+import time
+
+from keystone.common import dependency
+from keystone.common import manager
+from keystone import config
+from keystone import exception
+from keystone.openstack.common import log as logging
+
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+
+@dependency.provider('invalidation_api')
+class Manager(manager.Manager):
+    """Default pivot point for the cache invalidation backend.
+
+    See :mod:`keystone.common.manager.Manager` for more details on how this
+    dynamically calls the backend.
+
+    """
+
+    def __init__(self):
+        super(Manager, self).__init__(CONF.invalidation.driver)
+        self._generations = collections.defaultdict(int)
+        self._subscribers = collections.defaultdict(list)
+        self._next_poll = 0
+
+    def publish(self, topic):
+        """Invalidate a topic in this process and in every other one."""
+        self._invalidate(topic)
+        self.driver.publish(topic)
+
+    def subscribe(self, topic, callback):
+        """Call ``callback(topic)`` whenever a topic is invalidated.
+
+        The callback is also given the topics naming data of this topic,
+        such as ``assignment:user:<user_id>`` for ``assignment``.
+
+        """
+        self._subscribers[topic].append(callback)
+
+    def generation(self, topic):
+        """Return a number that changes whenever a topic is invalidated."""
+        self.poll()
+        return self._generations[topic]
+
+    def poll(self):
+        """Apply the topics invalidated by other processes.
+
+        The driver is asked at most once every ``[invalidation]
+        poll_interval`` seconds.
+
+        """
+        now = time.time()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + CONF.invalidation.poll_interval
+        for topic in self.driver.receive():
+            self._invalidate(topic)
+
+    def _invalidate(self, topic):
+        if topic is None:
+            # NOTE: the driver may have lost events, so every topic is
+            # invalidated.
+            topics = set(self._generations) | set(self._subscribers)
+        else:
+            topics = [topic]
+        for topic in topics:
+            name = topic.split(':', 1)[0]
+            self._generations[name] += 1
+            for callback in self._subscribers.get(name, []):
+                callback(topic)
+
+
+class Driver(object):
+    """Interface description for a cache invalidation driver."""
+
+    def publish(self, topic):
+        """Send an invalidated topic to the other processes.
+
+        :param topic: name of the invalidated data
+        :type topic: string
+
+        """
+        raise exception.NotImplemented()
+
+    def receive(self):
+        """Return the topics invalidated by other processes since the last
+        call.
+
+        A topic of None means that events may have been lost, and that every
+        topic must be invalidated.
+
+        :returns: list of topics
+
+        """
+        raise exception.NotImplemented()
@@ -15,9 +15,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-"""Policy engine for keystone"""
+"""Policy engine for keystone
+
+The rules loaded from the policy file are compiled into closures, one per
+rule, in which the rules referenced with ``rule:`` are already resolved. An
+enforcement then calls a single closure instead of walking the tree of
+``Check`` objects built by :mod:`keystone.openstack.common.policy`, with the
+same results.
+
+"""
 
 import os.path
+import time
 
 from keystone.common import utils
 from keystone import config
@@ -33,19 +42,31 @@ LOG = logging.getLogger(__name__)
 
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_NEXT_RELOAD_CHECK = 0
+_COMPILED = (None, None)
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _NEXT_RELOAD_CHECK
+    global _COMPILED
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _NEXT_RELOAD_CHECK = 0
+    _COMPILED = (None, None)
     common_policy.reset()
 
 
 def init():
     global _POLICY_PATH
-    global _POLICY_CACHE
+    global _NEXT_RELOAD_CHECK
+    # NOTE: whether the policy file changed is checked at most once every
+    # [policy] reload_interval seconds.
+    now = time.time()
+    if _POLICY_CACHE and now < _NEXT_RELOAD_CHECK:
+        return
+    _NEXT_RELOAD_CHECK = now + CONF.policy.reload_interval
     if not _POLICY_PATH:
         _POLICY_PATH = CONF.policy_file
         if not os.path.exists(_POLICY_PATH):
@@ -61,6 +82,152 @@ def _set_rules(data):
         data, default_rule))
 
 
+def _true(target, creds):
+    return True
+
+
+def _false(target, creds):
+    return False
+
+
+def _compile_and(check, compile_check):
+    checks = [compile_check(rule) for rule in check.rules]
+
+    def and_check(target, creds):
+        for rule in checks:
+            if not rule(target, creds):
+                return False
+        return True
+    return and_check
+
+
+def _compile_or(check, compile_check):
+    checks = [compile_check(rule) for rule in check.rules]
+
+    def or_check(target, creds):
+        for rule in checks:
+            if rule(target, creds):
+                return True
+        return False
+    return or_check
+
+
+def _compile_not(check, compile_check):
+    rule = compile_check(check.rule)
+
+    def not_check(target, creds):
+        return not rule(target, creds)
+    return not_check
+
+
+def _compile_role(check, compile_check):
+    role = check.match.lower()
+
+    def role_check(target, creds):
+        for name in creds['roles']:
+            if name.lower() == role:
+                return True
+        return False
+    return role_check
+
+
+def _compile_generic(check, compile_check):
+    kind = check.kind
+    match = check.match
+    if '%' not in match:
+        def constant_check(target, creds):
+            if kind in creds:
+                return match == unicode(creds[kind])
+            return False
+        return constant_check
+
+    def generic_check(target, creds):
+        value = match % target
+        if kind in creds:
+            return value == unicode(creds[kind])
+        return False
+    return generic_check
+
+
+_COMPILERS = {
+    common_policy.TrueCheck: lambda check, compile_check: _true,
+    common_policy.FalseCheck: lambda check, compile_check: _false,
+    common_policy.AndCheck: _compile_and,
+    common_policy.OrCheck: _compile_or,
+    common_policy.NotCheck: _compile_not,
+    common_policy.RoleCheck: _compile_role,
+    common_policy.GenericCheck: _compile_generic,
+}
+
+
+class CompiledRules(dict):
+    """Closures evaluating the rules of a ``common_policy.Rules``.
+
+    Each closure is called with ``(target, creds)`` and returns what
+    ``common_policy.check`` would. ``default`` is the closure of the default
+    rule, or None.
+
+    """
+
+    def __init__(self, rules):
+        super(CompiledRules, self).__init__()
+        self._rules = rules or {}
+        self._compiling = set()
+        for name in self._rules:
+            self._compile_rule(name)
+        self.default = self._compile_rule(
+            getattr(rules, 'default_rule', None))
+        del self._rules
+        del self._compiling
+
+    def _compile_rule(self, name):
+        if name not in self._rules:
+            # NOTE: a missing rule is replaced by the default rule, if any.
+            name = getattr(self._rules, 'default_rule', None)
+            if name not in self._rules:
+                return None
+        if name in self:
+            return self[name]
+        if name in self._compiling:
+            # NOTE: the rule refers to itself; look it up when evaluated.
+            return lambda target, creds: self[name](target, creds)
+        self._compiling.add(name)
+        self[name] = self._compile_check(self._rules[name])
+        self._compiling.discard(name)
+        return self[name]
+
+    def _compile_check(self, check):
+        if type(check) is common_policy.RuleCheck:
+            rule = self._compile_rule(check.match)
+            if rule is None:
+                return _false
+
+            def rule_check(target, creds):
+                # NOTE: common_policy fails a referenced rule, but only
+                # that one, when it raises a KeyError.
+                try:
+                    return rule(target, creds)
+                except KeyError:
+                    return False
+            return rule_check
+        compiler = _COMPILERS.get(type(check))
+        if compiler is None:
+            # NOTE: other checks, such as http: ones, are called as is.
+            return check
+        return compiler(check, self._compile_check)
+
+
+def _compiled_rules():
+    """Return the compiled form of the rules in use, compiling it if needed."""
+    global _COMPILED
+    rules = common_policy._rules
+    source, compiled = _COMPILED
+    if compiled is None or source is not rules:
+        compiled = CompiledRules(rules)
+        _COMPILED = (rules, compiled)
+    return compiled
+
+
 def enforce(credentials, action, target, do_raise=True):
     """Verifies that the action is valid on the target in this context.
 
@@ -80,17 +247,22 @@ def enforce(credentials, action, target, do_raise=True):
     """
     init()
 
-    # Add the exception arguments if asked to do a raise
-    extra = {}
-    if do_raise:
-        extra.update(exc=exception.ForbiddenAction, action=action)
+    compiled = _compiled_rules()
+    rule = compiled.get(action, compiled.default)
+    try:
+        result = rule is not None and rule(target, credentials)
+    except KeyError:
+        # If the rule cannot be evaluated, fail closed
+        result = False
 
-    return common_policy.check(action, target, credentials, **extra)
+    if do_raise and result is False:
+        raise exception.ForbiddenAction(action=action)
+    return result
 
 
 class Policy(policy.Driver):
     def enforce(self, credentials, action, target):
-        LOG.debug(_('enforce %(action)s: %(credentials)s') % {
+        LOG.debug(_('enforce %(action)s: %(credentials)s'), {
             'action': action,
             'credentials': credentials})
         enforce(credentials, action, target)
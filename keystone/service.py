@@ -28,6 +28,7 @@ from keystone.contrib import oauth1
 from keystone import controllers
 from keystone import credential
 from keystone import identity
+from keystone import invalidation
 from keystone.openstack.common import log as logging
 from keystone import policy
 from keystone import routers
@@ -50,6 +51,7 @@ DRIVERS = dict(
     credentials_api=credential.Manager(),
     ec2_api=ec2.Manager(),
     identity_api=_IDENTITY_API,
+    invalidation_api=invalidation.Manager(),
     oauth1_api=oauth1.Manager(),
     policy_api=policy.Manager(),
     token_api=token.Manager(),
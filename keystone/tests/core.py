@@ -49,6 +49,7 @@ from keystone.contrib import oauth1
 from keystone import credential
 from keystone import exception
 from keystone import identity
+from keystone import invalidation
 from keystone.openstack.common import log as logging
 from keystone.openstack.common import timeutils
 from keystone import policy
@@ -268,8 +269,9 @@ class TestCase(NoModule, unittest.TestCase):
         # identity driver is available to the assignment manager because the
         # assignment manager gets the default assignment driver from the
         # identity driver.
-        for manager in [identity, assignment, catalog, credential, ec2, policy,
-                        token, token_provider, trust, oauth1]:
+        for manager in [identity, assignment, catalog, credential, ec2,
+                        invalidation, policy, token, token_provider, trust,
+                        oauth1]:
             # manager.__name__ is like keystone.xxx[.yyy],
             # converted to xxx[_yyy]
             manager_name = ('%s_api' %
@@ -19,6 +19,7 @@ import uuid
 from keystone.tests import core as test
 
 from keystone import auth
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
@@ -250,6 +251,93 @@ class AuthWithToken(AuthTest):
         self.assertEquals(tenant["id"], self.tenant_bar['id'])
         self.assertEquals(roles[0], self.role_member['id'])
 
+    def _get_scoped_token(self):
+        self.identity_api.add_role_to_user_and_project(
+            self.user_foo['id'],
+            self.tenant_bar['id'],
+            self.role_member['id'])
+        body_dict = _build_user_auth(
+            username='FOO',
+            password='foo2',
+            tenant_name='BAR')
+        return self.controller.authenticate({}, body_dict)
+
+    def _get_scoped_token_id(self):
+        return self._get_scoped_token()['access']['token']['id']
+
+    def test_validate_token_rebuilds_catalog(self):
+        """Verify the catalog left out of a stored token is rebuilt."""
+        scoped_token = self._get_scoped_token()
+        token_id = scoped_token['access']['token']['id']
+        self.assertTrue(scoped_token['access']['serviceCatalog'])
+
+        token_ref = self.token_api.get_token(token_id)
+        self.assertTrue(token_ref['catalog_omitted'])
+        self.assertNotIn('serviceCatalog', token_ref['token_data']['access'])
+        self.assertNotIn('key', token_ref)
+
+        validated = self.token_provider_api.validate_v2_token(token_id)
+        self.assertEqual(validated['access']['serviceCatalog'],
+                         scoped_token['access']['serviceCatalog'])
+
+    def test_validate_token_is_cached(self):
+        self.opt_in_group('token', validation_cache_time=60)
+        token_id = self._get_scoped_token_id()
+        provider = self.token_provider_api.driver
+        validated = self.token_provider_api.validate_v2_token(token_id)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('the token backend was read')
+
+        self.stubs.Set(self.token_api.driver, 'get_token', fail)
+        self.assertEqual(self.token_provider_api.validate_v2_token(token_id),
+                         validated)
+        self.assertEqual((provider.validated_tokens.hits,
+                          provider.validated_tokens.misses), (1, 1))
+
+        # belongs_to is part of the key
+        self.assertRaises(AssertionError,
+                          self.token_provider_api.validate_v2_token,
+                          token_id, belongs_to=self.tenant_bar['id'])
+
+    def test_validate_token_cache_disabled(self):
+        token_id = self._get_scoped_token_id()
+        provider = self.token_provider_api.driver
+        self.token_provider_api.validate_v2_token(token_id)
+        self.token_provider_api.validate_v2_token(token_id)
+        self.assertEqual(len(provider.validated_tokens), 0)
+
+    def test_validate_token_cache_invalidated_by_delete_token(self):
+        self.opt_in_group('token', validation_cache_time=60)
+        token_id = self._get_scoped_token_id()
+        self.token_provider_api.validate_v2_token(token_id)
+        self.token_api.delete_token(token_id)
+        self.assertRaises(exception.Unauthorized,
+                          self.token_provider_api.validate_v2_token,
+                          token_id)
+
+    def test_validate_token_cache_invalidated_by_delete_tokens(self):
+        self.opt_in_group('token', validation_cache_time=60)
+        token_id = self._get_scoped_token_id()
+        self.token_provider_api.validate_v3_token(token_id)
+        self.token_api.delete_tokens(self.user_foo['id'])
+        self.assertRaises(exception.Unauthorized,
+                          self.token_provider_api.validate_v3_token,
+                          token_id)
+
+    def test_validate_token_cache_does_not_outlive_token(self):
+        self.opt_in_group('token', validation_cache_time=3600)
+        token_id = self._get_scoped_token_id()
+        self.token_provider_api.validate_token(token_id)
+        expires = self.token_api.get_token(token_id)['expires']
+        self.stubs.Set(
+            utils.time, 'time',
+            lambda: utils.unixtime(expires + datetime.timedelta(seconds=1)))
+        timeutils.set_time_override(expires + datetime.timedelta(seconds=1))
+        self.addCleanup(timeutils.clear_time_override)
+        self.assertRaises(exception.Unauthorized,
+                          self.token_provider_api.validate_token, token_id)
+
     def test_auth_token_project_group_role(self):
         """Verify getting a token in a tenant with group roles."""
         # Add a v2 style role in so we can check we get this back
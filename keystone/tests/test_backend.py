@@ -20,9 +20,11 @@ import uuid
 from keystone.tests import core as test
 
 from keystone.catalog import core
+from keystone.common import cms
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
+from keystone.token import core as token_core
 
 import default_fixtures
 
@@ -194,6 +196,19 @@ class IdentityTests(object):
                           self.identity_api.get_role,
                           uuid.uuid4().hex)
 
+    def test_get_roles(self):
+        role_ids = [self.role_member['id'], self.role_admin['id'],
+                    self.role_member['id']]
+        roles_ref = self.identity_api.get_roles(role_ids)
+        self.assertEqual([role['id'] for role in roles_ref], role_ids)
+        self.assertEqual(roles_ref[1]['name'], self.role_admin['name'])
+        self.assertEqual(self.identity_api.get_roles([]), [])
+
+    def test_get_roles_404(self):
+        self.assertRaises(exception.RoleNotFound,
+                          self.identity_api.get_roles,
+                          [self.role_admin['id'], uuid.uuid4().hex])
+
     def test_create_duplicate_role_name_fails(self):
         role = {'id': 'fake1',
                 'name': 'fake1name'}
@@ -2237,6 +2252,41 @@ class TokenTests(object):
 
         self.token_api.get_token(token_id3)
 
+    def test_delete_tokens_keeps_other_tenants(self):
+        token_id1 = self.create_token_sample_data('testtenantid')
+        token_id2 = self.create_token_sample_data('othertenantid')
+        token_id3 = self.create_token_sample_data()
+        self.token_api.delete_tokens(user_id='testuserid',
+                                     tenant_id='testtenantid')
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, token_id1)
+        self.token_api.get_token(token_id2)
+        self.token_api.get_token(token_id3)
+        tokens = self.token_api.list_tokens('testuserid',
+                                            tenant_id='othertenantid')
+        self.assertEqual(tokens, [token_id2])
+
+    def test_delete_tokens_consumer(self):
+        token_ids = {}
+        for consumer_id in ('testconsumerid', 'otherconsumerid'):
+            token_id = self._create_token_id()
+            data = {'id': token_id, 'user': {'id': 'testuserid'},
+                    'token_data': {'token': {
+                        'OS-OAUTH1': {'consumer_id': consumer_id}}}}
+            new_token = self.token_api.create_token(token_id, data)
+            token_ids[consumer_id] = new_token['id']
+
+        self.assertEqual(
+            self.token_api.list_tokens('testuserid',
+                                       consumer_id='testconsumerid'),
+            [token_ids['testconsumerid']])
+        self.token_api.delete_tokens(user_id='testuserid',
+                                     consumer_id='testconsumerid')
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token,
+                          token_ids['testconsumerid'])
+        self.token_api.get_token(token_ids['otherconsumerid'])
+
     def test_delete_tokens_trust(self):
         tokens = self.token_api.list_tokens(user_id='testuserid')
         self.assertEquals(len(tokens), 0)
@@ -2403,6 +2453,110 @@ class TokenTests(object):
         self.assertEqual(len(tokens), 1)
         self.assertIn(token_id, tokens)
 
+    def test_token_persisted_without_catalog(self):
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'key': token_id,
+                'user': {'id': 'testuserid'},
+                'token_data': {'token': {'methods': ['password'],
+                                         'catalog': [{'type': 'identity'}]}}}
+        self.token_api.create_token(token_id, data)
+
+        token_ref = self.token_api.get_token(token_id)
+        self.assertNotIn('key', token_ref)
+        self.assertNotIn('catalog', token_ref['token_data']['token'])
+        self.assertTrue(token_ref['catalog_omitted'])
+        self.assertEqual(token_ref['persistence_version'],
+                         token_core.PERSISTENCE_VERSION)
+
+    def _create_expired_tokens(self, count):
+        expire_time = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        for x in xrange(count):
+            token_id = uuid.uuid4().hex
+            data = {'id_hash': token_id, 'id': token_id, 'a': 'b',
+                    'expires': expire_time,
+                    'trust_id': None,
+                    'user': {'id': 'testuserid'}}
+            self.token_api.create_token(token_id, data)
+
+    def test_flush_expired_tokens_in_batches(self):
+        self._create_expired_tokens(5)
+        token_id = uuid.uuid4().hex
+        data = {'id_hash': token_id, 'id': token_id, 'a': 'b',
+                'trust_id': None,
+                'user': {'id': 'testuserid'}}
+        self.token_api.create_token(token_id, data)
+
+        sleeps = []
+        self.stubs.Set(token_core.time, 'sleep', sleeps.append)
+        batches = []
+        deleted = self.token_api.flush_expired_tokens(
+            batch_size=2, batch_sleep=0.5, max_runtime=0,
+            progress=batches.append)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual([b['deleted'] for b in batches], [2, 2, 1])
+        self.assertEqual([b['total'] for b in batches], [2, 4, 5])
+        self.assertEqual(sleeps, [0.5, 0.5])
+        self.assertEqual(self.token_api.list_tokens('testuserid'),
+                         [token_id])
+        self.assertEqual(self.token_api.flush_expired_tokens(batch_size=2),
+                         0)
+
+    def test_flush_expired_tokens_max_runtime(self):
+        self._create_expired_tokens(5)
+        clock = iter(xrange(0, 1000, 10))
+        self.stubs.Set(token_core.time, 'time', lambda: clock.next())
+        batches = []
+        deleted = self.token_api.flush_expired_tokens(
+            batch_size=2, batch_sleep=0, max_runtime=15,
+            progress=batches.append)
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual(len(batches), 1)
+
+    def _stub_revocation_list_signer(self):
+        signed = []
+
+        class FakeSigner(object):
+            def sign_text(self, text):
+                signed.append(text)
+                return 'signed-%d' % len(signed)
+
+        self.stubs.Set(cms, 'get_signer', lambda *args: FakeSigner())
+        return signed
+
+    def test_signed_revocation_list_is_reused(self):
+        signed = self._stub_revocation_list_signer()
+        self.delete_token()
+        etag, signed_text = self.token_api.get_signed_revocation_list()
+        self.assertEqual((etag, signed_text),
+                         self.token_api.get_signed_revocation_list())
+        self.assertEqual(len(signed), 1)
+
+    def test_signed_revocation_list_changes_on_revocation(self):
+        signed = self._stub_revocation_list_signer()
+        etag, signed_text = self.token_api.get_signed_revocation_list()
+        token_id = self.delete_token()
+        new_etag, new_signed_text = (
+            self.token_api.get_signed_revocation_list())
+        self.assertNotEqual(etag, new_etag)
+        self.assertNotEqual(signed_text, new_signed_text)
+        self.assertIn(token_id, signed[-1])
+
+    def test_signed_revocation_list_cache_time(self):
+        self.opt_in_group('token', revocation_cache_time=600)
+        self._stub_revocation_list_signer()
+        self.token_api.get_signed_revocation_list()
+
+        def fail():
+            raise AssertionError('revocation list should be cached')
+
+        self.stubs.Set(self.token_api.driver, 'list_revoked_tokens', fail)
+        self.token_api.get_signed_revocation_list()
+        self.token_api.invalidate_revocation_list()
+        self.assertRaises(AssertionError,
+                          self.token_api.get_signed_revocation_list)
+
 
 class TrustTests(object):
     def create_sample_trust(self, new_id):
@@ -2497,6 +2651,40 @@ class CommonHelperTests(test.TestCase):
         with self.assertRaises(exception.MalformedEndpoint):
             core.format_url("http://%(foo)", {"foo": "1"})
 
+    def test_format_helper_returns_none_without_url(self):
+        self.assertIsNone(core.format_url(None, {}))
+
+    def test_compile_url_records_keys(self):
+        template = core.compile_url(
+            'http://localhost:$(public_port)s/v2.0/$(tenant_id)s')
+        self.assertEqual(template.keys, set(['public_port', 'tenant_id']))
+        self.assertIs(template, core.compile_url(template.url))
+        self.assertEqual(template.format({'public_port': 5000,
+                                          'tenant_id': 'bar'}),
+                         'http://localhost:5000/v2.0/bar')
+
+    def test_url_substitutions_reads_only_used_keys(self):
+        templates = [core.compile_url('http://localhost:$(public_port)s/'),
+                     core.compile_url('http://localhost/$(tenant_id)s'),
+                     None]
+        d = core.url_substitutions(templates, 'bar', 'foo')
+        self.assertEqual(d, {'public_port': CONF.public_port,
+                             'tenant_id': 'bar',
+                             'user_id': 'foo'})
+
+    def test_url_substitutions_reads_overridden_options(self):
+        template = core.compile_url('http://localhost:$(public_port)s/')
+        self.opt(public_port=5001)
+        d = core.url_substitutions([template], 'bar', 'foo')
+        self.assertEqual(template.format(d), 'http://localhost:5001/')
+
+    def test_url_substitutions_skip_unknown_keys(self):
+        template = core.compile_url('http://localhost:$(no_such_port)s/')
+        d = core.url_substitutions([template], 'bar', 'foo')
+        self.assertNotIn('no_such_port', d)
+        with self.assertRaises(exception.MalformedEndpoint):
+            template.format(d)
+
 
 class CatalogTests(object):
     def test_service_crud(self):
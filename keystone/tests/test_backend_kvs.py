@@ -13,10 +13,12 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import datetime
 import uuid
 
 from keystone import exception
 from keystone import identity
+from keystone.openstack.common import timeutils
 from keystone.tests import core as test
 
 import default_fixtures
@@ -70,6 +72,66 @@ class KvsToken(test.TestCase, test_backend.TokenTests):
             'keystone.identity.backends.kvs.Identity')
         self.load_backends()
 
+    def _create_token(self, user_id, expires):
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': 'b', 'user': {'id': user_id},
+                'expires': expires}
+        self.token_api.create_token(token_id, data)
+        return token_id
+
+    def test_token_operations_do_not_scan(self):
+        def fail(*args, **kwargs):
+            raise AssertionError('the token kvs was scanned')
+
+        user_id = uuid.uuid4().hex
+        past = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        future = timeutils.utcnow() + datetime.timedelta(minutes=5)
+        expired_id = self._create_token(user_id, past)
+        valid_id = self._create_token(user_id, future)
+        revoked_id = self._create_token(user_id, future)
+        self.token_api.delete_token(revoked_id)
+
+        self.stubs.Set(self.token_api.driver.db, 'items', fail)
+        self.stubs.Set(self.token_api.driver.db, 'keys', fail)
+        self.assertEqual(self.token_api.list_tokens(user_id), [valid_id])
+        self.assertEqual([t['id'] for t in
+                          self.token_api.list_revoked_tokens()],
+                         [revoked_id])
+        self.assertEqual(self.token_api.flush_expired_tokens(), 1)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, expired_id)
+
+    def test_flush_expired_tokens_updates_indexes(self):
+        user_id = uuid.uuid4().hex
+        past = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        expired_id = self._create_token(user_id, past)
+        revoked_id = self._create_token(
+            user_id, timeutils.utcnow() + datetime.timedelta(minutes=5))
+        self.token_api.delete_token(revoked_id)
+        # revocations can only be recorded for valid tokens
+        self.token_api.driver.db['revoked-token-%s' % revoked_id][
+            'expires'] = past
+        driver = self.token_api.driver
+        driver._index_expiry('revoked-token-%s' % revoked_id, past)
+
+        self.assertEqual(self.token_api.flush_expired_tokens(), 2)
+        self.assertEqual(self.token_api.list_revoked_tokens(), [])
+        self.assertNotIn(expired_id, driver._user_index(user_id))
+        self.assertNotIn(revoked_id, driver._index(driver.revoked_index_key,
+                                                   set))
+
+    def test_recreated_token_is_not_flushed(self):
+        user_id = uuid.uuid4().hex
+        past = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        future = timeutils.utcnow() + datetime.timedelta(minutes=5)
+        token_id = self._create_token(user_id, past)
+        data = {'id': token_id, 'a': 'b', 'user': {'id': user_id},
+                'expires': future}
+        self.token_api.create_token(token_id, data)
+
+        self.assertEqual(self.token_api.flush_expired_tokens(), 0)
+        self.assertEqual(self.token_api.list_tokens(user_id), [token_id])
+
 
 class KvsTrust(test.TestCase, test_backend.TrustTests):
     def setUp(self):
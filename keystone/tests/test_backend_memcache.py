@@ -24,9 +24,11 @@ from keystone.tests import core as test
 
 from keystone.common import utils
 from keystone import exception
+from keystone import invalidation
 from keystone.openstack.common import jsonutils
 from keystone.openstack.common import timeutils
 from keystone import token
+from keystone.token import core as token_core
 from keystone.token.backends import memcache as token_memcache
 
 import test_backend
@@ -39,16 +41,22 @@ class MemcacheClient(object):
         """Ignores the passed in args."""
         self.cache = {}
         self.reject_cas = False
+        # like the item size limit of memcached
+        self.max_value_length = None
 
-    def add(self, key, value):
-        if self.get(key):
+    def _too_large(self, value):
+        return (self.max_value_length is not None and
+                len(value) > self.max_value_length)
+
+    def add(self, key, value, time=0):
+        if self.get(key) or self._too_large(value):
             return False
-        return self.set(key, value)
+        return self.set(key, value, time=time)
 
     def append(self, key, value):
         existing_value = self.get(key)
-        if existing_value:
-            self.set(key, existing_value + value)
+        if existing_value and not self._too_large(existing_value + value):
+            self.set(key, existing_value + value, time=self.cache[key][1])
             return True
         return False
 
@@ -76,6 +84,23 @@ class MemcacheClient(object):
             data_copy = copy.deepcopy(obj[0])
             return data_copy
 
+    def get_multi(self, keys):
+        """Retrieves the values for the keys that are present."""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def incr(self, key, delta=1):
+        value = self.get(key)
+        if value is None:
+            return None
+        value = int(value) + delta
+        self.set(key, str(value), time=self.cache[key][1])
+        return value
+
     def set(self, key, value, time=0):
         """Sets the value for a key."""
         self.check_key(key)
@@ -87,6 +112,9 @@ class MemcacheClient(object):
             # The back-end store should only change with an explicit
             # set/delete/append/etc
         data_copy = copy.deepcopy(value)
+        if 0 < time <= 30 * 24 * 3600:
+            # memcache treats shorter times as relative to now
+            time += utils.unixtime(timeutils.utcnow())
         self.cache[key] = (data_copy, time)
         return True
 
@@ -108,11 +136,17 @@ class MemcacheClient(object):
             #NOTE(bcwaldon): python-memcached always returns the same value
             pass
 
+    def delete_multi(self, keys):
+        for key in keys:
+            self.delete(key)
+        return 1
+
 
 class MemcacheToken(test.TestCase, test_backend.TokenTests):
     def setUp(self):
         super(MemcacheToken, self).setUp()
         fake_client = MemcacheClient()
+        invalidation.Manager()
         self.token_man = token.Manager()
         self.token_man.driver = token_memcache.Token(client=fake_client)
         self.token_api = self.token_man
@@ -136,51 +170,278 @@ class MemcacheToken(test.TestCase, test_backend.TokenTests):
         user_id = unicode(uuid.uuid4().hex)
         self.token_api.list_tokens(user_id)
 
+    def _add_legacy_revocations(self, count, expires):
+        # NOTE: only the revocation list written by earlier releases is
+        # pruned by flush_expired_tokens; revocations are bucketed now.
+        token_ids = [uuid.uuid4().hex for x in xrange(count)]
+        records = [jsonutils.dumps({'id': token_id, 'expires': expires})
+                   for token_id in token_ids]
+        driver = self.token_api.driver
+        list_json = driver.client.get(driver.revocation_key)
+        if list_json:
+            records.insert(0, list_json)
+        driver.client.set(driver.revocation_key, ','.join(records))
+        return token_ids
+
+    def _legacy_revoked_ids(self):
+        driver = self.token_api.driver
+        list_json = driver.client.get(driver.revocation_key)
+        return [data['id'] for data in jsonutils.loads('[%s]' % list_json)]
+
     def test_flush_expired_token(self):
-        with self.assertRaises(exception.NotImplemented):
-            self.token_api.flush_expired_tokens()
+        past = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        future = timeutils.utcnow() + datetime.timedelta(minutes=5)
+        self._add_legacy_revocations(1, past)
+        valid_ids = self._add_legacy_revocations(1, future)
+        revoked_ids = [x['id'] for x in self.token_api.list_revoked_tokens()]
+        self.assertEqual(revoked_ids, valid_ids)
+
+        self.assertEqual(self.token_api.flush_expired_tokens(), 1)
+        self.assertEqual(self._legacy_revoked_ids(), valid_ids)
+
+    def test_flush_expired_tokens_in_batches(self):
+        past = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        self._add_legacy_revocations(3, past)
+
+        batches = []
+        deleted = self.token_api.flush_expired_tokens(
+            batch_size=2, batch_sleep=0, max_runtime=0,
+            progress=batches.append)
+        self.assertEqual(deleted, 3)
+        self.assertEqual([b['deleted'] for b in batches], [2, 1])
+        self.assertEqual(self._legacy_revoked_ids(), [])
+
+    def test_flush_expired_tokens_max_runtime(self):
+        past = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        self._add_legacy_revocations(5, past)
+
+        clock = iter(xrange(0, 1000, 10))
+        self.stubs.Set(token_core.time, 'time', lambda: clock.next())
+        deleted = self.token_api.flush_expired_tokens(
+            batch_size=2, batch_sleep=0, max_runtime=15)
+        self.assertEqual(deleted, 2)
+        self.assertEqual(len(self._legacy_revoked_ids()), 3)
 
-    def test_cleanup_user_index_on_create(self):
-        valid_token_id = uuid.uuid4().hex
-        second_valid_token_id = uuid.uuid4().hex
-        expired_token_id = uuid.uuid4().hex
+    def test_revocation_list_is_bucketed_by_expiry(self):
+        self.opt_in_group('memcache', token_index_shards=1)
+        now = timeutils.utcnow()
+        revoked_ids = []
+        for hours in (1, 1, 5):
+            token_id = uuid.uuid4().hex
+            data = {'id': token_id, 'a': 'b', 'user': {'id': 'testuserid'},
+                    'expires': now + datetime.timedelta(hours=hours)}
+            self.token_api.create_token(token_id, data)
+            self.token_api.delete_token(token_id)
+            revoked_ids.append(token_id)
+
+        driver = self.token_api.driver
+        keys = [key for key in driver.client.cache
+                if key.startswith(driver.revocation_key)]
+        self.assertEqual(len(keys), 2)
+        for key in keys:
+            # each bucket expires with the last of its tokens
+            self.assertTrue(
+                driver.client.cache[key][1] > utils.unixtime(now))
+        revoked = self.token_api.list_revoked_tokens()
+        self.assertEqual(sorted(t['id'] for t in revoked), sorted(revoked_ids))
+        # only the id and expiry time of revoked tokens are kept
+        self.assertEqual(set(revoked[0]), set(['id', 'expires']))
+
+    def test_list_revoked_tokens_skips_expired(self):
+        future = timeutils.utcnow() + datetime.timedelta(minutes=5)
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': 'b', 'user': {'id': 'testuserid'},
+                'expires': future}
+        self.token_api.create_token(token_id, data)
+        self.token_api.delete_token(token_id)
+        self.assertEqual(len(self.token_api.list_revoked_tokens()), 1)
+
+        timeutils.set_time_override(future + datetime.timedelta(seconds=1))
+        self.addCleanup(timeutils.clear_time_override)
+        self.assertEqual(self.token_api.list_revoked_tokens(), [])
+
+    def test_list_revoked_tokens_round_trips(self):
+        self._add_legacy_revocations(
+            3, timeutils.utcnow() + datetime.timedelta(minutes=5))
+        for x in xrange(3):
+            self.delete_token()
+        driver = self.token_api.driver
+        driver.reset_round_trips()
+        self.assertEqual(len(self.token_api.list_revoked_tokens()), 6)
+        self.assertEqual(dict(driver.round_trips), {'get_multi': 1})
+
+    def test_user_index_is_bucketed_by_expiry(self):
+        self.opt_in_group('memcache', token_index_shards=1)
         user_id = unicode(uuid.uuid4().hex)
+        now = timeutils.utcnow()
+        for hours in (1, 1, 5):
+            token_id = uuid.uuid4().hex
+            data = {'id': token_id, 'a': 'b', 'user': {'id': user_id},
+                    'expires': now + datetime.timedelta(hours=hours)}
+            self.token_api.create_token(token_id, data)
 
-        expire_delta = datetime.timedelta(seconds=86400)
-
-        valid_data = {'id': valid_token_id, 'a': 'b',
-                      'user': {'id': user_id}}
-        second_valid_data = {'id': second_valid_token_id, 'a': 'b',
-                             'user': {'id': user_id}}
-        expired_data = {'id': expired_token_id, 'a': 'b',
-                        'user': {'id': user_id}}
-        self.token_api.create_token(valid_token_id, valid_data)
-        self.token_api.create_token(expired_token_id, expired_data)
-        # NOTE(morganfainberg): Directly access the data cache since we need to
-        # get expired tokens as well as valid tokens. token_api.list_tokens()
-        # will not return any expired tokens in the list.
-        user_key = self.token_api.driver._prefix_user_id(user_id)
-        user_record = self.token_api.driver.client.get(user_key)
-        user_token_list = jsonutils.loads('[%s]' % user_record)
-        self.assertEquals(len(user_token_list), 2)
-        expired_token_ptk = self.token_api.driver._prefix_token_id(
-            expired_token_id)
-        expired_token = self.token_api.driver.client.get(expired_token_ptk)
-        expired_token['expires'] = (timeutils.utcnow() - expire_delta)
-        self.token_api.driver.client.set(expired_token_ptk, expired_token)
-
-        self.token_api.create_token(second_valid_token_id, second_valid_data)
-        user_record = self.token_api.driver.client.get(user_key)
-        user_token_list = jsonutils.loads('[%s]' % user_record)
-        self.assertEquals(len(user_token_list), 2)
-
-    def test_cas_failure(self):
-        self.token_api.driver.client.reject_cas = True
+        client = self.token_api.driver.client
+        keys = [key for key in client.cache
+                if key.startswith(
+                    self.token_api.driver._prefix_user_id(user_id))]
+        self.assertEqual(len(keys), 2)
+        for key in keys:
+            # each bucket expires with the last of its tokens
+            self.assertTrue(client.cache[key][1] > utils.unixtime(now))
+        self.assertEqual(len(self.token_api.list_tokens(user_id)), 3)
+
+    def test_token_expiring_after_default_expiry(self):
+        user_id = uuid.uuid4().hex
         token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': 'b', 'user': {'id': user_id},
+                'expires': token.default_expire_time() +
+                datetime.timedelta(days=2)}
+        self.token_api.create_token(token_id, data)
+        self.assertEqual(self.token_api.list_tokens(user_id), [token_id])
+
+        self.token_api.delete_tokens(user_id)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, token_id)
+        revoked_ids = [t['id'] for t in self.token_api.list_revoked_tokens()]
+        self.assertEqual(revoked_ids, [token_id])
+
+    def test_tokens_are_read_after_expiration_is_lowered(self):
+        user_id = uuid.uuid4().hex
+        revoked_id = self._create_user_tokens(user_id, 1)[0]
+        self.token_api.delete_token(revoked_id)
+        token_id = self._create_user_tokens(user_id, 1)[0]
+
+        self.opt_in_group('token', expiration=600)
+        self.assertEqual(self.token_api.list_tokens(user_id), [token_id])
+        self.assertEqual(
+            [t['id'] for t in self.token_api.list_revoked_tokens()],
+            [revoked_id])
+
+        self.token_api.delete_tokens(user_id)
+        self.assertEqual(self.token_api.list_tokens(user_id), [])
+        revoked_ids = [t['id'] for t in self.token_api.list_revoked_tokens()]
+        self.assertEqual(sorted(revoked_ids), sorted([revoked_id, token_id]))
+
+    def test_create_token_cost_does_not_grow(self):
+        # a single index key, which only the first token has to add
+        self.opt_in_group('memcache', token_index_shards=1)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        user_id = unicode(uuid.uuid4().hex)
+        cost = []
+        for x in xrange(20):
+            token_id = uuid.uuid4().hex
+            data = {'id': token_id, 'a': 'b', 'user': {'id': user_id}}
+            self.token_api.driver.reset_round_trips()
+            self.token_api.create_token(token_id, data)
+            cost.append(sum(self.token_api.driver.round_trips.values()))
+        self.assertEqual(max(cost[1:]), cost[1])
+        self.assertEqual(len(self.token_api.list_tokens(user_id)), 20)
+
+    def test_legacy_user_index_is_read(self):
         user_id = unicode(uuid.uuid4().hex)
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': 'b', 'user': {'id': user_id}}
+        self.token_api.create_token(token_id, data)
+        # move the token to a user index written by earlier releases
+        client = self.token_api.driver.client
         user_key = self.token_api.driver._prefix_user_id(user_id)
-        token_data = jsonutils.dumps(token_id)
-        self.assertRaises(
-            exception.UnexpectedError,
-            self.token_api.driver._update_user_list_with_cas,
-            user_key, token_data)
+        for key in client.cache.keys():
+            if key.startswith(user_key):
+                client.delete(key)
+        self.assertEqual(self.token_api.list_tokens(user_id), [])
+        client.set(user_key, jsonutils.dumps(token_id))
+
+        self.assertEqual(self.token_api.list_tokens(user_id), [token_id])
+
+    def test_user_index_failure(self):
+        client = self.token_api.driver.client
+        self.stubs.Set(client, 'append', lambda *args: False)
+        self.stubs.Set(client, 'add', lambda *args, **kwargs: False)
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': 'b', 'user': {'id': 'testuserid'}}
+        self.assertRaises(exception.UnexpectedError,
+                          self.token_api.create_token, token_id, data)
+
+    def test_full_user_index_rolls_over(self):
+        self.opt_in_group('memcache', token_index_shards=1)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        client = self.token_api.driver.client._client
+        # room for three token ids in each key
+        token_id_json = jsonutils.dumps(uuid.uuid4().hex)
+        client.max_value_length = 3 * len(token_id_json) + 2
+        user_id = uuid.uuid4().hex
+        token_ids = self._create_user_tokens(user_id, 10)
+
+        user_key = self.token_api.driver._prefix_user_id(user_id)
+        keys = [key for key in client.cache if key.startswith(user_key)]
+        # four keys of tokens, and the count of those rolled over to
+        self.assertEqual(len(keys), 5)
+        self.assertEqual(sorted(self.token_api.list_tokens(user_id)),
+                         sorted(token_ids))
+
+        driver = self.token_api.driver
+        driver.reset_round_trips()
+        self.token_api.list_tokens(user_id)
+        self.assertEqual(dict(driver.round_trips), {'get_multi': 3})
+
+    def _create_user_tokens(self, user_id, count, tenant_id=None):
+        token_ids = []
+        for x in xrange(count):
+            token_id = uuid.uuid4().hex
+            data = {'id': token_id, 'a': 'b', 'user': {'id': user_id}}
+            if tenant_id:
+                data['tenant'] = {'id': tenant_id, 'name': tenant_id}
+            self.token_api.create_token(token_id, data)
+            token_ids.append(token_id)
+        return token_ids
+
+    def test_list_tokens_round_trips(self):
+        user_id = uuid.uuid4().hex
+        driver = self.token_api.driver
+        for count in (1, 25):
+            self._create_user_tokens(user_id, count)
+            driver.reset_round_trips()
+            self.token_api.list_tokens(user_id)
+            self.assertEqual(dict(driver.round_trips), {'get_multi': 2})
+
+    def test_delete_tokens_round_trips(self):
+        # keep every token in the same expiry bucket
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        user_id = uuid.uuid4().hex
+        tenant_id = uuid.uuid4().hex
+        deleted_ids = self._create_user_tokens(user_id, 25, tenant_id)
+        kept_ids = self._create_user_tokens(user_id, 5)
+        driver = self.token_api.driver
+
+        driver.reset_round_trips()
+        self.token_api.delete_tokens(user_id, tenant_id=tenant_id)
+        # the revocation list is empty, so the append falls back to an add
+        self.assertEqual(dict(driver.round_trips),
+                         {'get_multi': 2, 'delete_multi': 1, 'append': 1,
+                          'add': 1})
+
+        for token_id in deleted_ids:
+            self.assertRaises(exception.TokenNotFound,
+                              self.token_api.get_token, token_id)
+        self.assertEqual(sorted(self.token_api.list_tokens(user_id)),
+                         sorted(kept_ids))
+        revoked_ids = [t['id'] for t in self.token_api.list_revoked_tokens()]
+        self.assertEqual(sorted(revoked_ids), sorted(deleted_ids))
+
+    def test_delete_tokens_none_found(self):
+        driver = self.token_api.driver
+        driver.reset_round_trips()
+        self.token_api.delete_tokens(uuid.uuid4().hex)
+        self.assertEqual(dict(driver.round_trips), {'get_multi': 2})
+        self.assertEqual(self.token_api.list_revoked_tokens(), [])
+
+    def test_flush_revocation_list_round_trips(self):
+        self._add_legacy_revocations(
+            10, timeutils.utcnow() - datetime.timedelta(minutes=1))
+        driver = self.token_api.driver
+        driver.reset_round_trips()
+        self.assertEqual(driver.flush_expired_tokens(), 10)
+        self.assertEqual(dict(driver.round_trips), {'gets': 1, 'cas': 1})
@@ -14,6 +14,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import uuid
 
 import sqlalchemy
@@ -21,7 +22,10 @@ import sqlalchemy
 from keystone.common import sql
 from keystone import config
 from keystone import exception
+from keystone.openstack.common import timeutils
 from keystone.tests import core as test
+from keystone.token.backends import sql as token_sql
+from keystone.token import core as token_core
 
 import default_fixtures
 import test_backend
@@ -165,6 +169,204 @@ class SqlIdentity(SqlTests, test_backend.IdentityTests):
                           self.identity_api.get_projects_for_user,
                           user['id'])
 
+    def _count_statements(self, func, *args):
+        statements = []
+        counting = [True]
+
+        def count(conn, cursor, statement, *args):
+            if counting[0]:
+                statements.append(statement)
+
+        # NOTE: listeners cannot be removed from an engine, so this one is
+        # only muted; it goes away with the engine of the test.
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute', count)
+        try:
+            result = func(*args)
+        finally:
+            counting[0] = False
+        return result, len(statements)
+
+    def test_effective_roles_cost_does_not_grow_with_groups(self):
+        self.opt_in_group('os_inherit', enabled=True)
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'domain_id': DEFAULT_DOMAIN_ID,
+                'password': uuid.uuid4().hex}
+        self.identity_api.create_user(user['id'], user)
+        project_id = self.tenant_bar['id']
+        roles = []
+        costs = []
+        for i in range(10):
+            group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                     'domain_id': DEFAULT_DOMAIN_ID}
+            self.identity_api.create_group(group['id'], group)
+            self.identity_api.add_user_to_group(user['id'], group['id'])
+            role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+            self.identity_api.create_role(role['id'], role)
+            if i % 2:
+                self.identity_api.create_grant(
+                    role['id'], group_id=group['id'], project_id=project_id)
+            else:
+                self.identity_api.create_grant(
+                    role['id'], group_id=group['id'],
+                    domain_id=DEFAULT_DOMAIN_ID, inherited_to_projects=True)
+            roles.append(role['id'])
+
+            role_ids, cost = self._count_statements(
+                self.identity_api.get_roles_for_user_and_project,
+                user['id'], project_id)
+            self.assertEqual(set(role_ids), set(roles))
+            costs.append(cost)
+        self.assertEqual(set(costs), set([costs[0]]))
+
+        role_ids, cost = self._count_statements(
+            self.identity_api.get_roles_for_user_and_domain,
+            user['id'], DEFAULT_DOMAIN_ID)
+        self.assertEqual(role_ids, [])
+        self.assertEqual(cost, costs[0])
+
+    def test_get_roles_is_a_single_query(self):
+        role_ids = [role['id'] for role in default_fixtures.ROLES]
+        roles_ref, cost = self._count_statements(self.identity_api.get_roles,
+                                                 role_ids)
+        self.assertEqual([role['id'] for role in roles_ref], role_ids)
+        self.assertEqual(cost, 1)
+
+    def _create_user_in_group(self):
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'domain_id': DEFAULT_DOMAIN_ID,
+                'password': uuid.uuid4().hex}
+        self.identity_api.create_user(user['id'], user)
+        group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_group(group['id'], group)
+        self.identity_api.add_user_to_group(user['id'], group['id'])
+        return user['id'], group['id']
+
+    def _cached_roles(self, user_id, project_id):
+        """Return the roles of a user, asserting they come from the cache."""
+        hits = self.assignment_api.role_cache.hits
+        roles = self.identity_api.get_roles_for_user_and_project(user_id,
+                                                                 project_id)
+        self.assertEqual(self.assignment_api.role_cache.hits, hits + 1)
+        return set(roles)
+
+    def test_effective_roles_are_cached(self):
+        self.opt_in_group('assignment', cache_time=60)
+        user_id, group_id = self._create_user_in_group()
+        self.identity_api.create_grant('member', user_id=user_id,
+                                       project_id='bar')
+        self.identity_api.create_grant('other', group_id=group_id,
+                                       domain_id=DEFAULT_DOMAIN_ID)
+        roles = self.identity_api.get_roles_for_user_and_project(user_id,
+                                                                 'bar')
+        domain_roles = self.identity_api.get_roles_for_user_and_domain(
+            user_id, DEFAULT_DOMAIN_ID)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('the assignment backend was read')
+
+        self.stubs.Set(self.assignment_api.driver, 'list_grant_role_dicts',
+                       fail)
+        self.assertEqual(self._cached_roles(user_id, 'bar'), set(roles))
+        self.assertEqual(
+            self.identity_api.get_roles_for_user_and_domain(
+                user_id, DEFAULT_DOMAIN_ID),
+            domain_roles)
+        self.assertEqual(self.assignment_api.role_cache.hits, 2)
+        self.assertEqual(self.assignment_api.role_cache.misses, 2)
+        self.assertEqual(self.assignment_api.role_cache.hit_rate, 0.5)
+
+    def test_effective_roles_cache_disabled(self):
+        user_id, group_id = self._create_user_in_group()
+        self.identity_api.get_roles_for_user_and_project(user_id, 'bar')
+        self.identity_api.get_roles_for_user_and_project(user_id, 'bar')
+        self.assertEqual(len(self.assignment_api.role_cache), 0)
+
+    def test_effective_roles_invalidated_by_grants(self):
+        self.opt_in_group('assignment', cache_time=60)
+        user_id, group_id = self._create_user_in_group()
+        other_user_id, other_group_id = self._create_user_in_group()
+        self.identity_api.get_roles_for_user_and_project(user_id, 'bar')
+        self.identity_api.get_roles_for_user_and_project(other_user_id, 'bar')
+
+        self.identity_api.create_grant('member', user_id=user_id,
+                                       project_id='bar')
+        self.assertEqual(set(self.identity_api.get_roles_for_user_and_project(
+            user_id, 'bar')), set(['member']))
+        # other users' roles are kept
+        self.assertEqual(self._cached_roles(other_user_id, 'bar'), set())
+
+        self.identity_api.create_grant('other', group_id=group_id,
+                                       project_id='bar')
+        self.assertEqual(set(self.identity_api.get_roles_for_user_and_project(
+            user_id, 'bar')), set(['member', 'other']))
+        self.assertEqual(self._cached_roles(other_user_id, 'bar'), set())
+
+        self.identity_api.delete_grant('other', group_id=group_id,
+                                       project_id='bar')
+        self.identity_api.delete_grant('member', user_id=user_id,
+                                       project_id='bar')
+        self.assertEqual(self.identity_api.get_roles_for_user_and_project(
+            user_id, 'bar'), [])
+
+    def test_effective_roles_invalidated_by_group_membership(self):
+        self.opt_in_group('assignment', cache_time=60)
+        user_id, group_id = self._create_user_in_group()
+        self.identity_api.create_grant('other', group_id=group_id,
+                                       project_id='bar')
+        self.assertEqual(self.identity_api.get_roles_for_user_and_project(
+            user_id, 'bar'), ['other'])
+
+        self.identity_api.remove_user_from_group(user_id, group_id)
+        self.assertEqual(self.identity_api.get_roles_for_user_and_project(
+            user_id, 'bar'), [])
+        self.identity_api.add_user_to_group(user_id, group_id)
+        self.assertEqual(self.identity_api.get_roles_for_user_and_project(
+            user_id, 'bar'), ['other'])
+
+    def test_effective_roles_invalidated_by_project_and_domain_deletes(self):
+        self.opt_in_group('assignment', cache_time=60)
+        user_id, group_id = self._create_user_in_group()
+        domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                  'enabled': True}
+        self.identity_api.create_domain(domain['id'], domain)
+        project = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                   'domain_id': domain['id']}
+        self.identity_api.create_project(project['id'], project)
+        self.identity_api.create_grant('member', user_id=user_id,
+                                       project_id=project['id'])
+        self.identity_api.create_grant('member', user_id=user_id,
+                                       domain_id=domain['id'])
+        self.identity_api.get_roles_for_user_and_project(user_id, 'bar')
+        self.identity_api.get_roles_for_user_and_project(user_id,
+                                                         project['id'])
+        self.identity_api.get_roles_for_user_and_domain(user_id,
+                                                        domain['id'])
+
+        self.identity_api.delete_project(project['id'])
+        self.assertRaises(exception.ProjectNotFound,
+                          self.identity_api.get_roles_for_user_and_project,
+                          user_id, project['id'])
+        self._cached_roles(user_id, 'bar')
+
+        domain['enabled'] = False
+        self.identity_api.update_domain(domain['id'], domain)
+        self.identity_api.delete_domain(domain['id'])
+        self.assertRaises(exception.DomainNotFound,
+                          self.identity_api.get_roles_for_user_and_domain,
+                          user_id, domain['id'])
+        self._cached_roles(user_id, 'bar')
+
+    def test_effective_roles_invalidated_by_other_process(self):
+        self.opt_in_group('assignment', cache_time=60)
+        self.opt_in_group('invalidation', poll_interval=0)
+        user_id, group_id = self._create_user_in_group()
+        self.identity_api.get_roles_for_user_and_project(user_id, 'bar')
+        self.stubs.Set(self.invalidation_api.driver, 'receive',
+                       lambda: ['assignment:group:%s' % group_id])
+        self.identity_api.get_roles_for_user_and_project(user_id, 'bar')
+        self.assertEqual(self.assignment_api.role_cache.hits, 0)
+
     def test_create_null_user_name(self):
         user = {'id': uuid.uuid4().hex,
                 'name': None,
@@ -334,7 +536,134 @@ class SqlTrust(SqlTests, test_backend.TrustTests):
 
 
 class SqlToken(SqlTests, test_backend.TokenTests):
-    pass
+    def test_list_revoked_tokens_skips_valid_and_expired(self):
+        now = timeutils.utcnow()
+        token_ids = {}
+        for name, valid, expires in [
+                ('valid', True, now + datetime.timedelta(minutes=5)),
+                ('revoked', False, now + datetime.timedelta(minutes=5)),
+                ('expired', False, now - datetime.timedelta(minutes=5))]:
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(
+                token_id, {'id': token_id, 'expires': expires,
+                           'user': {'id': 'testuserid'}})
+            if not valid:
+                self.token_api.delete_token(token_id)
+            token_ids[name] = token_id
+
+        revoked = self.token_api.list_revoked_tokens()
+        self.assertEqual([x['id'] for x in revoked], [token_ids['revoked']])
+        self.assertEqual(set(revoked[0].keys()), set(['id', 'expires']))
+
+    def test_token_valid_expires_index(self):
+        table = sqlalchemy.Table('token', sqlalchemy.MetaData(),
+                                 autoload=True,
+                                 autoload_with=self.get_engine())
+        index_data = [(idx.name, idx.columns.keys())
+                      for idx in table.indexes]
+        self.assertIn(('ix_token_valid_expires', ['valid', 'expires']),
+                      index_data)
+
+
+class SqlPartitionedToken(SqlTests, test_backend.TokenTests):
+    def setUp(self):
+        super(SqlPartitionedToken, self).setUp()
+        self.opt_in_group(
+            'token', driver='keystone.token.backends.sql.PartitionedToken')
+        self.load_backends()
+
+    def _partition_names(self):
+        session = self.get_session()
+        return [ref.name for ref
+                in session.query(token_sql.TokenPartitionModel)]
+
+    def _create_token(self, expires):
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'expires': expires,
+                'user': {'id': 'testuserid'}}
+        self.token_api.create_token(token_id, data)
+        return token_id
+
+    def test_tokens_are_bucketed_by_expiry(self):
+        self.opt_in_group('token', partition_window=60)
+        now = timeutils.utcnow()
+        soon = self._create_token(now + datetime.timedelta(minutes=5))
+        later = self._create_token(now + datetime.timedelta(minutes=30))
+
+        self.assertEqual(len(self._partition_names()), 2)
+        self.assertEqual(self.token_api.get_token(soon)['id'], soon)
+        self.assertEqual(self.token_api.get_token(later)['id'], later)
+        self.assertItemsEqual(self.token_api.list_tokens('testuserid'),
+                              [soon, later])
+
+    def test_token_from_legacy_table(self):
+        token_id = uuid.uuid4().hex
+        session = self.get_session()
+        with session.begin():
+            session.add(token_sql.TokenModel.from_dict({
+                'id': token_id, 'user_id': 'testuserid', 'valid': True,
+                'expires': timeutils.utcnow() + datetime.timedelta(
+                    minutes=5)}))
+
+        self.assertEqual(self.token_api.get_token(token_id)['id'], token_id)
+        self.token_api.delete_token(token_id)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, token_id)
+
+    def test_token_from_partition_created_elsewhere(self):
+        # prime the partition list before another process adds a partition
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, uuid.uuid4().hex)
+        other = token_sql.PartitionedToken()
+        token_id = uuid.uuid4().hex
+        other.create_token(token_id, {'id': token_id,
+                                      'user': {'id': 'testuserid'}})
+
+        self.assertEqual(self.token_api.get_token(token_id)['id'], token_id)
+
+    def test_flush_drops_expired_partitions(self):
+        self.opt_in_group('token', partition_window=60)
+        valid_id = self._create_token(
+            timeutils.utcnow() + datetime.timedelta(minutes=5))
+        for minutes in (-5, -3, -1):
+            self._create_token(
+                timeutils.utcnow() + datetime.timedelta(minutes=minutes))
+        self.assertEqual(len(self._partition_names()), 4)
+
+        # the partition that expired in the last window is kept
+        self.assertEqual(self.token_api.flush_expired_tokens(), 2)
+        self.assertEqual(len(self._partition_names()), 2)
+        self.assertEqual(self.token_api.list_tokens('testuserid'),
+                         [valid_id])
+
+    def test_flush_expired_tokens_in_batches(self):
+        # whole partitions are dropped regardless of the batch size
+        self.opt_in_group('token', partition_window=60)
+        for x in xrange(5):
+            self._create_token(
+                timeutils.utcnow() - datetime.timedelta(minutes=5))
+        batches = []
+        deleted = self.token_api.flush_expired_tokens(
+            batch_size=2, batch_sleep=0, max_runtime=0,
+            progress=batches.append)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual([b['deleted'] for b in batches], [5, 0])
+        self.assertEqual(self._partition_names(), [])
+
+    def test_flush_expired_tokens_max_runtime(self):
+        # dropping a partition is a single batch, however many tokens it has
+        self.opt_in_group('token', partition_window=60)
+        for x in xrange(5):
+            self._create_token(
+                timeutils.utcnow() - datetime.timedelta(minutes=5))
+        clock = iter(xrange(0, 1000, 10))
+        self.stubs.Set(token_core.time, 'time', lambda: clock.next())
+        deleted = self.token_api.flush_expired_tokens(
+            batch_size=2, batch_sleep=0, max_runtime=15)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(self._partition_names(), [])
 
 
 class SqlCatalog(SqlTests, test_backend.CatalogTests):
@@ -386,6 +715,158 @@ class SqlCatalog(SqlTests, test_backend.CatalogTests):
         self.assertIsNone(catalog_endpoint.get('adminURL'))
         self.assertIsNone(catalog_endpoint.get('internalURL'))
 
+    def _create_endpoint(self, url='http://localhost/$(tenant_id)s'):
+        service = {
+            'id': uuid.uuid4().hex,
+            'type': uuid.uuid4().hex,
+            'name': uuid.uuid4().hex,
+            'description': uuid.uuid4().hex,
+        }
+        self.catalog_api.create_service(service['id'], service.copy())
+        endpoint = {
+            'id': uuid.uuid4().hex,
+            'region': uuid.uuid4().hex,
+            'interface': 'public',
+            'url': url,
+            'service_id': service['id'],
+        }
+        self.catalog_api.create_endpoint(endpoint['id'], endpoint.copy())
+        return service, endpoint
+
+    def test_catalog_is_cached_per_scope(self):
+        self.opt_in_group('catalog', cache_time=60)
+        service, endpoint = self._create_endpoint()
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        v3_catalog = self.catalog_api.get_v3_catalog('user', 'tenant')
+
+        def fail(*args, **kwargs):
+            raise AssertionError('the catalog backend was read')
+
+        self.stubs.Set(self.catalog_api.driver, 'get_session', fail)
+        self.assertEqual(self.catalog_api.get_catalog('user', 'tenant'),
+                         catalog)
+        self.assertEqual(self.catalog_api.get_v3_catalog('user', 'tenant'),
+                         v3_catalog)
+        self.assertEqual(self.catalog_api.catalog_cache.hits, 2)
+        self.assertRaises(AssertionError, self.catalog_api.get_catalog,
+                          'user', 'other-tenant')
+
+        # callers get their own copy
+        catalog[endpoint['region']][service['type']]['publicURL'] = None
+        self.assertEqual(
+            self.catalog_api.get_catalog('user', 'tenant')[
+                endpoint['region']][service['type']]['publicURL'],
+            'http://localhost/tenant')
+
+    def test_catalog_cache_invalidated_by_endpoint_crud(self):
+        self.opt_in_group('catalog', cache_time=60)
+        service, endpoint = self._create_endpoint()
+        self.catalog_api.get_catalog('user', 'tenant')
+
+        endpoint['url'] = 'http://remotehost/$(tenant_id)s'
+        self.catalog_api.update_endpoint(endpoint['id'], endpoint.copy())
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        self.assertEqual(
+            catalog[endpoint['region']][service['type']]['publicURL'],
+            'http://remotehost/tenant')
+
+        self.catalog_api.delete_endpoint(endpoint['id'])
+        self.assertNotIn(endpoint['region'],
+                         self.catalog_api.get_catalog('user', 'tenant'))
+
+    def test_catalog_cache_invalidated_by_service_crud(self):
+        self.opt_in_group('catalog', cache_time=60)
+        service, endpoint = self._create_endpoint()
+        catalog = self.catalog_api.get_v3_catalog('user', 'tenant')
+        self.assertEqual(len(catalog), 1)
+        self.catalog_api.delete_service(service['id'])
+        catalog = self.catalog_api.get_v3_catalog('user', 'tenant')
+        self.assertEqual(catalog, [])
+
+    def test_catalog_cache_invalidated_by_other_process(self):
+        self.opt_in_group('catalog', cache_time=60)
+        self.opt_in_group('invalidation', poll_interval=0)
+        self._create_endpoint()
+        self.catalog_api.get_catalog('user', 'tenant')
+        self.stubs.Set(self.invalidation_api.driver, 'receive',
+                       lambda: ['catalog'])
+        self.catalog_api.get_catalog('user', 'tenant')
+        self.assertEqual(self.catalog_api.catalog_cache.hits, 0)
+
+    def test_project_endpoint_crud(self):
+        service, endpoint = self._create_endpoint()
+        self.assertRaises(exception.ProjectEndpointNotFound,
+                          self.catalog_api.check_endpoint_in_project,
+                          endpoint['id'], 'tenant')
+        self.assertRaises(exception.EndpointNotFound,
+                          self.catalog_api.add_endpoint_to_project,
+                          uuid.uuid4().hex, 'tenant')
+
+        self.catalog_api.add_endpoint_to_project(endpoint['id'], 'tenant')
+        self.catalog_api.check_endpoint_in_project(endpoint['id'], 'tenant')
+        self.assertRaises(exception.Conflict,
+                          self.catalog_api.add_endpoint_to_project,
+                          endpoint['id'], 'tenant')
+        self.assertEqual(
+            [ref['id'] for ref in
+             self.catalog_api.list_endpoints_for_project('tenant')],
+            [endpoint['id']])
+        self.assertEqual(
+            self.catalog_api.list_projects_for_endpoint(endpoint['id']),
+            ['tenant'])
+
+        self.catalog_api.remove_endpoint_from_project(endpoint['id'],
+                                                      'tenant')
+        self.assertEqual(
+            self.catalog_api.list_endpoints_for_project('tenant'), [])
+        self.assertRaises(exception.ProjectEndpointNotFound,
+                          self.catalog_api.remove_endpoint_from_project,
+                          endpoint['id'], 'tenant')
+
+    def test_delete_endpoint_removes_it_from_projects(self):
+        service, endpoint = self._create_endpoint()
+        self.catalog_api.add_endpoint_to_project(endpoint['id'], 'tenant')
+        self.catalog_api.delete_endpoint(endpoint['id'])
+        self.assertEqual(
+            self.catalog_api.list_projects_for_endpoint(endpoint['id']), [])
+
+        service, endpoint = self._create_endpoint()
+        self.catalog_api.add_endpoint_to_project(endpoint['id'], 'tenant')
+        self.catalog_api.delete_service(service['id'])
+        self.assertEqual(
+            self.catalog_api.list_projects_for_endpoint(endpoint['id']), [])
+
+    def test_catalog_filtered_by_project_endpoints(self):
+        self.opt_in_group('catalog', cache_time=60)
+        service, endpoint = self._create_endpoint()
+        other_service, other_endpoint = self._create_endpoint()
+        self.assertEqual(
+            len(self.catalog_api.get_v3_catalog('user', 'tenant')), 2)
+
+        self.catalog_api.add_endpoint_to_project(endpoint['id'], 'tenant')
+        catalog = self.catalog_api.get_v3_catalog('user', 'tenant')
+        self.assertEqual([svc['id'] for svc in catalog], [service['id']])
+        self.assertEqual([ep['id'] for ep in catalog[0]['endpoints']],
+                         [endpoint['id']])
+        self.assertEqual(catalog[0]['endpoints'][0]['url'],
+                         'http://localhost/tenant')
+        self.assertEqual(self.catalog_api.get_catalog('user', 'tenant'),
+                         {endpoint['region']: {service['type']: {
+                             'id': endpoint['id'],
+                             'name': service['name'],
+                             'publicURL': 'http://localhost/tenant'}}})
+
+        # projects without endpoints still see every endpoint
+        self.assertEqual(
+            len(self.catalog_api.get_v3_catalog('user', 'other-tenant')), 2)
+        self.assertEqual(
+            len(self.catalog_api.get_catalog('user', 'other-tenant')), 2)
+
+        self.catalog_api.remove_endpoint_from_project(endpoint['id'],
+                                                      'tenant')
+        self.assertEqual(
+            len(self.catalog_api.get_v3_catalog('user', 'tenant')), 2)
+
     def test_create_endpoint_400(self):
         service = {
             'id': uuid.uuid4().hex,
@@ -14,10 +14,12 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import copy
 import os
 
 from keystone.tests import core as test
 
+from keystone.catalog.backends import templated
 from keystone import exception
 
 import default_fixtures
@@ -60,8 +62,53 @@ class TestTemplatedCatalog(test.TestCase, test_backend.CatalogTests):
         self.assertDictEqual(catalog_ref, self.DEFAULT_FIXTURE)
 
     def test_malformed_catalog_throws_error(self):
-        (self.catalog_api.driver.templates
-         ['RegionOne']['compute']['adminURL']) = \
+        templates = copy.deepcopy(self.catalog_api.driver.templates)
+        templates['RegionOne']['compute']['adminURL'] = \
             'http://localhost:$(compute_port)s/v1.1/$(tenant)s'
+        self.catalog_api.driver.templates = templates
         with self.assertRaises(exception.MalformedEndpoint):
             self.catalog_api.get_catalog('fake-user', 'fake-tenant')
+
+    def test_get_catalog_of_regions(self):
+        templates = copy.deepcopy(self.catalog_api.driver.templates)
+        templates['RegionTwo'] = {
+            'compute': {'publicURL': 'http://two:$(compute_port)s/v1.1/'
+                                     '$(tenant_id)s'}}
+        self.catalog_api.driver.templates = templates
+
+        catalog_ref = self.catalog_api.driver.get_catalog(
+            'foo', 'bar', regions=['RegionTwo', 'RegionThree'])
+        self.assertDictEqual(
+            catalog_ref,
+            {'RegionTwo': {'compute': {'publicURL':
+                                       'http://two:8774/v1.1/bar'}}})
+
+        catalog_ref = self.catalog_api.driver.get_catalog('foo', 'bar')
+        self.assertEqual(set(catalog_ref), set(['RegionOne', 'RegionTwo']))
+        self.assertDictEqual(catalog_ref['RegionOne'],
+                             self.DEFAULT_FIXTURE['RegionOne'])
+
+
+class TestCompiledCatalog(test.TestCase):
+    def test_render_matches_templates(self):
+        templates = {
+            'RegionOne': {
+                'identity': {'publicURL': 'http://one:$(public_port)s/',
+                             'name': 'Identity',
+                             'percent': '100%%'},
+            },
+            'RegionTwo': {
+                'identity': {'publicURL': 'http://two/$(user_id)s',
+                             'id': 2},
+            },
+        }
+        compiled = templated.CompiledCatalog(templates)
+        self.assertEqual(len(compiled.slots), 5)
+        self.assertDictEqual(
+            compiled.render('foo', 'bar'),
+            {'RegionOne': {'identity': {'publicURL': 'http://one:5000/',
+                                        'name': 'Identity',
+                                        'percent': '100%'}},
+             'RegionTwo': {'identity': {'publicURL': 'http://two/foo',
+                                        'id': None}}})
+        self.assertEqual(compiled.render('foo', 'bar', regions=[]), {})
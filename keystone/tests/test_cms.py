@@ -0,0 +1,156 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+import nose.exc
+
+from keystone.common import cms
+from keystone.common import environment
+from keystone.tests import core as test
+
+
+SIGNING_CERT = test.rootdir('examples', 'pki', 'certs', 'signing_cert.pem')
+SIGNING_KEY = test.rootdir('examples', 'pki', 'private', 'signing_key.pem')
+CA_CERT = test.rootdir('examples', 'pki', 'certs', 'cacert.pem')
+
+
+class InProcessSignerTest(test.TestCase):
+    def setUp(self):
+        super(InProcessSignerTest, self).setUp()
+        try:
+            self.signer = cms.InProcessSigner(SIGNING_CERT, SIGNING_KEY)
+        except ImportError:
+            raise nose.exc.SkipTest('cryptography is not installed')
+        self.text = json.dumps({'access': {'token': {'id': 'placeholder'},
+                                           'serviceCatalog': ['x' * 4096]}})
+
+    def test_output_identical_to_openssl(self):
+        self.assertEqual(
+            cms.cms_sign_text(self.text, SIGNING_CERT, SIGNING_KEY),
+            self.signer.sign_text(self.text))
+
+    def test_output_verifies(self):
+        signed = self.signer.sign_text(self.text)
+        self.assertEqual(self.text,
+                         cms.cms_verify(signed, SIGNING_CERT, CA_CERT))
+
+    def test_signed_token_is_ans1_token(self):
+        token_id = cms.cms_to_token(self.signer.sign_text(self.text))
+        self.assertTrue(cms.is_ans1_token(token_id))
+
+    def test_unicode_text(self):
+        text = u'{"name": "\xe7a va"}'
+        self.assertEqual(
+            cms.cms_sign_text(text.encode('utf-8'), SIGNING_CERT,
+                              SIGNING_KEY),
+            self.signer.sign_text(text))
+
+    def test_unsupported_digest(self):
+        self.assertRaises(cms.SigningError,
+                          cms.InProcessSigner,
+                          SIGNING_CERT, SIGNING_KEY, digest='md4')
+
+
+class GetSignerTest(test.TestCase):
+    def setUp(self):
+        super(GetSignerTest, self).setUp()
+        self.stubs.Set(cms, '_signers', {})
+
+    def test_signer_is_reused(self):
+        signer = cms.get_signer(cms.SUBPROCESS_ENGINE,
+                                SIGNING_CERT, SIGNING_KEY)
+        self.assertIs(signer, cms.get_signer(cms.SUBPROCESS_ENGINE,
+                                             SIGNING_CERT, SIGNING_KEY))
+
+    def test_unknown_engine(self):
+        self.assertRaises(cms.SigningError,
+                          cms.get_signer, 'bogus', SIGNING_CERT, SIGNING_KEY)
+
+    def test_fallback_without_cryptography(self):
+        self.disable_module('cryptography')
+        signer = cms.get_signer(cms.INPROCESS_ENGINE,
+                                SIGNING_CERT, SIGNING_KEY)
+        self.assertIsInstance(signer, cms.SubprocessSigner)
+
+    def test_fallback_with_missing_key(self):
+        signer = cms.get_signer(cms.INPROCESS_ENGINE,
+                                SIGNING_CERT, test.tmpdir('missing.pem'))
+        self.assertIsInstance(signer, cms.SubprocessSigner)
+
+
+class PoolSignerTest(test.TestCase):
+    def setUp(self):
+        super(PoolSignerTest, self).setUp()
+        self.signer = cms.PoolSigner(SIGNING_CERT, SIGNING_KEY, size=2)
+        self.text = json.dumps({'access': {'token': {'id': 'placeholder'}}})
+
+    def tearDown(self):
+        self.signer.close()
+        super(PoolSignerTest, self).tearDown()
+
+    def test_output_identical_to_openssl(self):
+        self.assertEqual(
+            cms.cms_sign_text(self.text, SIGNING_CERT, SIGNING_KEY),
+            self.signer.sign_text(self.text))
+
+    def test_verify(self):
+        signed = self.signer.sign_text(self.text)
+        self.assertEqual(self.text, self.signer.verify_text(signed, CA_CERT))
+
+    def test_verify_failure(self):
+        self.assertRaises(environment.subprocess.CalledProcessError,
+                          self.signer.verify_text, 'not cms', CA_CERT)
+
+    def test_verify_token_through_pool(self):
+        self.stubs.Set(cms, '_signers', {})
+        self.opt_in_group('signing', keyfile=SIGNING_KEY)
+        token_id = cms.cms_sign_token(self.text, SIGNING_CERT, SIGNING_KEY,
+                                      engine=cms.POOL_ENGINE)
+        self.assertEqual(self.text,
+                         cms.verify_token(token_id, SIGNING_CERT, CA_CERT,
+                                          engine=cms.POOL_ENGINE))
+        signer = cms.get_signer(cms.POOL_ENGINE, SIGNING_CERT, SIGNING_KEY)
+        self.addCleanup(signer.close)
+        self.assertEqual(2, signer.stats()['calls'])
+
+    def test_workers_are_reused(self):
+        for _i in range(5):
+            self.signer.sign_text(self.text)
+        stats = self.signer.stats()
+        self.assertEqual(5, stats['calls'])
+        self.assertEqual(0, stats['restarts'])
+        self.assertEqual(0, stats['queue_depth'])
+
+    def test_crashed_worker_is_restarted(self):
+        signer = cms.PoolSigner(SIGNING_CERT, SIGNING_KEY, size=1)
+        self.addCleanup(signer.close)
+        signer.sign_text(self.text)
+        worker = signer._acquire()
+        worker.process.kill()
+        worker.process.wait()
+        signer._idle.put(worker)
+
+        signer.sign_text(self.text)
+        signer.sign_text(self.text)
+        self.assertEqual(1, signer.stats()['restarts'])
+
+    def test_saturated_pool_times_out(self):
+        signer = cms.PoolSigner(SIGNING_CERT, SIGNING_KEY, size=1,
+                                timeout=0.01)
+        signer._acquire()
+        self.assertRaises(cms.SigningError, signer.sign_text, self.text)
+        self.assertEqual(0, signer.stats()['queue_depth'])
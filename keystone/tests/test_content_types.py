@@ -795,6 +795,36 @@ class JsonTestCase(RestfulTestCase, CoreApiTests):
             expected_status=200)
         self.assertValidRevocationListResponse(r)
 
+    def test_fetch_revocation_list_not_modified(self):
+        token = self.get_scoped_token()
+        r = self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            expected_status=200)
+        etag = r.headers['ETag']
+
+        self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            headers={'If-None-Match': etag},
+            expected_status=304)
+
+        self.admin_request(
+            method='DELETE',
+            path='/v2.0/tokens/%s' % self.get_scoped_token(),
+            token=token,
+            expected_status=204)
+        r = self.admin_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            headers={'If-None-Match': etag},
+            expected_status=200)
+        self.assertNotEqual(etag, r.headers['ETag'])
+        self.assertValidRevocationListResponse(r)
+
     def assertValidRevocationListResponse(self, response):
         self.assertIsNotNone(response.result['signed'])
 
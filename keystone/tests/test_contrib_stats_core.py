@@ -14,6 +14,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+from keystone.common import instrumentation
 from keystone.contrib import stats
 
 from keystone import config
@@ -43,3 +44,26 @@ class StatsContribCore(test.TestCase):
         host_other = host_public + "1"
         self.assertEqual(host_other,
                          self.stats_middleware._resolve_api(host_other))
+
+
+class StatsControllerTests(test.TestCase):
+    def setUp(self):
+        super(StatsControllerTests, self).setUp()
+        self.controller = stats.StatsController()
+        self.context = {'is_admin': True}
+        instrumentation.TIMINGS.reset()
+
+    def tearDown(self):
+        instrumentation.TIMINGS.reset()
+        super(StatsControllerTests, self).tearDown()
+
+    def test_manager_stats(self):
+        instrumentation.TIMINGS.record('keystone.token.core', 'get_token',
+                                       0.001)
+        ref = self.controller.get_manager_stats(self.context)
+        self.assertEqual(len(ref['OS-STATS:managers']), 1)
+        self.assertEqual(ref['OS-STATS:managers'][0]['method'], 'get_token')
+
+        self.controller.reset_manager_stats(self.context)
+        ref = self.controller.get_manager_stats(self.context)
+        self.assertEqual(ref['OS-STATS:managers'], [])
@@ -0,0 +1,67 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from keystone.tests import core as test
+
+from keystone.common import dependency
+from keystone.common.sql import nova
+from keystone import config
+
+
+CONF = config.CONF
+DEFAULT_DOMAIN_ID = CONF.identity.default_domain_id
+
+NOVA_AUTH = {
+    'tenants': [{'id': 'demo', 'description': 'Demo project'}],
+    'users': [{'id': 'alice', 'password': 'secrete'}],
+    'user_tenant_list': [{'user_id': 'alice', 'tenant_id': 'demo'}],
+    'roles': ['netadmin'],
+    'role_user_tenant_list': [{'user_id': 'alice', 'tenant_id': 'demo',
+                               'role': 'netadmin'}],
+    'ec2_credentials': [{'user_id': 'alice', 'access_key': 'access',
+                         'secret_key': 'secret'}],
+}
+
+
+class ImportNovaAuth(test.TestCase):
+    def setUp(self):
+        super(ImportNovaAuth, self).setUp()
+        self.config([test.etcdir('keystone.conf.sample'),
+                     test.testsdir('test_overrides.conf'),
+                     test.testsdir('backend_sql.conf'),
+                     test.testsdir('backend_sql_disk.conf')])
+        test.setup_test_database()
+        # import_nova_auth runs without the managers of the server.
+        dependency.reset()
+
+    def tearDown(self):
+        test.teardown_test_database()
+        super(ImportNovaAuth, self).tearDown()
+
+    def test_import_auth(self):
+        nova.import_auth(NOVA_AUTH)
+
+        identity_api = dependency.REGISTRY['identity_api']
+        assignment_api = dependency.REGISTRY['assignment_api']
+        user_ref = identity_api.get_user_by_name(
+            'alice', DEFAULT_DOMAIN_ID)
+        tenant_ref = assignment_api.get_project_by_name(
+            'demo', DEFAULT_DOMAIN_ID)
+        role_ids = assignment_api.get_roles_for_user_and_project(
+            user_ref['id'], tenant_ref['id'])
+        role_names = [role['name'] for role in
+                      assignment_api.get_roles(role_ids)]
+        self.assertIn('netadmin', role_names)
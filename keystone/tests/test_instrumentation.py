@@ -0,0 +1,104 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from keystone.common import instrumentation
+from keystone.contrib import stats
+from keystone.tests import core as test
+
+
+class TimingsTests(test.TestCase):
+    def setUp(self):
+        super(TimingsTests, self).setUp()
+        self.timings = instrumentation.Timings()
+
+    def test_record(self):
+        self.timings.record('identity', 'get_user', 0.0005)
+        self.timings.record('identity', 'get_user', 0.003, error=True)
+        self.timings.record('identity', 'get_user', 10)
+        self.timings.record('token', 'get_token', 0.001)
+
+        report = self.timings.report()
+        self.assertEqual([(ref['manager'], ref['method']) for ref in report],
+                         [('identity', 'get_user'), ('token', 'get_token')])
+        ref = report[0]
+        self.assertEqual(ref['calls'], 3)
+        self.assertEqual(ref['errors'], 1)
+        self.assertEqual(ref['max_time'], 10)
+        calls = dict((h['le'], h['calls']) for h in ref['histogram'])
+        self.assertEqual(calls[0.001], 1)
+        self.assertEqual(calls[0.005], 1)
+        self.assertEqual(calls[None], 1)
+        self.assertEqual(sum(calls.values()), 3)
+
+        self.timings.reset()
+        self.assertEqual(self.timings.report(), [])
+
+    def test_dump_at_interval(self):
+        self.opt_in_group('stats', instrumentation_log_interval=60)
+        dumps = []
+        self.timings.dump = lambda: dumps.append(True)
+        self.timings.record('identity', 'get_user', 0.001)
+        self.timings.record('identity', 'get_user', 0.001)
+        self.assertEqual(dumps, [])
+        self.timings._next_dump = 0
+        self.timings.record('identity', 'get_user', 0.001)
+        self.assertEqual(dumps, [True])
+
+    def test_dump(self):
+        lines = []
+        self.stubs.Set(instrumentation.LOG, 'info',
+                       lambda msg, args: lines.append(msg % args))
+        self.timings.record('identity', 'get_user', 0.001)
+        self.timings.record('identity', 'get_user', 6)
+        self.timings.dump()
+        self.assertEqual(lines,
+                         ['identity get_user: 2 calls, 0 errors, 3000.5 ms '
+                          'mean, 6000.0 ms max (<=1ms:1 >5000ms:1)'])
+
+
+class InstrumentedManagerTests(test.TestCase):
+    def setUp(self):
+        super(InstrumentedManagerTests, self).setUp()
+        instrumentation.TIMINGS.reset()
+
+    def tearDown(self):
+        instrumentation.TIMINGS.reset()
+        super(InstrumentedManagerTests, self).tearDown()
+
+    def _timings(self):
+        return dict((ref['method'], ref)
+                    for ref in instrumentation.TIMINGS.report()
+                    if ref['manager'] == stats.Manager.__module__)
+
+    def test_driver_calls_are_timed(self):
+        self.opt_in_group('stats', instrument_managers=True)
+        stats_api = stats.Manager()
+        stats_api.increment_stat('admin', 'method', 'GET')
+        stats_api.increment_stat('admin', 'method', 'GET')
+        self.assertEqual(stats_api.get_stats('admin'), {'method': {'GET': 2}})
+        self.assertRaises(TypeError, stats_api.set_stats)
+
+        timings = self._timings()
+        self.assertEqual(sorted(timings),
+                         ['get_stats', 'increment_stat', 'set_stats'])
+        self.assertEqual(timings['increment_stat']['calls'], 2)
+        self.assertEqual(timings['get_stats']['calls'], 1)
+        self.assertEqual(timings['set_stats']['errors'], 1)
+
+    def test_disabled_by_default(self):
+        stats_api = stats.Manager()
+        stats_api.get_stats('admin')
+        self.assertEqual(self._timings(), {})
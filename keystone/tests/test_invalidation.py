@@ -0,0 +1,210 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+from keystone.tests import core as test
+
+from keystone import invalidation
+from keystone.invalidation.backends import memcache as invalidation_memcache
+from keystone.invalidation.backends import unix as invalidation_unix
+
+import test_backend_memcache
+
+
+class FakeDriver(invalidation.Driver):
+    def __init__(self):
+        self.published = []
+        self.received = []
+        self.polls = 0
+
+    def publish(self, topic):
+        self.published.append(topic)
+
+    def receive(self):
+        self.polls += 1
+        received, self.received = self.received, []
+        return received
+
+
+class InvalidationManagerTests(test.TestCase):
+    def setUp(self):
+        super(InvalidationManagerTests, self).setUp()
+        self.opt_in_group('invalidation', poll_interval=0)
+        self.invalidation_api = invalidation.Manager()
+        self.invalidation_api.driver = FakeDriver()
+
+    def test_publish(self):
+        seen = []
+        self.invalidation_api.subscribe('roles', seen.append)
+        generation = self.invalidation_api.generation('roles')
+        other = self.invalidation_api.generation('catalog')
+
+        self.invalidation_api.publish('roles')
+        self.assertNotEqual(self.invalidation_api.generation('roles'),
+                            generation)
+        self.assertEqual(self.invalidation_api.generation('catalog'), other)
+        self.assertEqual(seen, ['roles'])
+        self.assertEqual(self.invalidation_api.driver.published, ['roles'])
+
+    def test_receive(self):
+        seen = []
+        self.invalidation_api.subscribe('roles', seen.append)
+        generation = self.invalidation_api.generation('roles')
+
+        self.invalidation_api.driver.received = ['roles']
+        self.assertNotEqual(self.invalidation_api.generation('roles'),
+                            generation)
+        self.assertEqual(seen, ['roles'])
+        self.assertEqual(self.invalidation_api.driver.published, [])
+
+    def test_publish_detail(self):
+        seen = []
+        self.invalidation_api.subscribe('roles', seen.append)
+        generation = self.invalidation_api.generation('roles')
+
+        self.invalidation_api.publish('roles:user:123')
+        self.invalidation_api.driver.received = ['roles:group:456']
+        self.assertNotEqual(self.invalidation_api.generation('roles'),
+                            generation)
+        self.assertEqual(seen, ['roles:user:123', 'roles:group:456'])
+        self.assertEqual(self.invalidation_api.driver.published,
+                         ['roles:user:123'])
+
+    def test_lost_events_invalidate_everything(self):
+        roles = self.invalidation_api.generation('roles')
+        catalog = self.invalidation_api.generation('catalog')
+
+        self.invalidation_api.driver.received = [None]
+        self.assertNotEqual(self.invalidation_api.generation('roles'), roles)
+        self.assertNotEqual(self.invalidation_api.generation('catalog'),
+                            catalog)
+
+    def test_poll_interval(self):
+        self.opt_in_group('invalidation', poll_interval=60)
+        self.invalidation_api.generation('roles')
+        self.invalidation_api.generation('roles')
+        self.assertEqual(self.invalidation_api.driver.polls, 1)
+
+
+class UnixInvalidationTests(test.TestCase):
+    def setUp(self):
+        super(UnixInvalidationTests, self).setUp()
+        # NOTE: unix socket paths are limited to about a hundred bytes.
+        socket_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, socket_dir)
+        self.opt_in_group('invalidation', socket_dir=socket_dir)
+        self.drivers = [invalidation_unix.Invalidation() for x in xrange(3)]
+        for driver in self.drivers:
+            self.addCleanup(driver.close)
+            driver.receive()
+
+    def test_publish(self):
+        self.drivers[0].publish('roles')
+        self.drivers[0].publish(None)
+        self.assertEqual(self.drivers[0].receive(), [])
+        self.assertEqual(self.drivers[1].receive(), ['roles', None])
+        self.assertEqual(self.drivers[2].receive(), ['roles', None])
+        self.assertEqual(self.drivers[1].receive(), [])
+
+    def test_overflowed_queue_invalidates_everything(self):
+        # NOTE: sockets queue net.unix.max_dgram_qlen datagrams, 10 by default
+        lost = invalidation_unix._lost_path(self.drivers[1]._path)
+        published = 0
+        while not os.path.exists(lost) and published < 100000:
+            self.drivers[0].publish('roles:%d' % published)
+            published += 1
+        topics = self.drivers[1].receive()
+        self.assertEqual(topics[0], None)
+        self.assertEqual(topics[1:],
+                         ['roles:%d' % x for x in xrange(len(topics) - 1)])
+        self.assertFalse(os.path.exists(lost))
+        self.assertEqual(self.drivers[1].receive(), [])
+
+        self.drivers[0].publish('roles')
+        self.assertEqual(self.drivers[1].receive(), ['roles'])
+
+    def test_closed_sockets_are_removed(self):
+        self.drivers[2].close()
+        # leave the socket file behind, as a process that was killed does
+        path = os.path.join(invalidation_unix.CONF.invalidation.socket_dir,
+                            'stale.sock')
+        with open(path, 'w'):
+            pass
+
+        self.drivers[0].publish('roles')
+        self.assertEqual(self.drivers[1].receive(), ['roles'])
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            len(os.listdir(invalidation_unix.CONF.invalidation.socket_dir)), 2)
+
+
+class MemcacheInvalidationTests(test.TestCase):
+    def setUp(self):
+        super(MemcacheInvalidationTests, self).setUp()
+        self.client = test_backend_memcache.MemcacheClient()
+        self.drivers = [invalidation_memcache.Invalidation(client=self.client)
+                        for x in xrange(2)]
+        for driver in self.drivers:
+            driver.receive()
+
+    def test_publish(self):
+        self.drivers[0].publish('roles')
+        self.drivers[0].publish('catalog')
+        self.assertEqual(self.drivers[0].receive(), [])
+        self.assertEqual(self.drivers[1].receive(), ['roles', 'catalog'])
+        self.assertEqual(self.drivers[1].receive(), [])
+
+    def test_expired_events_invalidate_everything(self):
+        self.drivers[0].publish('roles')
+        self.drivers[0].publish('catalog')
+        self.client.delete(self.drivers[0]._event_key(1))
+        self.assertEqual(self.drivers[1].receive(), [None])
+
+    def test_too_many_events_invalidate_everything(self):
+        for x in xrange(invalidation_memcache.MAX_EVENTS + 1):
+            self.drivers[0].publish('roles')
+        self.assertEqual(self.drivers[1].receive(), [None])
+
+    def test_restarted_memcache_invalidates_everything(self):
+        self.drivers[0].publish('roles')
+        self.drivers[1].receive()
+        self.client.cache.clear()
+        self.assertEqual(self.drivers[1].receive(), [None])
+
+
+class TokenRevocationTests(test.TestCase):
+    def setUp(self):
+        super(TokenRevocationTests, self).setUp()
+        self.opt_in_group('invalidation', poll_interval=0)
+        self.load_backends()
+
+    def test_revocation_is_published(self):
+        driver = FakeDriver()
+        self.invalidation_api.driver = driver
+        generation = self.token_api.revocation_generation
+        self.token_api.invalidate_revocation_list()
+        self.assertEqual(driver.published, ['token-revocation'])
+        self.assertNotEqual(self.token_api.revocation_generation, generation)
+
+    def test_revocation_by_other_process(self):
+        driver = FakeDriver()
+        self.invalidation_api.driver = driver
+        generation = self.token_api.revocation_generation
+        driver.received = ['token-revocation']
+        self.assertNotEqual(self.token_api.revocation_generation, generation)
@@ -21,6 +21,7 @@ import urllib2
 
 from keystone.tests import core as test
 
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import policy as common_policy
@@ -57,6 +58,26 @@ class PolicyFileTestCase(test.TestCase):
         self.assertRaises(exception.ForbiddenAction, rules.enforce,
                           empty_credentials, action, self.target)
 
+    def test_reload_checks_are_throttled(self):
+        self.opt_in_group('policy', reload_interval=60)
+        reads = []
+        read_cached_file = utils.read_cached_file
+
+        def counting_read_cached_file(*args, **kwargs):
+            reads.append(True)
+            return read_cached_file(*args, **kwargs)
+
+        self.stubs.Set(utils, 'read_cached_file', counting_read_cached_file)
+        with open(self.tmpfilename, "w") as policyfile:
+            policyfile.write("""{"example:test": []}""")
+        for _i in range(3):
+            rules.enforce({}, "example:test", self.target)
+        self.assertEqual(len(reads), 1)
+
+        rules._NEXT_RELOAD_CHECK = 0
+        rules.enforce({}, "example:test", self.target)
+        self.assertEqual(len(reads), 2)
+
 
 class PolicyTestCase(test.TestCase):
     def setUp(self):
@@ -75,6 +96,10 @@ class PolicyTestCase(test.TestCase):
             "example:early_or_success": [["rule:true"], ["false:false"]],
             "example:lowercase_admin": [["role:admin"], ["role:sysadmin"]],
             "example:uppercase_admin": [["role:ADMIN"], ["role:sysadmin"]],
+            "example:missing_key_in_rule": "rule:owner or rule:true",
+            "example:missing_key": "user_id:%(user_id)s or rule:true",
+            "example:missing_rule": [["rule:noexist"]],
+            "owner": [["user_id:%(user_id)s"]],
         }
 
         # NOTE(vish): then overload underlying policy engine
@@ -154,6 +179,53 @@ class PolicyTestCase(test.TestCase):
         rules.enforce(admin_credentials, lowercase_action, self.target)
         rules.enforce(admin_credentials, uppercase_action, self.target)
 
+    def test_referenced_rule_failing_on_missing_key(self):
+        rules.enforce(self.credentials, "example:missing_key_in_rule",
+                      self.target)
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          self.credentials, "example:missing_key",
+                          self.target)
+
+    def test_missing_referenced_rule(self):
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          self.credentials, "example:missing_rule",
+                          self.target)
+
+    def test_rules_are_recompiled_when_set(self):
+        rules.enforce(self.credentials, "example:allowed", self.target)
+        self.rules["example:allowed"] = "!"
+        self._set_rules()
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          self.credentials, "example:allowed", self.target)
+
+    def test_compiled_sample_policy(self):
+        with open(test.etcdir('policy.json')) as policyfile:
+            common_policy.set_rules(common_policy.Rules.load_json(
+                policyfile.read(), 'default'))
+        credentials = [
+            {},
+            {'roles': []},
+            {'roles': ['Admin'], 'user_id': 'foo'},
+            {'roles': ['service'], 'user_id': 'bar'},
+            {'roles': ['member'], 'user_id': 'foo', 'is_admin': 1},
+            {'roles': ['member'], 'user_id': 'foo'},
+        ]
+        targets = [
+            {},
+            {'user_id': 'foo'},
+            {'user_id': 'bar', 'trust.trustor_user_id': 'foo'},
+        ]
+        for action in common_policy._rules.keys() + ['example:noexist']:
+            for creds in credentials:
+                for target in targets:
+                    try:
+                        expected = common_policy.check(action, target, creds)
+                    except KeyError:
+                        expected = False
+                    self.assertEqual(
+                        rules.enforce(creds, action, target, do_raise=False),
+                        expected, (action, creds, target))
+
 
 class DefaultPolicyTestCase(test.TestCase):
     def setUp(self):
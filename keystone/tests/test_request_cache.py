@@ -0,0 +1,99 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from keystone.common import manager
+from keystone.common import request_cache
+from keystone import exception
+from keystone.tests import core as test
+
+
+class FakeDriver(object):
+    def __init__(self):
+        self.calls = []
+        self.users = {'foo': {'id': 'foo', 'name': 'Foo'}}
+
+    def get_user(self, user_id):
+        self.calls.append(('get_user', user_id))
+        try:
+            return self.users[user_id]
+        except KeyError:
+            raise exception.UserNotFound(user_id=user_id)
+
+    def update_user(self, user_id, user):
+        self.calls.append(('update_user', user_id))
+        self.users[user_id] = user
+        return user
+
+    def list_users(self):
+        self.calls.append(('list_users',))
+        return self.users.values()
+
+
+@request_cache.memoize
+class FakeManager(manager.Manager):
+    def __init__(self):
+        self.driver = FakeDriver()
+
+    def get_user_name(self, user_id):
+        return self.get_user(user_id)['name']
+
+
+class RequestCacheTests(test.TestCase):
+    def setUp(self):
+        super(RequestCacheTests, self).setUp()
+        self.manager = FakeManager()
+        self.cache = request_cache.start()
+
+    def tearDown(self):
+        request_cache.stop()
+        super(RequestCacheTests, self).tearDown()
+
+    def test_lookups_are_memoized(self):
+        user = self.manager.get_user('foo')
+        user['name'] = 'Changed'
+        self.assertEqual(self.manager.get_user('foo')['name'], 'Foo')
+        self.assertEqual(self.manager.get_user_name('foo'), 'Foo')
+        self.assertEqual(self.manager.driver.calls, [('get_user', 'foo')])
+        self.assertEqual(self.cache.lookups, 3)
+        self.assertEqual(self.cache.backend_calls, 2)
+
+    def test_writes_clear_the_cache(self):
+        self.manager.get_user('foo')
+        self.manager.update_user('foo', {'id': 'foo', 'name': 'Bar'})
+        self.assertEqual(self.manager.get_user('foo')['name'], 'Bar')
+        self.assertEqual(self.manager.driver.calls,
+                         [('get_user', 'foo'), ('update_user', 'foo'),
+                          ('get_user', 'foo')])
+
+    def test_lists_do_not_clear_the_cache(self):
+        self.manager.get_user('foo')
+        self.manager.list_users()
+        self.manager.get_user('foo')
+        self.assertEqual(self.manager.driver.calls,
+                         [('get_user', 'foo'), ('list_users',)])
+
+    def test_errors_are_not_memoized(self):
+        for _i in range(2):
+            self.assertRaises(exception.UserNotFound,
+                              self.manager.get_user, 'bar')
+        self.assertEqual(len(self.manager.driver.calls), 2)
+
+    def test_nothing_is_memoized_outside_requests(self):
+        self.assertIs(request_cache.stop(), self.cache)
+        self.assertIsNone(request_cache.current())
+        self.manager.get_user('foo')
+        self.manager.get_user('foo')
+        self.assertEqual(len(self.manager.driver.calls), 2)
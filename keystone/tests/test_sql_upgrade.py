@@ -26,6 +26,7 @@ To run these tests against a live database:
     all data will be lost.
 """
 import copy
+import datetime
 import json
 import uuid
 
@@ -37,6 +38,7 @@ from keystone.tests import core as test
 from keystone.common import sql
 from keystone.common.sql import migration
 from keystone import config
+from keystone.openstack.common import timeutils
 
 import default_fixtures
 
@@ -45,6 +47,18 @@ CONF = config.CONF
 DEFAULT_DOMAIN_ID = CONF.identity.default_domain_id
 
 
+def sqlite_legacy_alter_table(dbapi_conn, connection_rec):
+    """Keeps sqlite from rewriting foreign keys when a table is renamed.
+
+    sqlalchemy-migrate alters sqlite tables by copying them to
+    migration_tmp and renaming the copy back; since sqlite 3.26 the rename
+    also repoints the foreign keys of other tables at migration_tmp, which
+    breaks every later migration of those tables.
+
+    """
+    dbapi_conn.execute('PRAGMA legacy_alter_table = ON')
+
+
 class SqlMigrateBase(test.TestCase):
     def initialize_sql(self):
         self.metadata = sqlalchemy.MetaData()
@@ -69,6 +83,9 @@ class SqlMigrateBase(test.TestCase):
 
         # create and share a single sqlalchemy engine for testing
         self.engine = self.base.get_engine(allow_global_engine=False)
+        if self.engine.name == 'sqlite':
+            sqlalchemy.event.listen(self.engine, 'connect',
+                                    sqlite_legacy_alter_table)
         self.Session = self.base.get_sessionmaker(engine=self.engine,
                                                   autocommit=False)
 
@@ -1292,6 +1309,157 @@ class SqlUpgradeTests(SqlMigrateBase):
         else:
             self.assertEqual(len(index_data), 0)
 
+    def test_upgrade_33_token_valid_expires_index(self):
+        self.upgrade(33)
+        table = sqlalchemy.Table('token', self.metadata, autoload=True)
+        index_data = [(idx.name, idx.columns.keys())
+                      for idx in table.indexes]
+        self.assertIn(('ix_token_valid_expires', ['valid', 'expires']),
+                      index_data)
+
+    def test_downgrade_33_token_valid_expires_index(self):
+        self.upgrade(33)
+        self.downgrade(32)
+        table = sqlalchemy.Table('token', self.metadata, autoload=True)
+        index_names = [idx.name for idx in table.indexes]
+        self.assertNotIn('ix_token_valid_expires', index_names)
+
+    def create_token_partition(self, name):
+        """Add a token partition like those of the partitioned driver."""
+        token_table = sqlalchemy.Table('token', self.metadata, autoload=True)
+        partition = sqlalchemy.Table(
+            name, self.metadata,
+            *[column.copy() for column in token_table.columns])
+        partition.create(self.engine)
+        now = timeutils.utcnow()
+        session = self.Session()
+        self.insert_dict(session, 'token_partition', {
+            'name': name,
+            'expires_from': now,
+            'expires_before': now + datetime.timedelta(days=1)})
+        session.close()
+
+    def test_upgrade_34_token_partition_table(self):
+        self.upgrade(34)
+        self.assertTableColumns('token_partition',
+                                ['name', 'expires_from', 'expires_before'])
+
+    def test_downgrade_34_token_partition_table(self):
+        self.upgrade(34)
+        self.create_token_partition('token_p1')
+        self.assertTableExists('token_p1')
+
+        self.downgrade(33)
+        self.assertTableDoesNotExist('token_partition')
+        self.assertTableDoesNotExist('token_p1')
+        self.assertTableExists('token')
+
+    def test_upgrade_35_compacts_token_extra(self):
+        self.upgrade(34)
+        session = self.Session()
+        token_id = uuid.uuid4().hex
+        extra = {'key': token_id,
+                 'user': {'id': 'testuserid'},
+                 'token_data': {'access': {'serviceCatalog': [{}],
+                                           'token': {'id': token_id}}}}
+        self.insert_dict(session, 'token', {
+            'id': token_id,
+            'expires': timeutils.utcnow() + datetime.timedelta(hours=1),
+            'extra': json.dumps(extra),
+            'valid': True,
+            'user_id': 'testuserid'})
+
+        self.upgrade(35)
+        token_table = sqlalchemy.Table('token',
+                                       sqlalchemy.MetaData(),
+                                       autoload=True,
+                                       autoload_with=self.engine)
+        q = session.query(token_table.c.extra)
+        extra = json.loads(q.filter(token_table.c.id == token_id).one()[0])
+        self.assertEqual(extra['persistence_version'], 2)
+        self.assertTrue(extra['catalog_omitted'])
+        self.assertNotIn('key', extra)
+        self.assertNotIn('serviceCatalog', extra['token_data']['access'])
+
+    def insert_token(self, table_name, extra, expires=None):
+        token_id = uuid.uuid4().hex
+        session = self.Session()
+        self.insert_dict(session, table_name, {
+            'id': token_id,
+            'expires': (expires or
+                        timeutils.utcnow() + datetime.timedelta(hours=1)),
+            'extra': json.dumps(extra),
+            'valid': True,
+            'user_id': 'testuserid'})
+        session.close()
+        return token_id
+
+    def test_upgrade_36_token_tenant_and_consumer(self):
+        self.upgrade(35)
+        self.create_token_partition('token_p1')
+        oauth = {'token': {'OS-OAUTH1': {'consumer_id': 'consumerid'}}}
+        tokens = {}
+        for table_name in ('token', 'token_p1'):
+            tokens[table_name] = [
+                self.insert_token(table_name, {'tenant': {'id': 'tenantid'}}),
+                self.insert_token(table_name, {'token_data': oauth}),
+                self.insert_token(table_name, {}),
+                # expired tokens are left alone
+                self.insert_token(
+                    table_name, {'tenant': {'id': 'tenantid'}},
+                    timeutils.utcnow() - datetime.timedelta(hours=1))]
+
+        self.upgrade(36)
+        for table_name in ('token', 'token_p1'):
+            table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(),
+                                     autoload=True, autoload_with=self.engine)
+            self.assertIn('tenant_id', table.c)
+            self.assertIn('consumer_id', table.c)
+            index_data = [(idx.name, idx.columns.keys())
+                          for idx in table.indexes]
+            self.assertIn(('ix_%s_user_id_tenant_id' % table_name,
+                           ['user_id', 'tenant_id']), index_data)
+            self.assertIn(('ix_%s_user_id_consumer_id' % table_name,
+                           ['user_id', 'consumer_id']), index_data)
+            self.assertIn(('ix_%s_trust_id' % table_name, ['trust_id']),
+                          index_data)
+
+            scopes = dict(
+                (row.id, (row.tenant_id, row.consumer_id))
+                for row in self.engine.execute(sqlalchemy.select([table])))
+            tenant, consumer, unscoped, expired = tokens[table_name]
+            self.assertEqual(scopes[tenant], ('tenantid', None))
+            self.assertEqual(scopes[consumer], (None, 'consumerid'))
+            self.assertEqual(scopes[unscoped], (None, None))
+            self.assertEqual(scopes[expired], (None, None))
+
+    def test_downgrade_36_token_tenant_and_consumer(self):
+        self.upgrade(35)
+        self.create_token_partition('token_p1')
+        self.upgrade(36)
+        self.downgrade(35)
+        for table_name in ('token', 'token_p1'):
+            table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(),
+                                     autoload=True, autoload_with=self.engine)
+            self.assertNotIn('tenant_id', table.c)
+            self.assertNotIn('consumer_id', table.c)
+            index_names = [idx.name for idx in table.indexes]
+            self.assertNotIn('ix_%s_user_id_tenant_id' % table_name,
+                             index_names)
+            self.assertNotIn('ix_%s_user_id_consumer_id' % table_name,
+                             index_names)
+            self.assertNotIn('ix_%s_trust_id' % table_name, index_names)
+
+    def test_upgrade_37_project_endpoint_table(self):
+        self.upgrade(37)
+        self.assertTableColumns('project_endpoint',
+                                ['endpoint_id', 'project_id'])
+
+    def test_downgrade_37_project_endpoint_table(self):
+        self.upgrade(37)
+        self.downgrade(36)
+        self.assertTableDoesNotExist('project_endpoint')
+
     def populate_user_table(self, with_pass_enab=False,
                             with_pass_enab_domain=False):
         # Populate the appropriate fields in the user
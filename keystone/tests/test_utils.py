@@ -29,6 +29,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 from keystone.tests import core as test
 
 from keystone.common import utils
@@ -64,3 +66,79 @@ class UtilsTestCase(test.TestCase):
         self.assertFalse(utils.auth_str_equal('a', 'aaaaa'))
         self.assertFalse(utils.auth_str_equal('aaaaa', 'a'))
         self.assertFalse(utils.auth_str_equal('ABC123', 'abc123'))
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        cache = utils.LRUCache(2)
+        expires = time.time() + 60
+        cache.set('a', 1, expires)
+        cache.set('b', 2, expires)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3, expires)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_lru_cache_set_marks_most_recently_used(self):
+        cache = utils.LRUCache(2)
+        expires = time.time() + 60
+        cache.set('a', 1, expires)
+        cache.set('b', 2, expires)
+        cache.set('a', 10, expires)
+        cache.set('c', 3, expires)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 10)
+        cache.invalidate('c')
+        cache.set('d', 4, expires)
+        cache.set('e', 5, expires)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(len(cache), 2)
+
+    def test_lru_cache_expires(self):
+        clock = [1000.0]
+        self.stubs.Set(utils.time, 'time', lambda: clock[0])
+        cache = utils.LRUCache(10)
+        cache.set('a', 1, 1010)
+        cache.set('b', 2, 990)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        clock[0] = 1010.0
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_cache_invalidate(self):
+        cache = utils.LRUCache(10)
+        expires = time.time() + 60
+        cache.set('a', 1, expires)
+        cache.set('b', 2, expires)
+        cache.invalidate('a')
+        self.assertEqual(cache.get('a'), None)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_cache_invalidate_if(self):
+        cache = utils.LRUCache(10)
+        expires = time.time() + 60
+        for i in range(4):
+            cache.set(i, i * 10, expires)
+        cache.invalidate_if(lambda key, value: key == 1 or value == 30)
+        self.assertEqual(cache.get(0), 0)
+        self.assertEqual(cache.get(1), None)
+        self.assertEqual(cache.get(2), 20)
+        self.assertEqual(cache.get(3), None)
+
+    def test_lru_cache_hit_rate(self):
+        cache = utils.LRUCache(10)
+        self.assertEqual(cache.hit_rate, 0.0)
+        cache.set('a', 1, time.time() + 60)
+        cache.get('a')
+        cache.get('b')
+        cache.get('a')
+        cache.get('a')
+        self.assertEqual(cache.hit_rate, 0.75)
+
+    def test_lru_cache_disabled(self):
+        cache = utils.LRUCache(0)
+        cache.set('a', 1, time.time() + 60)
+        self.assertEqual(cache.get('a'), None)
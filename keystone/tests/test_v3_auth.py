@@ -17,6 +17,7 @@ import uuid
 
 from keystone import auth
 from keystone.common import cms
+from keystone.common import request_cache
 from keystone import config
 from keystone import exception
 from keystone.tests import core as test
@@ -928,6 +929,35 @@ class TestAuthJSON(test_v3.RestfulTestCase):
         r = self.post('/auth/tokens', body=auth_data)
         self.assertValidProjectScopedTokenResponse(r)
 
+    def _issue_project_scoped_token(self):
+        """Issue a token, returning the request caches that were started."""
+        caches = []
+        start = request_cache.start
+
+        def record():
+            caches.append(start())
+            return caches[-1]
+
+        request_cache.start = record
+        try:
+            auth_data = self.build_authentication_request(
+                user_id=self.user['id'],
+                password=self.user['password'],
+                project_id=self.project['id'])
+            r = self.post('/auth/tokens', body=auth_data)
+        finally:
+            request_cache.start = start
+        self.assertValidProjectScopedTokenResponse(r)
+        return caches
+
+    def test_project_scoped_token_lookups_are_cached(self):
+        cache = self._issue_project_scoped_token()[-1]
+        self.assertTrue(cache.backend_calls < cache.lookups)
+
+    def test_project_scoped_token_without_request_cache(self):
+        self.opt_in_group('identity', request_cache=False)
+        self.assertEqual(self._issue_project_scoped_token(), [])
+
     def test_default_project_id_scoped_token_with_user_id(self):
         # create a second project to work with
         ref = self.new_project_ref(domain_id=self.domain_id)
@@ -0,0 +1,124 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import uuid
+
+import webtest
+
+from keystone.tests import core
+
+import test_v3
+
+
+ENDPOINT_FILTER_PASTE_FILE = 'v3_endpoint_filter-paste.ini'
+
+
+class EndpointFilterTestCase(test_v3.RestfulTestCase):
+    def setUp(self):
+        super(EndpointFilterTestCase, self).setUp()
+        self._generate_paste_config()
+        self.admin_app = webtest.TestApp(
+            self.loadapp('v3_endpoint_filter', name='admin'))
+
+        self.service_id = uuid.uuid4().hex
+        self.service = self.new_service_ref()
+        self.service['id'] = self.service_id
+        self.catalog_api.create_service(
+            self.service_id,
+            self.service.copy())
+
+        self.endpoint_id = uuid.uuid4().hex
+        self.endpoint = self.new_endpoint_ref(service_id=self.service_id)
+        self.endpoint['id'] = self.endpoint_id
+        self.catalog_api.create_endpoint(
+            self.endpoint_id,
+            self.endpoint.copy())
+
+    def tearDown(self):
+        os.remove(ENDPOINT_FILTER_PASTE_FILE)
+        super(EndpointFilterTestCase, self).tearDown()
+
+    def _generate_paste_config(self):
+        # Generate a file, based on keystone-paste.ini,
+        # that includes endpoint_filter_extension in the pipeline
+        old_pipeline = " ec2_extension "
+        new_pipeline = " endpoint_filter_extension ec2_extension "
+
+        with open(core.etcdir('keystone-paste.ini'), 'r') as f:
+            contents = f.read()
+        new_contents = contents.replace(old_pipeline, new_pipeline)
+        with open(ENDPOINT_FILTER_PASTE_FILE, 'w') as f:
+            f.write(new_contents)
+
+    def test_add_endpoint_to_project(self):
+        """Call ``PUT /OS-EP-FILTER/projects/{project_id}/endpoints/...``."""
+        url = ('/OS-EP-FILTER/projects/%(project_id)s'
+               '/endpoints/%(endpoint_id)s' % {
+                   'project_id': self.project_id,
+                   'endpoint_id': self.endpoint_id})
+        self.head(url, expected_status=404)
+        self.put(url)
+        self.head(url)
+
+        r = self.get('/OS-EP-FILTER/projects/%(project_id)s/endpoints' % {
+            'project_id': self.project_id})
+        self.assertValidEndpointListResponse(r, ref=self.endpoint)
+        r = self.get('/OS-EP-FILTER/endpoints/%(endpoint_id)s/projects' % {
+            'endpoint_id': self.endpoint_id})
+        self.assertValidProjectListResponse(r, ref=self.project)
+
+        self.delete(url)
+        self.head(url, expected_status=404)
+
+    def test_add_endpoint_to_invalid_project(self):
+        """Call ``PUT /OS-EP-FILTER/projects/{project_id}/endpoints/...``."""
+        self.put('/OS-EP-FILTER/projects/%(project_id)s'
+                 '/endpoints/%(endpoint_id)s' % {
+                     'project_id': uuid.uuid4().hex,
+                     'endpoint_id': self.endpoint_id},
+                 expected_status=404)
+
+    def test_list_endpoints_for_invalid_project(self):
+        """Call ``GET /OS-EP-FILTER/projects/{project_id}/endpoints``."""
+        self.get('/OS-EP-FILTER/projects/%(project_id)s/endpoints' % {
+            'project_id': uuid.uuid4().hex},
+            expected_status=404)
+
+    def test_list_projects_for_endpoint_skips_deleted_projects(self):
+        """Call ``GET /OS-EP-FILTER/endpoints/{endpoint_id}/projects``."""
+        project = self.new_project_ref(domain_id=self.domain_id)
+        self.assignment_api.create_project(project['id'], project)
+        for project_id in (self.project_id, project['id']):
+            self.put('/OS-EP-FILTER/projects/%(project_id)s'
+                     '/endpoints/%(endpoint_id)s' % {
+                         'project_id': project_id,
+                         'endpoint_id': self.endpoint_id})
+        self.delete('/projects/%(project_id)s' % {
+            'project_id': project['id']})
+
+        r = self.get('/OS-EP-FILTER/endpoints/%(endpoint_id)s/projects' % {
+            'endpoint_id': self.endpoint_id})
+        self.assertValidProjectListResponse(r, ref=self.project)
+        self.assertEqual([ref['id'] for ref in r.result['projects']],
+                         [self.project_id])
+
+    def test_extension_is_not_on_the_core_api(self):
+        self.admin_app = webtest.TestApp(
+            self.loadapp('keystone', name='admin'))
+        self.get('/OS-EP-FILTER/projects/%(project_id)s/endpoints' % {
+            'project_id': self.project_id},
+            expected_status=404)
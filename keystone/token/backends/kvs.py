@@ -15,6 +15,7 @@
 # under the License.
 
 import copy
+import heapq
 
 from keystone.common import kvs
 from keystone import exception
@@ -30,14 +31,36 @@ class Token(kvs.Base, token.Driver):
 
     Deprecated in Havana and will be removed in Icehouse, as this backend
     is not production grade.
+
+    Besides the tokens themselves, the backend keeps three indexes in the
+    kvs so that it never has to scan every key: a heap of (expires, key)
+    pairs for flushing, the set of token ids of each user and the set of
+    revoked token ids. Entries in the heap are removed lazily, so an entry
+    only counts if its key still holds a token with the same expiry time.
     """
 
+    expiry_index_key = 'index-token-expires'
+    revoked_index_key = 'index-revoked-tokens'
+
     def __init__(self, *args, **kw):
         super(Token, self).__init__(*args, **kw)
         LOG.warn(_("kvs token backend is DEPRECATED. Use "
                    "keystone.token.backends.sql or "
                    "keystone.token.backend.memcache instead."))
 
+    def _index(self, key, factory):
+        # NOTE: the indexes are updated in place; DictKvs.get() and set()
+        # would copy them on every access.
+        return self.db.setdefault(key, factory())
+
+    def _user_index(self, user_id):
+        return self._index('index-user-tokens-%s' % user_id, set)
+
+    def _index_expiry(self, key, expires):
+        if expires is not None:
+            heapq.heappush(self._index(self.expiry_index_key, list),
+                           (expires, key))
+
     # Public interface
     def get_token(self, token_id):
         try:
@@ -61,6 +84,8 @@ class Token(kvs.Base, token.Driver):
         if not data_copy.get('user_id'):
             data_copy['user_id'] = data_copy['user']['id']
         self.db.set('token-%s' % token_id, data_copy)
+        self._user_index(data_copy['user_id']).add(token_id)
+        self._index_expiry('token-%s' % token_id, data_copy['expires'])
         return copy.deepcopy(data_copy)
 
     def delete_token(self, token_id):
@@ -70,6 +95,10 @@ class Token(kvs.Base, token.Driver):
             self.db.set('revoked-token-%s' % token_id, token_ref)
         except exception.NotFound:
             raise exception.TokenNotFound(token_id=token_id)
+        self._user_index(token_ref['user_id']).discard(token_id)
+        self._index(self.revoked_index_key, set).add(token_id)
+        self._index_expiry('revoked-token-%s' % token_id,
+                           token_ref['expires'])
 
     def is_not_expired(self, now, ref):
         return not ref.get('expires') and ref.get('expires') < now
@@ -124,13 +153,14 @@ class Token(kvs.Base, token.Driver):
 
         tokens = []
         now = timeutils.utcnow()
-        for token, ref in self.db.items():
-            if not token.startswith('token-') or self.is_expired(now, ref):
+        for token_id in self._user_index(user_id):
+            ref = self.db.get('token-%s' % token_id, {})
+            if not ref or self.is_expired(now, ref):
                 continue
             else:
                 if (user_matches(user_id, ref) and
                         tenant_matches(tenant_id, ref)):
-                        tokens.append(token.split('-', 1)[1])
+                        tokens.append(token_id)
         return tokens
 
     def list_tokens(self, user_id, tenant_id=None, trust_id=None,
@@ -144,17 +174,32 @@ class Token(kvs.Base, token.Driver):
 
     def list_revoked_tokens(self):
         tokens = []
-        for token, token_ref in self.db.items():
-            if not token.startswith('revoked-token-'):
-                continue
+        for token_id in self._index(self.revoked_index_key, set):
+            token_ref = self.db['revoked-token-%s' % token_id]
             record = {}
             record['id'] = token_ref['id']
             record['expires'] = token_ref['expires']
             tokens.append(record)
         return tokens
 
-    def flush_expired_tokens(self):
+    def flush_expired_tokens(self, batch_size=None):
         now = timeutils.utcnow()
-        for token, token_ref in self.db.items():
-            if self.is_expired(now, token_ref):
-                self.db.delete(token)
+        deleted = 0
+        heap = self._index(self.expiry_index_key, list)
+        while heap and heap[0][0] < now:
+            if batch_size and deleted >= batch_size:
+                break
+            expires, key = heapq.heappop(heap)
+            token_ref = self.db.get(key, {})
+            if token_ref.get('expires') != expires:
+                # the token was deleted, or created again since
+                continue
+            self.db.delete(key)
+            if key.startswith('revoked-token-'):
+                self._index(self.revoked_index_key, set).discard(
+                    token_ref['id'])
+            else:
+                self._user_index(token_ref['user_id']).discard(
+                    token_ref['id'])
+            deleted += 1
+        return deleted
@@ -15,7 +15,9 @@
 # under the License.
 
 from __future__ import absolute_import
+import collections
 import copy
+import zlib
 
 import memcache
 
@@ -33,15 +35,45 @@ CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
 
+class _CountingClient(object):
+    """Counts the calls, and so the round trips, made to a memcache client."""
+
+    def __init__(self, client, round_trips):
+        self._client = client
+        self._round_trips = round_trips
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_') or name == 'reset_cas':
+            return attr
+
+        def counted(*args, **kwargs):
+            self._round_trips[name] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
 class Token(token.Driver):
     revocation_key = 'revocation-list'
+    last_bucket_key = 'token-index-last-bucket'
 
     def __init__(self, client=None):
         self._memcache_client = client
+        self._counting_client = None
+        self._noted_bucket = None
+        self.round_trips = collections.defaultdict(int)
 
     @property
     def client(self):
-        return self._memcache_client or self._get_memcache_client()
+        client = self._memcache_client or self._get_memcache_client()
+        if (self._counting_client is None or
+                self._counting_client._client is not client):
+            self._counting_client = _CountingClient(client, self.round_trips)
+        return self._counting_client
+
+    def reset_round_trips(self):
+        """Reset the count of calls made to memcache, by operation."""
+        self.round_trips.clear()
 
     def _get_memcache_client(self):
         memcache_servers = CONF.memcache.servers.split(',')
@@ -83,110 +115,252 @@ class Token(token.Driver):
             kwargs['time'] = expires_ts
         self.client.set(ptk, data_copy, **kwargs)
         if 'id' in data['user']:
-            token_data = jsonutils.dumps(token_id)
-            user_id = data['user']['id']
-            user_key = self._prefix_user_id(user_id)
-            # Append the new token_id to the token-index-list stored in the
-            # user-key within memcache.
-            self._update_user_list_with_cas(user_key, token_data)
+            self._add_to_user_index(data['user']['id'], token_id,
+                                    data_copy['expires'])
         return copy.deepcopy(data_copy)
 
-    def _update_user_list_with_cas(self, user_key, token_id):
-        cas_retry = 0
-        max_cas_retry = CONF.memcache.max_compare_and_set_retry
-        current_time = timeutils.normalize_time(
-            timeutils.parse_isotime(timeutils.isotime()))
+    def _user_index_key(self, user_id, bucket, shard):
+        return '%s-%d-%d' % (self._prefix_user_id(user_id), bucket, shard)
+
+    def _revocation_list_key(self, bucket, shard):
+        return '%s-%d-%d' % (self.revocation_key, bucket, shard)
+
+    def _bucket(self, expires):
+        return (int(utils.unixtime(expires)) //
+                CONF.memcache.token_index_bucket_time)
+
+    def _shard(self, token_id):
+        return (zlib.crc32(token_id.encode('utf-8')) %
+                CONF.memcache.token_index_shards)
+
+    def _last_live_bucket(self):
+        """Return the bucket of tokens issued now for ``[token] expiration``.
+
+        Later tokens, such as those given an explicit expiry time, are kept in
+        the unbucketed lists, which are always read.
+
+        """
+        return self._bucket(token.default_expire_time())
+
+    def _note_bucket(self, bucket):
+        """Record that a list was written in bucket, so that it is read.
 
+        Once ``[token] expiration`` is lowered, the tokens issued earlier may
+        expire after the last bucket of tokens issued now. The highest bucket
+        ever written is kept under ``last_bucket_key``, which readers fetch
+        with the lists; it is only updated once per bucket and process.
+
+        """
+        if self._noted_bucket is not None and bucket <= self._noted_bucket:
+            return
+        expires_ts = (bucket + 1) * CONF.memcache.token_index_bucket_time
         self.client.reset_cas()
+        for cas_retry in xrange(CONF.memcache.max_compare_and_set_retry + 1):
+            recorded = self.client.gets(self.last_bucket_key)
+            if recorded is None:
+                if self.client.add(self.last_bucket_key, str(bucket),
+                                   time=expires_ts):
+                    break
+            elif int(recorded) >= bucket:
+                bucket = int(recorded)
+                break
+            elif self.client.cas(self.last_bucket_key, str(bucket),
+                                 time=expires_ts):
+                break
+        else:
+            raise exception.UnexpectedError(
+                _('Unable to record the last token index bucket.'))
+        self._noted_bucket = bucket
 
-        while cas_retry <= max_cas_retry:
-            # NOTE(morganfainberg): cas or "compare and set" is a function of
-            # memcache. It will return false if the value has changed since the
-            # last call to client.gets(). This is the memcache supported method
-            # of avoiding race conditions on set().  Memcache is already atomic
-            # on the back-end and serializes operations.
-            #
-            # cas_retry is for tracking our iterations before we give up (in
-            # case memcache is down or something horrible happens we don't
-            # iterate forever trying to compare and set the new value.
-            cas_retry += 1
-            record = self.client.gets(user_key)
-            filtered_list = []
-
-            if record is not None:
-                token_list = jsonutils.loads('[%s]' % record)
-                for token_i in token_list:
-                    ptk = self._prefix_token_id(token_i)
-                    token_ref = self.client.get(ptk)
-                    if not token_ref:
-                        # skip tokens that do not exist in memcache
-                        continue
+    def _append_to_bucket(self, key, data_json, bucket, msg):
+        """Append to a list kept until the end of its expiry bucket."""
+        self._note_bucket(bucket)
+        expires_ts = (bucket + 1) * CONF.memcache.token_index_bucket_time
+        self._append_to_list(key, data_json, expires_ts, msg)
 
-                    if 'expires' in token_ref:
-                        expires_at = timeutils.normalize_time(
-                            token_ref['expires'])
-                        if expires_at < current_time:
-                            # skip tokens that are expired.
-                            continue
+    def _append_to_list(self, key, data_json, expires_ts, msg):
+        """Append to a list, created to expire at expires_ts if missing.
+
+        A list that grew past the memcached item size limit is continued in
+        rollover keys, ``<key>-1``, ``<key>-2`` and so on, whose number is
+        counted in ``<key>-rollover``.
+
+        """
+        if self.client.append(key, ',%s' % data_json):
+            return
+        if self.client.add(key, data_json, time=expires_ts):
+            return
+        if self.client.append(key, ',%s' % data_json):
+            return
+
+        # NOTE: the key exists but could not be appended to, so it is full.
+        rollover_key = '%s-rollover' % key
+        count = self.client.get(rollover_key)
+        if count is None:
+            self.client.add(rollover_key, '0', time=expires_ts)
+        elif int(count) and self.client.append('%s-%d' % (key, int(count)),
+                                               ',%s' % data_json):
+            return
+        count = self.client.incr(rollover_key)
+        if count is None or not self.client.add('%s-%d' % (key, count),
+                                                data_json, time=expires_ts):
+            raise exception.UnexpectedError(msg)
+
+    def _get_bucketed_list(self, prefix):
+        """Return the records of the list kept under prefix.
+
+        The unbucketed list under ``prefix`` itself and the buckets from now
+        until the last bucket of tokens issued now are read with a single
+        get_multi, with ``last_bucket_key``. Only if a later bucket was
+        written, or some lists were rolled over, are more keys read.
+
+        """
+        first = self._bucket(timeutils.utcnow())
+        last = self._last_live_bucket()
+        keys = [prefix] + self._bucket_keys(prefix, xrange(first, last + 1))
+        values = self.client.get_multi(keys + self._rollover_keys(keys) +
+                                       [self.last_bucket_key])
+
+        noted = int(values.get(self.last_bucket_key, last))
+        if noted > last:
+            later_keys = self._bucket_keys(
+                prefix, xrange(max(first, last + 1), noted + 1))
+            values.update(self.client.get_multi(
+                later_keys + self._rollover_keys(later_keys)))
+            keys += later_keys
+
+        all_keys = []
+        for key in keys:
+            all_keys.append(key)
+            count = int(values.get('%s-rollover' % key, 0))
+            all_keys.extend('%s-%d' % (key, x) for x in xrange(1, count + 1))
+        if len(all_keys) > len(keys):
+            values.update(self.client.get_multi(
+                [key for key in all_keys if key not in values]))
+
+        records = []
+        for key in all_keys:
+            if values.get(key):
+                records.extend(jsonutils.loads('[%s]' % values[key]))
+        return records
+
+    def _bucket_keys(self, prefix, buckets):
+        return ['%s-%d-%d' % (prefix, bucket, shard)
+                for bucket in buckets
+                for shard in xrange(CONF.memcache.token_index_shards)]
 
-                    # Add the still valid token_id to the list.
-                    filtered_list.append(jsonutils.dumps(token_i))
-            # Add the new token_id to the list.
-            filtered_list.append(token_id)
-
-            # Use compare-and-set (cas) to set the new value for the
-            # token-index-list for the user-key. Cas is used to prevent race
-            # conditions from causing the loss of valid token ids from this
-            # list.
-            if self.client.cas(user_key, ','.join(filtered_list)):
-                msg = _('Successful set of token-index-list for user-key '
-                        '"%(user_key)s", #%(count)d records')
-                LOG.debug(msg, {'user_key': user_key,
-                                'count': len(filtered_list)})
-                return filtered_list
-
-            # The cas function will return true if it succeeded or false if it
-            # failed for any reason, including memcache server being down, cas
-            # id changed since gets() called (the data changed between when
-            # this loop started and this point, etc.
-            error_msg = _('Failed to set token-index-list for user-key '
-                          '"%(user_key)s". Attempt %(cas_retry)d of '
-                          '%(cas_retry_max)d')
-            LOG.debug(error_msg,
-                      {'user_key': user_key,
-                       'cas_retry': cas_retry,
-                       'cas_retry_max': max_cas_retry})
-
-        # Exceeded the maximum retry attempts.
-        error_msg = _('Unable to add token user list')
-        raise exception.UnexpectedError(error_msg)
-
-    def _add_to_revocation_list(self, data):
-        data_json = jsonutils.dumps(data)
-        if not self.client.append(self.revocation_key, ',%s' % data_json):
-            if not self.client.add(self.revocation_key, data_json):
-                if not self.client.append(self.revocation_key,
-                                          ',%s' % data_json):
-                    msg = _('Unable to add token to revocation list.')
-                    raise exception.UnexpectedError(msg)
+    def _rollover_keys(self, keys):
+        return ['%s-rollover' % key for key in keys]
+
+    def _add_to_user_index(self, user_id, token_id, expires):
+        """Record a token in the index of the user's tokens.
+
+        The index is split into buckets by token expiry time, each stored
+        with the expiry time of its last token so that memcache discards it
+        once all of its tokens have expired, and every bucket is spread over
+        ``[memcache] token_index_shards`` keys. Adding a token is a single
+        append, however many tokens the user already has.
+
+        """
+        bucket = self._bucket(expires)
+        msg = _('Unable to add token to user token index.')
+        if bucket > self._last_live_bucket():
+            # NOTE: tokens indexed before the index was bucketed, and those
+            # expiring later than tokens issued now, are kept in a single
+            # list under the user key itself, which never expires.
+            self._append_to_list(self._prefix_user_id(user_id),
+                                 jsonutils.dumps(token_id), 0, msg)
+            return
+        key = self._user_index_key(user_id, bucket, self._shard(token_id))
+        self._append_to_bucket(key, jsonutils.dumps(token_id), bucket, msg)
+
+    def _list_user_token_refs(self, user_id):
+        """Return (token_id, token_ref) of the live tokens of a user."""
+        token_ids = self._get_bucketed_list(self._prefix_user_id(user_id))
+
+        ptks = [self._prefix_token_id(token_id) for token_id in token_ids]
+        token_refs = self.client.get_multi(ptks)
+        live_tokens = []
+        for token_id, ptk in zip(token_ids, ptks):
+            # pop, so that a token indexed twice is only listed once
+            token_ref = token_refs.pop(ptk, None)
+            if token_ref:
+                live_tokens.append((token_id, token_ref))
+        return live_tokens
+
+    def _add_to_revocation_list(self, token_refs):
+        """Record revoked tokens in the revocation list.
+
+        Like the user token index, the list is split into buckets by token
+        expiry time that memcache discards once all of their tokens have
+        expired, and each bucket is spread over ``[memcache]
+        token_index_shards`` keys. Only the id and expiry time of each token
+        are kept, and the tokens revoked together in one bucket are added
+        with a single append.
+
+        """
+        buckets = {}
+        legacy = []
+        last = self._last_live_bucket()
+        for token_ref in token_refs:
+            record = {'id': token_ref['id'], 'expires': token_ref['expires']}
+            if (token_ref['expires'] is None or
+                    self._bucket(token_ref['expires']) > last):
+                legacy.append(record)
+            else:
+                bucket = self._bucket(token_ref['expires'])
+                buckets.setdefault(bucket, []).append(record)
+
+        msg = _('Unable to add token to revocation list.')
+        for bucket, records in sorted(buckets.items()):
+            key = self._revocation_list_key(bucket,
+                                            self._shard(records[0]['id']))
+            data_json = ','.join(jsonutils.dumps(r) for r in records)
+            self._append_to_bucket(key, data_json, bucket, msg)
+        if legacy:
+            # NOTE: tokens that never expire, or expire later than tokens
+            # issued now, are kept in the single list used before the list
+            # was bucketed, which flush_expired_tokens prunes.
+            data_json = ','.join(jsonutils.dumps(r) for r in legacy)
+            self._append_to_list(self.revocation_key, data_json, 0, msg)
 
     def delete_token(self, token_id):
         # Test for existence
         data = self.get_token(token_id)
         ptk = self._prefix_token_id(token_id)
         result = self.client.delete(ptk)
-        self._add_to_revocation_list(data)
+        self._add_to_revocation_list([data])
         return result
 
+    def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
+                      consumer_id=None):
+        """Deletes tokens by user, in a fixed number of round trips.
+
+        The tokens are read with the user index, deleted with a single
+        delete_multi and added to the revocation list in a single append.
+
+        """
+        token_refs = self._filter_user_token_refs(
+            user_id, tenant_id=tenant_id, trust_id=trust_id,
+            consumer_id=consumer_id)
+        if not token_refs:
+            return
+        self.client.delete_multi([self._prefix_token_id(token_id)
+                                  for token_id, token_ref in token_refs])
+        self._add_to_revocation_list([token_ref
+                                      for token_id, token_ref in token_refs])
+
     def list_tokens(self, user_id, tenant_id=None, trust_id=None,
                     consumer_id=None):
+        token_refs = self._filter_user_token_refs(
+            user_id, tenant_id=tenant_id, trust_id=trust_id,
+            consumer_id=consumer_id)
+        return [token_id for token_id, token_ref in token_refs]
+
+    def _filter_user_token_refs(self, user_id, tenant_id=None, trust_id=None,
+                                consumer_id=None):
         tokens = []
-        user_key = self._prefix_user_id(user_id)
-        user_record = self.client.get(user_key) or ""
-        token_list = jsonutils.loads('[%s]' % user_record)
-        for token_id in token_list:
-            ptk = self._prefix_token_id(token_id)
-            token_ref = self.client.get(ptk)
+        for token_id, token_ref in self._list_user_token_refs(user_id):
             if token_ref:
                 if tenant_id is not None:
                     tenant = token_ref.get('tenant')
@@ -208,11 +382,57 @@ class Token(token.Driver):
                     except KeyError:
                         continue
 
-                tokens.append(token_id)
+                tokens.append((token_id, token_ref))
         return tokens
 
     def list_revoked_tokens(self):
-        list_json = self.client.get(self.revocation_key)
-        if list_json:
-            return jsonutils.loads('[%s]' % list_json)
-        return []
+        """Return the revoked tokens that have not expired yet.
+
+        Only the buckets of the revocation list which may hold unexpired
+        tokens are read, with a single get_multi.
+
+        """
+        now = timeutils.utcnow()
+        tokens = []
+        for data in self._get_bucketed_list(self.revocation_key):
+            expires = data.get('expires')
+            if (expires and timeutils.normalize_time(
+                    timeutils.parse_isotime(expires)) < now):
+                continue
+            tokens.append(data)
+        return tokens
+
+    def flush_expired_tokens(self, batch_size=None):
+        """Prune expired entries from the unbucketed revocation list.
+
+        Memcache discards expired tokens, user token indexes and revocation
+        list buckets by itself; only the revocation list written before the
+        list was bucketed, which never expires, needs to be pruned.
+
+        """
+        max_cas_retry = CONF.memcache.max_compare_and_set_retry
+        now = timeutils.utcnow()
+
+        self.client.reset_cas()
+
+        for cas_retry in xrange(max_cas_retry + 1):
+            list_json = self.client.gets(self.revocation_key)
+            if not list_json:
+                return 0
+            kept = []
+            deleted = 0
+            for data in jsonutils.loads('[%s]' % list_json):
+                expires = data.get('expires')
+                if (expires and (not batch_size or deleted < batch_size) and
+                        timeutils.normalize_time(
+                            timeutils.parse_isotime(expires)) < now):
+                    deleted += 1
+                    continue
+                kept.append(jsonutils.dumps(data))
+            if not deleted:
+                return 0
+            if self.client.cas(self.revocation_key, ','.join(kept)):
+                return deleted
+
+        msg = _('Unable to prune the token revocation list')
+        raise exception.UnexpectedError(msg)
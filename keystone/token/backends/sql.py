@@ -18,13 +18,21 @@ import copy
 import datetime
 
 from keystone.common import sql
+from keystone.common import utils
+from keystone import config
 from keystone import exception
+from keystone.openstack.common import log as logging
 from keystone.openstack.common import timeutils
 from keystone import token
 
 
-class TokenModel(sql.ModelBase, sql.DictBase):
-    __tablename__ = 'token'
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+
+class TokenColumns(sql.DictBase):
+    """Columns shared by the token table and its expiry partitions."""
+
     attributes = ['id', 'expires', 'user_id', 'trust_id']
     id = sql.Column(sql.String(64), primary_key=True)
     expires = sql.Column(sql.DateTime(), default=None)
@@ -32,19 +40,81 @@ class TokenModel(sql.ModelBase, sql.DictBase):
     valid = sql.Column(sql.Boolean(), default=True, nullable=False)
     user_id = sql.Column(sql.String(64))
     trust_id = sql.Column(sql.String(64))
+    # NOTE: the scope and OAuth consumer of a token are copies of values in
+    # extra, kept in columns so that tokens can be listed and revoked by
+    # them without decoding every token of a user.
+    tenant_id = sql.Column(sql.String(64))
+    consumer_id = sql.Column(sql.String(64))
+
+
+class TokenModel(sql.ModelBase, TokenColumns):
+    __tablename__ = 'token'
     __table_args__ = (
         sql.Index('ix_token_expires', 'expires'),
-        sql.Index('ix_token_valid', 'valid')
+        sql.Index('ix_token_valid', 'valid'),
+        sql.Index('ix_token_valid_expires', 'valid', 'expires'),
+        sql.Index('ix_token_user_id_tenant_id', 'user_id', 'tenant_id'),
+        sql.Index('ix_token_user_id_consumer_id', 'user_id', 'consumer_id'),
+        sql.Index('ix_token_trust_id', 'trust_id')
     )
 
 
+class TokenPartitionModel(sql.ModelBase):
+    __tablename__ = 'token_partition'
+    name = sql.Column(sql.String(64), primary_key=True)
+    expires_from = sql.Column(sql.DateTime(), nullable=False)
+    expires_before = sql.Column(sql.DateTime(), nullable=False)
+
+
+_PARTITION_MODELS = {}
+
+
+def partition_model(name):
+    """Return the model mapped to the token partition table ``name``."""
+    model = _PARTITION_MODELS.get(name)
+    if model is None:
+        model = type(str(name), (sql.ModelBase, TokenColumns), {
+            '__tablename__': name,
+            '__table_args__': (
+                sql.Index('ix_%s_expires' % name, 'expires'),
+                sql.Index('ix_%s_valid_expires' % name, 'valid', 'expires'),
+                sql.Index('ix_%s_user_id_tenant_id' % name,
+                          'user_id', 'tenant_id'),
+                sql.Index('ix_%s_user_id_consumer_id' % name,
+                          'user_id', 'consumer_id'),
+                sql.Index('ix_%s_trust_id' % name, 'trust_id'),
+            )})
+        _PARTITION_MODELS[name] = model
+    return model
+
+
+def forget_partition_model(name):
+    model = _PARTITION_MODELS.pop(name, None)
+    if model is not None:
+        sql.ModelBase.metadata.remove(model.__table__)
+
+
 class Token(sql.Base, token.Driver):
+    def _token_models(self):
+        """Return the models of every table that may hold live tokens."""
+        return [TokenModel]
+
+    def _model_for_expires(self, expires):
+        """Return the model of the table a new token should be written to."""
+        return TokenModel
+
+    def _get_token_ref(self, session, token_id):
+        for model in self._token_models():
+            token_ref = session.query(model).get(token_id)
+            if token_ref is not None:
+                return token_ref
+
     # Public interface
     def get_token(self, token_id):
         if token_id is None:
             raise exception.TokenNotFound(token_id=token_id)
         session = self.get_session()
-        token_ref = session.query(TokenModel).get(token_id)
+        token_ref = self._get_token_ref(session, token_id)
         now = datetime.datetime.utcnow()
         if not token_ref or not token_ref.valid:
             raise exception.TokenNotFound(token_id=token_id)
@@ -61,8 +131,11 @@ class Token(sql.Base, token.Driver):
         if not data_copy.get('user_id'):
             data_copy['user_id'] = data_copy['user']['id']
 
-        token_ref = TokenModel.from_dict(data_copy)
+        model = self._model_for_expires(data_copy['expires'])
+        token_ref = model.from_dict(data_copy)
         token_ref.valid = True
+        token_ref.tenant_id = self._tenant_id(data_copy)
+        token_ref.consumer_id = self._consumer_id(data_copy)
         session = self.get_session()
         with session.begin():
             session.add(token_ref)
@@ -72,7 +145,7 @@ class Token(sql.Base, token.Driver):
     def delete_token(self, token_id):
         session = self.get_session()
         with session.begin():
-            token_ref = session.query(TokenModel).get(token_id)
+            token_ref = self._get_token_ref(session, token_id)
             if not token_ref or not token_ref.valid:
                 raise exception.TokenNotFound(token_id=token_id)
             token_ref.valid = False
@@ -91,85 +164,52 @@ class Token(sql.Base, token.Driver):
         session = self.get_session()
         with session.begin():
             now = timeutils.utcnow()
-            query = session.query(TokenModel)
-            query = query.filter_by(valid=True)
-            query = query.filter(TokenModel.expires > now)
-            if trust_id:
-                query = query.filter(TokenModel.trust_id == trust_id)
-            else:
-                query = query.filter(TokenModel.user_id == user_id)
-
-            for token_ref in query.all():
+            for model in self._token_models():
+                query = session.query(model)
+                query = query.filter_by(valid=True)
+                query = query.filter(model.expires > now)
+                if trust_id:
+                    query = query.filter(model.trust_id == trust_id)
+                else:
+                    query = query.filter(model.user_id == user_id)
                 if tenant_id:
-                    token_ref_dict = token_ref.to_dict()
-                    if not self._tenant_matches(tenant_id, token_ref_dict):
-                        continue
+                    query = query.filter(model.tenant_id == tenant_id)
                 if consumer_id:
-                    token_ref_dict = token_ref.to_dict()
-                    if not self._consumer_matches(consumer_id, token_ref_dict):
-                        continue
-
-                token_ref.valid = False
-
-            session.flush()
+                    query = query.filter(model.consumer_id == consumer_id)
+                query.update({'valid': False}, synchronize_session=False)
 
-    def _tenant_matches(self, tenant_id, token_ref_dict):
-        return ((tenant_id is None) or
-                (token_ref_dict.get('tenant') and
-                 token_ref_dict['tenant'].get('id') == tenant_id))
+    @staticmethod
+    def _tenant_id(token_ref_dict):
+        tenant = token_ref_dict.get('tenant')
+        return tenant and tenant.get('id')
 
-    def _consumer_matches(self, consumer_id, token_ref_dict):
-        if consumer_id is None:
-            return True
-        else:
-            oauth = token_ref_dict['token_data']['token'].get('OS-OAUTH1', {})
-            return oauth and oauth['consumer_id'] == consumer_id
+    @staticmethod
+    def _consumer_id(token_ref_dict):
+        token_data = token_ref_dict.get('token_data') or {}
+        oauth = token_data.get('token', {}).get('OS-OAUTH1')
+        return oauth and oauth.get('consumer_id')
 
-    def _list_tokens_for_trust(self, trust_id):
+    def _list_token_ids(self, **filters):
         session = self.get_session()
         tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires > now)
-        query = query.filter(TokenModel.trust_id == trust_id)
-
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            tokens.append(token_ref_dict['id'])
+        for model in self._token_models():
+            query = session.query(model.id)
+            query = query.filter(model.expires > now)
+            query = query.filter_by(valid=True, **filters)
+            tokens.extend(token_id for (token_id,) in query)
         return tokens
 
+    def _list_tokens_for_trust(self, trust_id):
+        return self._list_token_ids(trust_id=trust_id)
+
     def _list_tokens_for_user(self, user_id, tenant_id=None):
-        session = self.get_session()
-        tokens = []
-        now = timeutils.utcnow()
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires > now)
-        query = query.filter(TokenModel.user_id == user_id)
-
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            if self._tenant_matches(tenant_id, token_ref_dict):
-                tokens.append(token_ref['id'])
-        return tokens
+        if tenant_id is None:
+            return self._list_token_ids(user_id=user_id)
+        return self._list_token_ids(user_id=user_id, tenant_id=tenant_id)
 
     def _list_tokens_for_consumer(self, user_id, consumer_id):
-        tokens = []
-        session = self.get_session()
-        with session.begin():
-            now = timeutils.utcnow()
-            query = session.query(TokenModel)
-            query = query.filter(TokenModel.expires > now)
-            query = query.filter(TokenModel.user_id == user_id)
-            token_references = query.filter_by(valid=True)
-
-            for token_ref in token_references:
-                token_ref_dict = token_ref.to_dict()
-                if self._consumer_matches(consumer_id, token_ref_dict):
-                    tokens.append(token_ref_dict['id'])
-            session.flush()
-        return tokens
+        return self._list_token_ids(user_id=user_id, consumer_id=consumer_id)
 
     def list_tokens(self, user_id, tenant_id=None, trust_id=None,
                     consumer_id=None):
@@ -181,25 +221,167 @@ class Token(sql.Base, token.Driver):
             return self._list_tokens_for_user(user_id, tenant_id)
 
     def list_revoked_tokens(self):
+        # NOTE: only select the columns needed for the revocation list, so
+        # that the (valid, expires) index covers the query and the extra
+        # blobs of revoked tokens are never loaded or decoded.
         session = self.get_session()
         tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires > now)
-        token_references = query.filter_by(valid=False)
-        for token_ref in token_references:
-            record = {
-                'id': token_ref['id'],
-                'expires': token_ref['expires'],
-            }
-            tokens.append(record)
+        for model in self._token_models():
+            query = session.query(model.id, model.expires)
+            query = query.filter_by(valid=False)
+            query = query.filter(model.expires > now)
+            for token_id, expires in query:
+                record = {
+                    'id': token_id,
+                    'expires': expires,
+                }
+                tokens.append(record)
         return tokens
 
-    def flush_expired_tokens(self):
+    def flush_expired_tokens(self, batch_size=None):
         session = self.get_session()
+        now = timeutils.utcnow()
 
         query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires < timeutils.utcnow())
-        query.delete(synchronize_session=False)
+        query = query.filter(TokenModel.expires < now)
+        if batch_size:
+            # NOTE: DELETE ... LIMIT is not portable, so select a bounded
+            # set of ids through the expires index and delete those rows.
+            id_query = session.query(TokenModel.id)
+            id_query = id_query.filter(TokenModel.expires < now)
+            token_ids = [token_id for (token_id,)
+                         in id_query.limit(batch_size)]
+            if not token_ids:
+                return 0
+            query = query.filter(TokenModel.id.in_(token_ids))
+        deleted = query.delete(synchronize_session=False)
 
         session.flush()
+        return deleted
+
+
+class PartitionedToken(Token):
+    """SQL token backend that buckets tokens into tables by expiry time.
+
+    Each token is written to a table covering ``[token] partition_window``
+    seconds of expiry times, recorded in the ``token_partition`` table.
+    Expired tokens are then removed by dropping whole tables instead of
+    deleting rows. Tokens written before this driver was enabled stay in
+    the ``token`` table, which is still read and flushed as usual.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PartitionedToken, self).__init__(*args, **kwargs)
+        self._partitions = None
+
+    def _load_partitions(self):
+        """Read the set of partitions from the ``token_partition`` table."""
+        session = self.get_session()
+        partitions = {}
+        for ref in session.query(TokenPartitionModel):
+            partitions[ref.name] = ref.expires_before
+        for name in set(self._partitions or []) - set(partitions):
+            forget_partition_model(name)
+        self._partitions = partitions
+        return partitions
+
+    def _live_partitions(self, reload=False):
+        if reload or self._partitions is None:
+            self._load_partitions()
+        now = timeutils.utcnow()
+        return [name for name, expires_before in self._partitions.items()
+                if expires_before > now]
+
+    def _token_models(self):
+        # NOTE: partitions created by other processes must be seen before
+        # listing or revoking tokens, so the registry is always re-read here.
+        return [TokenModel] + [partition_model(name) for name
+                               in self._live_partitions(reload=True)]
+
+    def _model_for_expires(self, expires):
+        window = CONF.token.partition_window
+        start = utils.unixtime(expires) // window * window
+        name = 'token_%d_%d' % (start, window)
+        if self._partitions is None or name not in self._partitions:
+            if name not in self._load_partitions():
+                expires_from = datetime.datetime.utcfromtimestamp(start)
+                self._create_partition(
+                    name, expires_from,
+                    expires_from + datetime.timedelta(seconds=window))
+        return partition_model(name)
+
+    def _create_partition(self, name, expires_from, expires_before):
+        session = self.get_session()
+        table = partition_model(name).__table__
+        try:
+            table.create(session.bind, checkfirst=True)
+        except (sql.OperationalError, sql.ProgrammingError):
+            # another process created the table first
+            if not table.exists(session.bind):
+                raise
+        try:
+            with session.begin():
+                session.add(TokenPartitionModel(
+                    name=name,
+                    expires_from=expires_from,
+                    expires_before=expires_before))
+        except sql.IntegrityError:
+            pass
+        LOG.debug(_('Created token partition %s'), name)
+        self._partitions[name] = expires_before
+
+    def get_token(self, token_id):
+        if token_id is None:
+            raise exception.TokenNotFound(token_id=token_id)
+        try:
+            return self._get_partitioned_token(token_id,
+                                               self._live_partitions())
+        except exception.TokenNotFound:
+            # the token may be in a partition created by another process
+            known = set(self._partitions)
+            partitions = self._live_partitions(reload=True)
+            if known.issuperset(partitions):
+                raise
+            return self._get_partitioned_token(token_id, partitions)
+
+    def _get_partitioned_token(self, token_id, partitions):
+        # NOTE: look the id up in every live partition with a single
+        # UNION ALL of primary key lookups, rather than one query each.
+        selects = []
+        for model in [TokenModel] + map(partition_model, partitions):
+            selects.append(sql.select([model.__table__]).where(
+                model.id == token_id))
+        session = self.get_session()
+        row = session.execute(sql.union_all(*selects)).first()
+        now = timeutils.utcnow()
+        if (not row or not row['valid'] or not row['expires'] or
+                now >= row['expires']):
+            raise exception.TokenNotFound(token_id=token_id)
+        return TokenModel(**dict(row)).to_dict()
+
+    def flush_expired_tokens(self, batch_size=None):
+        # NOTE: a partition is only dropped one window after its last token
+        # expired, so that processes with a slightly slow clock never read
+        # from a table that no longer exists.
+        session = self.get_session()
+        cutoff = timeutils.utcnow() - datetime.timedelta(
+            seconds=CONF.token.partition_window)
+        deleted = 0
+        for name, expires_before in sorted(self._load_partitions().items()):
+            if expires_before > cutoff:
+                continue
+            model = partition_model(name)
+            if model.__table__.exists(session.bind):
+                deleted += session.query(model).count()
+                model.__table__.drop(session.bind)
+            with session.begin():
+                query = session.query(TokenPartitionModel)
+                query.filter_by(name=name).delete(synchronize_session=False)
+            del self._partitions[name]
+            forget_partition_model(name)
+            LOG.debug(_('Dropped expired token partition %s'), name)
+
+        return deleted + super(PartitionedToken, self).flush_expired_tokens(
+            batch_size=batch_size)
@@ -1,6 +1,3 @@
-import json
-
-from keystone.common import cms
 from keystone.common import controller
 from keystone.common import dependency
 from keystone.common import wsgi
@@ -422,19 +419,16 @@ class Auth(controller.V2Controller):
 
     @controller.protected
     def revocation_list(self, context, auth=None):
-        tokens = self.token_api.list_revoked_tokens()
-
-        for t in tokens:
-            expires = t['expires']
-            if not (expires and isinstance(expires, unicode)):
-                    t['expires'] = timeutils.isotime(expires)
-        data = {'revoked': tokens}
-        json_data = json.dumps(data)
-        signed_text = cms.cms_sign_text(json_data,
-                                        CONF.signing.certfile,
-                                        CONF.signing.keyfile)
-
-        return {'signed': signed_text}
+        etag, signed_text = self.token_api.get_signed_revocation_list()
+        headers = [('ETag', etag)]
+
+        if_none_match = context['headers'].get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return wsgi.render_response(status=(304, 'Not Modified'),
+                                        headers=headers)
+
+        return wsgi.render_response(body={'signed': signed_text},
+                                    headers=headers)
 
     def endpoints(self, context, token_id):
         """Return a list of endpoints available to the token."""
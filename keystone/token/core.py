@@ -18,6 +18,9 @@
 
 import copy
 import datetime
+import hashlib
+import json
+import time
 
 from keystone.common import cms
 from keystone.common import dependency
@@ -32,6 +35,15 @@ CONF = config.CONF
 
 LOG = logging.getLogger(__name__)
 
+# Version of the format in which token references are persisted. Version 1
+# stored everything the provider passed in. Version 2 leaves out the service
+# catalog, which is rebuilt when the token is validated, and the ``key``
+# attribute, which duplicates the (possibly several KB long) token id.
+PERSISTENCE_VERSION = 2
+
+# Invalidation topic published whenever tokens may have been revoked.
+REVOCATION_TOPIC = 'token-revocation'
+
 
 def default_expire_time():
     """Determine when a fresh token should expire.
@@ -45,6 +57,30 @@ def default_expire_time():
     return timeutils.utcnow() + expire_delta
 
 
+def compact_token_ref(token_ref):
+    """Leave out of a token reference what can be rebuilt when it is read.
+
+    The reference is modified in place; ``catalog_omitted`` records whether
+    a service catalog was removed from its ``token_data``.
+
+    """
+    token_data = token_ref.get('token_data')
+    if not token_data and 'key' not in token_ref:
+        return token_ref
+
+    token_ref.pop('key', None)
+    catalog_omitted = False
+    if token_data:
+        for body, catalog_key in ((token_data.get('access'), 'serviceCatalog'),
+                                  (token_data.get('token'), 'catalog')):
+            if body and catalog_key in body:
+                del body[catalog_key]
+                catalog_omitted = True
+    token_ref['catalog_omitted'] = catalog_omitted
+    token_ref['persistence_version'] = PERSISTENCE_VERSION
+    return token_ref
+
+
 def validate_auth_info(self, user_ref, tenant_ref):
     """Validate user and tenant auth info.
 
@@ -91,6 +127,7 @@ def validate_auth_info(self, user_ref, tenant_ref):
 
 
 @dependency.provider('token_api')
+@dependency.requires('invalidation_api')
 class Manager(manager.Manager):
     """Default pivot point for the Token backend.
 
@@ -101,6 +138,7 @@ class Manager(manager.Manager):
 
     def __init__(self):
         super(Manager, self).__init__(CONF.token.driver)
+        self._signed_revocation_list = None
 
     def _unique_id(self, token_id):
         """Return a unique ID for a token.
@@ -118,12 +156,140 @@ class Manager(manager.Manager):
         return self.driver.get_token(self._unique_id(token_id))
 
     def create_token(self, token_id, data):
-        data_copy = copy.deepcopy(data)
+        data_copy = compact_token_ref(copy.deepcopy(data))
         data_copy['id'] = self._unique_id(token_id)
         return self.driver.create_token(self._unique_id(token_id), data_copy)
 
     def delete_token(self, token_id):
-        return self.driver.delete_token(self._unique_id(token_id))
+        result = self.driver.delete_token(self._unique_id(token_id))
+        self.invalidate_revocation_list()
+        return result
+
+    def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
+                      consumer_id=None):
+        result = self.driver.delete_tokens(user_id, tenant_id=tenant_id,
+                                           trust_id=trust_id,
+                                           consumer_id=consumer_id)
+        self.invalidate_revocation_list()
+        return result
+
+    @property
+    def revocation_generation(self):
+        """A number that changes whenever tokens may have been revoked, by
+        this or another Keystone process.
+
+        """
+        return self.invalidation_api.generation(REVOCATION_TOPIC)
+
+    def invalidate_revocation_list(self):
+        """Note that the set of revoked tokens may have changed."""
+        self.invalidation_api.publish(REVOCATION_TOPIC)
+
+    def get_signed_revocation_list(self):
+        """Return the ETag and the signed revocation list.
+
+        The signed document is reused until the revocation generation
+        changes, one of the listed tokens expires, or ``[token]
+        revocation_cache_time`` seconds pass. Even when the list has to be
+        read again, it is only re-signed if its contents changed.
+
+        :returns: (etag, signed_text)
+
+        """
+        now = timeutils.utcnow()
+        cached = self._signed_revocation_list
+        if (cached is not None and
+                cached['generation'] == self.revocation_generation and
+                now < cached['valid_until']):
+            return cached['etag'], cached['signed']
+
+        generation = self.revocation_generation
+        valid_until = now + datetime.timedelta(
+            seconds=CONF.token.revocation_cache_time)
+        tokens = self.driver.list_revoked_tokens()
+        for t in tokens:
+            expires = t['expires']
+            if isinstance(expires, basestring):
+                expires = timeutils.normalize_time(
+                    timeutils.parse_isotime(expires))
+            else:
+                t['expires'] = timeutils.isotime(expires)
+            valid_until = min(valid_until, expires)
+
+        json_data = json.dumps({'revoked': tokens})
+        etag = '"%s"' % hashlib.sha1(json_data).hexdigest()
+        if cached is not None and cached['etag'] == etag:
+            signed_text = cached['signed']
+        else:
+            signer = cms.get_signer(CONF.signing.engine,
+                                    CONF.signing.certfile,
+                                    CONF.signing.keyfile)
+            signed_text = signer.sign_text(json_data)
+
+        self._signed_revocation_list = {'generation': generation,
+                                        'valid_until': valid_until,
+                                        'etag': etag,
+                                        'signed': signed_text}
+        return etag, signed_text
+
+    def flush_expired_tokens(self, batch_size=None, batch_sleep=None,
+                             max_runtime=None, progress=None):
+        """Remove expired tokens from the backend.
+
+        With a ``batch_size`` of 0 the driver removes every expired token in
+        one go. Otherwise tokens are removed ``batch_size`` at a time,
+        sleeping ``batch_sleep`` seconds between batches, until none are
+        left or ``max_runtime`` seconds have passed. Arguments that are not
+        given default to the ``[token] flush_*`` options.
+
+        :param progress: optional callable, invoked after each batch with a
+                         dict of ``batch``, ``deleted``, ``total`` and
+                         ``elapsed``
+        :returns: the number of tokens removed
+
+        """
+        if batch_size is None:
+            batch_size = CONF.token.flush_batch_size
+        if batch_sleep is None:
+            batch_sleep = CONF.token.flush_batch_sleep
+        if max_runtime is None:
+            max_runtime = CONF.token.flush_max_runtime
+
+        if not batch_size:
+            total = self.driver.flush_expired_tokens() or 0
+        else:
+            total = 0
+            batch = 0
+            start = time.time()
+            while True:
+                batch_start = time.time()
+                deleted = self.driver.flush_expired_tokens(
+                    batch_size=batch_size)
+                batch += 1
+                total += deleted
+                stats = {'batch': batch,
+                         'deleted': deleted,
+                         'total': total,
+                         'elapsed': time.time() - batch_start}
+                LOG.debug(_('Token flush batch %(batch)d removed %(deleted)d '
+                            'tokens in %(elapsed).3fs (%(total)d so far)'),
+                          stats)
+                if progress is not None:
+                    progress(stats)
+                if deleted < batch_size:
+                    break
+                if max_runtime and time.time() - start >= max_runtime:
+                    LOG.warning(_('Token flush stopped after %(max_runtime)ds '
+                                  'with %(total)d tokens removed; the rest '
+                                  'are left for the next run.'),
+                                {'max_runtime': max_runtime, 'total': total})
+                    break
+                if batch_sleep:
+                    time.sleep(batch_sleep)
+
+        if total:
+            self.invalidate_revocation_list()
+        return total
 
 
 class Driver(object):
@@ -239,7 +405,12 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def flush_expired_tokens(self):
+    def flush_expired_tokens(self, batch_size=None):
         """Archive or delete tokens that have expired.
+
+        :param batch_size: if given, remove at most this many tokens
+        :type batch_size: int
+        :returns: the number of tokens removed
+
         """
         raise exception.NotImplemented()
@@ -36,9 +36,11 @@ class Provider(uuid.Provider):
         try:
             token_id = cms.cms_sign_token(json.dumps(token_data),
                                           CONF.signing.certfile,
-                                          CONF.signing.keyfile)
+                                          CONF.signing.keyfile,
+                                          engine=CONF.signing.engine)
             return token_id
-        except environment.subprocess.CalledProcessError:
+        except (environment.subprocess.CalledProcessError,
+                cms.SigningError):
             LOG.exception('Unable to sign token')
             raise exception.UnexpectedError(_(
                 'Unable to sign token.'))
@@ -18,11 +18,15 @@
 
 from __future__ import absolute_import
 
+import copy
 import json
 import sys
+import time
 import uuid
 
+from keystone.common import cms
 from keystone.common import dependency
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import log as logging
@@ -170,7 +174,7 @@ class V3TokenDataHelper(object):
         if project_id:
             roles = self.identity_api.get_roles_for_user_and_project(
                 user_id, project_id)
-        return [self.identity_api.get_role(role_id) for role_id in roles]
+        return self.identity_api.get_roles(roles)
 
     def _populate_user(self, token_data, user_id, domain_id, project_id,
                        trust):
@@ -329,6 +333,9 @@ class Provider(token.provider.Provider):
             self.trust_api = trust.Manager()
         self.v3_token_data_helper = V3TokenDataHelper()
         self.v2_token_data_helper = V2TokenDataHelper()
+        self.validated_tokens = utils.LRUCache(
+            CONF.token.validation_cache_size)
+        self._validated_tokens_generation = None
 
     def get_token_version(self, token_data):
         if token_data and isinstance(token_data, dict):
@@ -446,6 +453,41 @@ class Provider(token.provider.Provider):
 
         return (token_id, token_data)
 
+    def _get_token_data(self, token_ref):
+        """Return the token data of a token reference.
+
+        Token references are persisted without their service catalog (see
+        :func:`keystone.token.core.compact_token_ref`), so it is rebuilt here
+        for the scope of the token.
+
+        """
+        token_data = token_ref.get('token_data')
+        if not token_data or not token_ref.get('catalog_omitted'):
+            return token_data
+
+        if 'access' in token_data:
+            catalog_ref = {}
+            if token_ref.get('tenant'):
+                catalog_ref = self.catalog_api.get_catalog(
+                    token_ref['user']['id'],
+                    token_ref['tenant']['id'],
+                    token_ref.get('metadata'))
+            token_data['access']['serviceCatalog'] = (
+                V2TokenDataHelper.format_catalog(catalog_ref))
+        elif 'token' in token_data:
+            body = token_data['token']
+            trust = None
+            if 'OS-TRUST:trust' in body:
+                trust = {'trustor_user_id':
+                         body['OS-TRUST:trust']['trustor_user']['id']}
+            self.v3_token_data_helper._populate_service_catalog(
+                body,
+                body['user']['id'],
+                body.get('domain', {}).get('id'),
+                body.get('project', {}).get('id'),
+                trust)
+        return token_data
+
     def _verify_token(self, token_id, belongs_to=None):
         """Verify the given token and return the token_ref."""
         try:
@@ -465,6 +507,39 @@ class Provider(token.provider.Provider):
 
         return token_ref
 
+    def _get_validated_token(self, key):
+        """Return the cached response to validating a token, or None.
+
+        Responses are keyed by the hash of the token id, so that PKI tokens
+        are not kept in memory. Every cached response is dropped once the
+        token backend notes that tokens may have been revoked.
+
+        """
+        if not CONF.token.validation_cache_time:
+            return None
+        generation = self.token_api.revocation_generation
+        if generation != self._validated_tokens_generation:
+            self.validated_tokens.clear()
+            self._validated_tokens_generation = generation
+        token_data = self.validated_tokens.get(key)
+        if token_data is not None:
+            return copy.deepcopy(token_data)
+
+    def _set_validated_token(self, key, token_data, token_ref):
+        """Cache the response to validating a token, for no longer than the
+        token remains valid.
+
+        """
+        if not CONF.token.validation_cache_time or token_data is None:
+            return
+        expires = time.time() + CONF.token.validation_cache_time
+        if token_ref.get('expires') is not None:
+            expires = min(expires, utils.unixtime(token_ref['expires']))
+        self.validated_tokens.set(key, copy.deepcopy(token_data), expires)
+
+    def _validated_token_key(self, version, token_id, belongs_to=None):
+        return (version, cms.cms_hash_token(token_id), belongs_to)
+
     def revoke_token(self, token_id):
         self.token_api.delete_token(token_id=token_id)
 
@@ -510,8 +585,14 @@ class Provider(token.provider.Provider):
                     raise exception.Unauthorized(msg)
 
     def validate_v2_token(self, token_id, belongs_to=None):
-        token_ref = self._verify_token(token_id, belongs_to)
-        return self._validate_v2_token_ref(token_ref)
+        key = self._validated_token_key(token.provider.V2, token_id,
+                                        belongs_to)
+        token_data = self._get_validated_token(key)
+        if token_data is None:
+            token_ref = self._verify_token(token_id, belongs_to)
+            token_data = self._validate_v2_token_ref(token_ref)
+            self._set_validated_token(key, token_data, token_ref)
+        return token_data
 
     def _validate_v2_token_ref(self, token_ref):
         try:
@@ -524,15 +605,14 @@ class Provider(token.provider.Provider):
             # Lets go with the cached token strategy. Since token
             # management layer is now pluggable, one can always provide
             # their own implementation to suit their needs.
-            token_data = token_ref.get('token_data')
+            token_data = self._get_token_data(token_ref)
             if (not token_data or
                     self.get_token_version(token_data) !=
                     token.provider.V2):
                 # token is created by old v2 logic
                 metadata_ref = token_ref['metadata']
-                roles_ref = []
-                for role_id in metadata_ref.get('roles', []):
-                    roles_ref.append(self.identity_api.get_role(role_id))
+                roles_ref = self.identity_api.get_roles(
+                    metadata_ref.get('roles', []))
 
                 # Get a service catalog if possible
                 # This is needed for on-behalf-of requests
@@ -550,9 +630,14 @@ class Provider(token.provider.Provider):
             raise exception.Unauthorized(e)
 
     def validate_v3_token(self, token_id):
+        key = self._validated_token_key(token.provider.V3, token_id)
+        token_data = self._get_validated_token(key)
+        if token_data is not None:
+            return token_data
         try:
             token_ref = self._verify_token(token_id)
             token_data = self._validate_v3_token_ref(token_ref)
+            self._set_validated_token(key, token_data, token_ref)
             return token_data
         except (exception.ValidationError,
                 exception.TokenNotFound,
@@ -568,7 +653,7 @@ class Provider(token.provider.Provider):
         # Lets go with the cached token strategy. Since token
         # management layer is now pluggable, one can always provide
         # their own implementation to suit their needs.
-        token_data = token_ref.get('token_data')
+        token_data = self._get_token_data(token_ref)
         if not token_data or 'token' not in token_data:
             # token ref is created by V2 API
             project_id = None
@@ -585,13 +670,20 @@ class Provider(token.provider.Provider):
         return token_data
 
     def validate_token(self, token_id, belongs_to=None):
+        key = self._validated_token_key(None, token_id, belongs_to)
+        token_data = self._get_validated_token(key)
+        if token_data is not None:
+            return token_data
         token_ref = self._verify_token(token_id, belongs_to=belongs_to)
         version = self.get_token_version(token_ref)
         if version == token.provider.V3:
-            return self._validate_v3_token_ref(token_ref)
+            token_data = self._validate_v3_token_ref(token_ref)
         elif version == token.provider.V2:
-            return self._validate_v2_token_ref(token_ref)
-        raise token.provider.UnsupportedTokenVersionException()
+            token_data = self._validate_v2_token_ref(token_ref)
+        else:
+            raise token.provider.UnsupportedTokenVersionException()
+        self._set_validated_token(key, token_data, token_ref)
+        return token_data
 
     def check_v2_token(self, token_id, belongs_to=None):
         try:
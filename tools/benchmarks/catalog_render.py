@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Time rendering the service catalog issued with each token.
+
+Usage::
+
+    python tools/benchmarks/catalog_render.py [--tokens N] [--regions N]
+        [--services N]
+
+The catalog of the templated driver is rendered once per token, first by
+substituting every configuration option into each URL as Keystone used to,
+then with the compiled catalog, and finally for its first region only.
+
+"""
+
+import argparse
+import gettext
+import os
+import sys
+import time
+import uuid
+
+ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir))
+sys.path.insert(0, ROOTDIR)
+gettext.install('keystone', unicode=1)
+
+from keystone.catalog.backends import templated
+from keystone.catalog import core
+from keystone import config
+
+
+CONF = config.CONF
+
+
+def make_templates(regions, services):
+    templates = {}
+    for region in xrange(regions):
+        region_ref = templates['Region%d' % region] = {}
+        for service in xrange(services):
+            region_ref['service%d' % service] = {
+                'name': 'Service %d' % service,
+                'publicURL': 'http://localhost:$(public_port)s/v2.0/'
+                             '$(tenant_id)s',
+                'adminURL': 'http://localhost:$(admin_port)s/v2.0',
+                'internalURL': 'http://localhost:$(public_port)s/v2.0/'
+                               '$(tenant_id)s',
+            }
+    return templates
+
+
+def render_legacy(driver, user_id, tenant_id):
+    d = dict(CONF.iteritems())
+    d.update({'tenant_id': tenant_id,
+              'user_id': user_id})
+
+    o = {}
+    for region, region_ref in driver.templates.iteritems():
+        o[region] = {}
+        for service, service_ref in region_ref.iteritems():
+            o[region][service] = {}
+            for k, v in service_ref.iteritems():
+                o[region][service][k] = core.format_url(v, d)
+    return o
+
+
+def render_tokens(render, user_id, tenant_ids):
+    for tenant_id in tenant_ids:
+        render(user_id, tenant_id)
+
+
+def timed(label, count, func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    elapsed = time.time() - start
+    print('%-28s %8.1f ms %8.1f us/token' % (label, elapsed * 1000,
+                                             elapsed * 1000000 / count))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=10000,
+                        help='number of tokens issued')
+    parser.add_argument('--regions', type=int, default=2)
+    parser.add_argument('--services', type=int, default=10,
+                        help='number of services per region')
+    args = parser.parse_args()
+
+    CONF(args=[], project='keystone', default_config_files=[])
+    driver = templated.TemplatedCatalog(
+        make_templates(args.regions, args.services))
+
+    user_id = uuid.uuid4().hex
+    tenant_ids = [uuid.uuid4().hex for _i in xrange(args.tokens)]
+    assert (render_legacy(driver, user_id, tenant_ids[0]) ==
+            driver.get_catalog(user_id, tenant_ids[0]))
+
+    timed('all options (legacy)', args.tokens, render_tokens,
+          lambda u, t: render_legacy(driver, u, t), user_id, tenant_ids)
+    timed('compiled catalog', args.tokens, render_tokens,
+          driver.get_catalog, user_id, tenant_ids)
+    timed('compiled catalog (1 region)', args.tokens, render_tokens,
+          lambda u, t: driver.get_catalog(u, t, regions=['Region0']),
+          user_id, tenant_ids)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compare PKI token signing throughput of the available CMS engines.
+
+Usage::
+
+    python tools/benchmarks/cms_sign.py [--tokens N] [--size BYTES]
+
+"""
+
+import argparse
+import gettext
+import json
+import os
+import sys
+import time
+
+ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir))
+sys.path.insert(0, ROOTDIR)
+gettext.install('keystone', unicode=1)
+
+from keystone.common import cms
+from keystone.common import environment
+from keystone import config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--size', type=int, default=4096,
+                        help='approximate size of the token body in bytes')
+    parser.add_argument('--certfile', default=os.path.join(
+        ROOTDIR, 'examples', 'pki', 'certs', 'signing_cert.pem'))
+    parser.add_argument('--keyfile', default=os.path.join(
+        ROOTDIR, 'examples', 'pki', 'private', 'signing_key.pem'))
+    args = parser.parse_args()
+
+    environment.use_stdlib()
+    config.CONF(args=[], project='keystone', default_config_files=[])
+    token_data = json.dumps({'access': {'token': {'id': 'placeholder'},
+                                        'serviceCatalog': 'x' * args.size}})
+
+    for engine in sorted(cms.SIGNING_ENGINES):
+        signer = cms.get_signer(engine, args.certfile, args.keyfile)
+        if engine != cms.SUBPROCESS_ENGINE and isinstance(
+                signer, cms.SubprocessSigner):
+            print('%-12s unavailable' % engine)
+            continue
+        # let lazily started engines bring up their workers first
+        for _i in xrange(10):
+            signer.sign_text(token_data)
+        start = time.time()
+        for _i in xrange(args.tokens):
+            cms.cms_to_token(signer.sign_text(token_data))
+        elapsed = time.time() - start
+        print('%-12s %8.1f tokens/sec' % (engine, args.tokens / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Time enforcing the rules of a policy file.
+
+Usage::
+
+    python tools/benchmarks/policy_enforce.py [--enforcements N]
+        [--policy-file PATH]
+
+Every action of the policy file, ``etc/policy.json`` by default, is enforced
+in turn for an admin, a service and an owning user, first as Keystone used
+to, reading the modification time of the file and walking the checks of
+``keystone.openstack.common.policy`` each time, then with the compiled rules.
+
+"""
+
+import argparse
+import gettext
+import itertools
+import os
+import sys
+import time
+
+ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir))
+sys.path.insert(0, ROOTDIR)
+gettext.install('keystone', unicode=1)
+
+from keystone.common import utils
+from keystone import config
+from keystone.openstack.common import policy as common_policy
+from keystone.policy.backends import rules
+
+
+CONF = config.CONF
+
+CREDENTIALS = [
+    {'roles': ['admin'], 'user_id': 'admin', 'project_id': 'foo'},
+    {'roles': ['service'], 'user_id': 'nova', 'project_id': 'service'},
+    {'roles': ['member'], 'user_id': 'owner', 'project_id': 'foo'},
+]
+TARGET = {'user_id': 'owner', 'project_id': 'foo',
+          'trust.trustor_user_id': 'owner'}
+
+
+def enforce_legacy(credentials, action, target):
+    utils.read_cached_file(rules._POLICY_PATH, rules._POLICY_CACHE)
+    return common_policy.check(action, target, credentials)
+
+
+def enforce_compiled(credentials, action, target):
+    return rules.enforce(credentials, action, target, do_raise=False)
+
+
+def timed(label, calls, enforce):
+    start = time.time()
+    for action, credentials in calls:
+        enforce(credentials, action, TARGET)
+    elapsed = time.time() - start
+    print('%-20s %10.0f enforcements/s' % (label, len(calls) / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--enforcements', type=int, default=200000)
+    parser.add_argument('--policy-file',
+                        default=os.path.join(ROOTDIR, 'etc', 'policy.json'))
+    args = parser.parse_args()
+
+    CONF(args=[], project='keystone', default_config_files=[])
+    CONF.set_override('policy_file', args.policy_file)
+    rules.reset()
+    rules.init()
+
+    pairs = list(itertools.product(sorted(common_policy._rules.keys()),
+                                   CREDENTIALS))
+    calls = list(itertools.islice(itertools.cycle(pairs), args.enforcements))
+
+    timed('legacy', calls, enforce_legacy)
+    timed('compiled', calls, enforce_compiled)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Time resolving the effective roles of a user in many groups.
+
+Usage::
+
+    python tools/benchmarks/role_resolution.py [--groups N,N,...]
+        [--calls N] [--connection URL]
+
+For each group count, a user is made a member of that many groups, each
+holding a role on a project or an inherited role on its domain. The roles
+of the user on the project are then resolved through the SQL assignment
+driver, reading the grants one by one as the generic driver does, and
+with its single query.
+
+"""
+
+import argparse
+import gettext
+import os
+import sys
+import time
+import uuid
+
+ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir))
+sys.path.insert(0, ROOTDIR)
+gettext.install('keystone', unicode=1)
+
+import sqlalchemy
+
+from keystone import assignment
+from keystone.common import dependency
+from keystone.common import sql
+from keystone import config
+from keystone import identity
+from keystone import invalidation
+
+
+CONF = config.CONF
+
+
+def populate(identity_api, domain_id, project_id, count):
+    user_id = uuid.uuid4().hex
+    identity_api.create_user(user_id, {'id': user_id, 'name': user_id,
+                                       'domain_id': domain_id})
+    for i in xrange(count):
+        group_id = uuid.uuid4().hex
+        identity_api.create_group(group_id, {'id': group_id,
+                                             'name': group_id,
+                                             'domain_id': domain_id})
+        identity_api.add_user_to_group(user_id, group_id)
+        role_id = uuid.uuid4().hex
+        identity_api.create_role(role_id, {'id': role_id, 'name': role_id})
+        if i % 2:
+            identity_api.create_grant(role_id, group_id=group_id,
+                                      project_id=project_id)
+        else:
+            identity_api.create_grant(role_id, group_id=group_id,
+                                      domain_id=domain_id,
+                                      inherited_to_projects=True)
+    return user_id
+
+
+def timed(label, calls, statements, func, *args):
+    del statements[:]
+    start = time.time()
+    for _i in xrange(calls):
+        func(*args)
+    elapsed = time.time() - start
+    print('%-28s %8.2f ms/call %6d queries/call' % (
+        label, elapsed * 1000 / calls, len(statements) / calls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', default='1,10,50,100',
+                        help='comma separated group counts')
+    parser.add_argument('--calls', type=int, default=100,
+                        help='number of resolutions timed per group count')
+    parser.add_argument('--connection', default='sqlite://',
+                        help='SQLAlchemy URL of a scratch database')
+    args = parser.parse_args()
+
+    CONF(args=[], project='keystone', default_config_files=[])
+    CONF.set_override('connection', args.connection, group='sql')
+    CONF.set_override('driver', 'keystone.identity.backends.sql.Identity',
+                      group='identity')
+    CONF.set_override('driver',
+                      'keystone.assignment.backends.sql.Assignment',
+                      group='assignment')
+    CONF.set_override('enabled', True, group='os_inherit')
+
+    invalidation.Manager()
+    identity_api = identity.Manager()
+    assignment_api = assignment.Manager()
+    dependency.resolve_future_dependencies()
+    engine = sql.Base().get_engine()
+    sql.ModelBase.metadata.create_all(bind=engine)
+
+    statements = []
+    sqlalchemy.event.listen(
+        engine, 'before_cursor_execute',
+        lambda conn, cursor, statement, *args: statements.append(statement))
+
+    domain_id = uuid.uuid4().hex
+    identity_api.create_domain(domain_id, {'id': domain_id,
+                                           'name': domain_id})
+    project_id = uuid.uuid4().hex
+    identity_api.create_project(project_id, {'id': project_id,
+                                             'name': project_id,
+                                             'domain_id': domain_id})
+
+    driver = assignment_api.driver
+    single_query = driver.list_grant_role_dicts
+    one_by_one = (lambda *args, **kwargs:
+                  assignment.Driver.list_grant_role_dicts(driver, *args,
+                                                          **kwargs))
+    for count in [int(c) for c in args.groups.split(',')]:
+        user_id = populate(identity_api, domain_id, project_id, count)
+        print('%d groups' % count)
+        driver.list_grant_role_dicts = one_by_one
+        timed('  grants one by one', args.calls, statements,
+              assignment_api.get_roles_for_user_and_project,
+              user_id, project_id)
+        driver.list_grant_role_dicts = single_query
+        timed('  single query', args.calls, statements,
+              assignment_api.get_roles_for_user_and_project,
+              user_id, project_id)
+
+
+if __name__ == '__main__':
+    main()
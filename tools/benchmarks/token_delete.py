@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Time listing and revoking the tokens of a user with many live tokens.
+
+Usage::
+
+    python tools/benchmarks/token_delete.py [--tokens N] [--tenants N]
+        [--connection URL]
+
+The tokens are spread evenly over the tenants; the tokens of one tenant
+are then listed and revoked through the SQL token driver.
+
+"""
+
+import argparse
+import datetime
+import gettext
+import os
+import sys
+import time
+import uuid
+
+ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir))
+sys.path.insert(0, ROOTDIR)
+gettext.install('keystone', unicode=1)
+
+from keystone.common import sql
+from keystone import config
+from keystone.openstack.common import timeutils
+from keystone.token.backends import sql as token_sql
+
+
+CONF = config.CONF
+
+
+def populate(driver, user_id, tenant_ids, count):
+    expires = timeutils.utcnow() + datetime.timedelta(hours=1)
+    session = driver.get_session()
+    with session.begin():
+        for i in xrange(count):
+            tenant_id = tenant_ids[i % len(tenant_ids)]
+            data = {'id': uuid.uuid4().hex,
+                    'expires': expires,
+                    'user': {'id': user_id, 'name': user_id},
+                    'tenant': {'id': tenant_id, 'name': tenant_id},
+                    'metadata': {'roles': [uuid.uuid4().hex]},
+                    'user_id': user_id}
+            token_ref = token_sql.TokenModel.from_dict(data)
+            token_ref.valid = True
+            token_ref.tenant_id = driver._tenant_id(data)
+            session.add(token_ref)
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    print('%-28s %8.1f ms' % (label, (time.time() - start) * 1000))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=100000,
+                        help='number of live tokens of the user')
+    parser.add_argument('--tenants', type=int, default=10)
+    parser.add_argument('--connection', default='sqlite://',
+                        help='SQLAlchemy URL of a scratch database')
+    args = parser.parse_args()
+
+    CONF(args=[], project='keystone', default_config_files=[])
+    CONF.set_override('connection', args.connection, group='sql')
+    driver = token_sql.Token()
+    sql.ModelBase.metadata.create_all(bind=driver.get_engine())
+
+    user_id = uuid.uuid4().hex
+    tenant_ids = [uuid.uuid4().hex for _i in xrange(args.tenants)]
+    timed('populate %d tokens' % args.tokens,
+          populate, driver, user_id, tenant_ids, args.tokens)
+
+    tokens = timed('list_tokens (tenant)', driver.list_tokens,
+                   user_id, tenant_id=tenant_ids[0])
+    timed('delete_tokens (tenant)', driver.delete_tokens,
+          user_id, tenant_id=tenant_ids[0])
+    remaining = timed('list_tokens (user)', driver.list_tokens, user_id)
+    print('revoked %d of %d tokens' % (len(tokens),
+                                       len(tokens) + len(remaining)))
+    timed('delete_tokens (user)', driver.delete_tokens, user_id)
+
+
+if __name__ == '__main__':
+    main()